@@ -0,0 +1,158 @@
+"""Import-time and cold-start profile of an API worker.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.imports --output imports.json
+    python -m backend.benchmarks.imports --baseline imports.json
+
+Each run starts fresh interpreters that import ``backend.main`` under
+``python -X importtime`` (against a throwaway SQLite database, as the app
+must not touch the database on import) and reports the median wall time
+of the import, the slowest modules by cumulative time, the time spent per
+top-level package, and the first-use cost of every algorithm: importing
+its processor module and running it once on a small image.
+
+Given a baseline written by an earlier run, an import time that grew by
+more than ``--tolerance`` is reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from .suite import environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs in the child interpreter; prints one JSON line on stdout
+CHILD = '''
+import json, time
+start = time.perf_counter()
+import backend.main
+imported = time.perf_counter() - start
+
+from backend.processors.registry import REGISTRY, MODULE_OF, get_algorithm
+from backend.warmup import warmup_image
+loaded = set(REGISTRY)
+image = warmup_image()
+first_use = {}
+for name in MODULE_OF:
+    start = time.perf_counter()
+    spec = get_algorithm(name)
+    spec.process(image, spec.coerce({}))
+    first_use[name] = time.perf_counter() - start
+print(json.dumps({"import_s": imported, "registered_on_import": sorted(loaded), "first_use_s": first_use}))
+'''
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Modules from ``-X importtime`` output, with self and cumulative microseconds."""
+    modules = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules.append({'module': name, 'self_us': int(own), 'cumulative_us': int(cumulative),
+                            'depth': len(indent) // 2})
+    return modules
+
+
+def app_import(modules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The modules loaded by ``import backend.main``, not later by first use."""
+    for index, module in enumerate(modules):
+        if module['module'] == 'backend.main':
+            return modules[:index + 1]
+    return modules
+
+
+def profile_once(workdir: str) -> Dict[str, Any]:
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='1',
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'imports.db')}", PROCESSOR_EXECUTION='inline')
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=workdir, env=env,
+                               capture_output=True, text=True, check=True)
+    run = json.loads(completed.stdout.strip().splitlines()[-1])
+    run['modules'] = app_import(parse_importtime(completed.stderr))
+    return run
+
+
+def by_package(modules: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Self time summed per top-level package, in milliseconds."""
+    totals = defaultdict(float)
+    for module in modules:
+        totals[module['module'].split('.')[0]] += module['self_us'] / 1000
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def profile(repeat: int, top: int) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='visionx-imports-')
+    runs = [profile_once(workdir) for _ in range(repeat)]
+    # The run closest to the median stands for the module breakdown
+    median = statistics.median(run['import_s'] for run in runs)
+    typical = min(runs, key=lambda run: abs(run['import_s'] - median))
+    slowest = sorted(typical['modules'], key=lambda module: -module['cumulative_us'])
+    return {
+        'import_ms': median * 1000,
+        'import_ms_runs': [run['import_s'] * 1000 for run in runs],
+        'registered_on_import': typical['registered_on_import'],
+        'packages_ms': by_package(typical['modules']),
+        'slowest_modules': [
+            {'module': module['module'], 'cumulative_ms': module['cumulative_us'] / 1000,
+             'self_ms': module['self_us'] / 1000}
+            for module in slowest[:top]
+        ],
+        'first_use_ms': {
+            name: statistics.median(run['first_use_s'][name] for run in runs) * 1000
+            for name in typical['first_use_s']
+        },
+    }
+
+
+def report(result: Dict[str, Any]):
+    print(f"import backend.main: {result['import_ms']:.0f} ms (median of {len(result['import_ms_runs'])})")
+    registered = result['registered_on_import']
+    print(f"algorithms registered on import: {', '.join(registered) if registered else 'none'}")
+    print("\nself time by package (ms):")
+    for package, ms in list(result['packages_ms'].items())[:15]:
+        print(f"  {package:<40} {ms:>8.1f}")
+    print("\nslowest modules (cumulative ms):")
+    for module in result['slowest_modules']:
+        print(f"  {module['module']:<40} {module['cumulative_ms']:>8.1f}")
+    print("\nfirst use of each algorithm (ms):")
+    for name, ms in result['first_use_ms'].items():
+        print(f"  {name:<40} {ms:>8.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--top', type=int, default=20, help='slowest modules to list')
+    parser.add_argument('--output', help='write the profile as JSON')
+    parser.add_argument('--baseline', help='profile JSON of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative growth (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    result = profile(args.repeat, args.top)
+    report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), **result}, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    old, new = baseline['import_ms'], result['import_ms']
+    print(f"\nimport time against {args.baseline}: {old:.0f} -> {new:.0f} ms")
+    return 1 if new > old * (1 + args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
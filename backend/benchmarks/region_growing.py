@@ -0,0 +1,94 @@
+"""Compare the claim-mask region growing against the old per-seed flood_fill loop.
+
+The new implementation still grows one seed at a time, with
+``cv2.floodFill`` against a mask shared by all seeds: every pixel is
+filled at most once, but each seed still costs one ``claimed[y, x]``
+lookup. The legacy loop copies and scans the whole image per seed. Its
+output also differs, since it marked every non-zero pixel as visited
+rather than the grown region; the timings below compare speed only.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.region_growing --sizes 512 2048 4096
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+from skimage.segmentation import flood_fill
+
+from ..processors.region_segmentation import RegionSegmentationProcessor
+
+SIZES = {512: (512, 512), 2048: (2048, 1080), 4096: (4096, 2160)}
+
+
+def legacy_region_growing(image: np.ndarray, parameters: dict) -> np.ndarray:
+    """The previous implementation: one full-image flood_fill per seed."""
+    gray = RegionSegmentationProcessor.ensure_grayscale(image)
+    threshold = float(parameters.get('threshold', 20.0))
+    min_size = int(parameters.get('min_size', 100))
+
+    output = np.zeros_like(gray)
+    visited = np.zeros_like(gray, dtype=bool)
+
+    local_min = cv2.erode(gray, np.ones((5, 5)))
+    seed_points = np.where(gray == local_min)
+
+    for y, x in zip(*seed_points):
+        if visited[y, x]:
+            continue
+        region = flood_fill(gray, (y, x), gray[y, x], tolerance=threshold, connectivity=1)
+        visited[region != 0] = True
+        if np.sum(region != 0) >= min_size:
+            output[region != 0] = gray[y, x]
+
+    return RegionSegmentationProcessor.ensure_color(output)
+
+
+def textured_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Smooth gradient with blotches and sensor noise, so there are many local minima."""
+    rng = np.random.default_rng(seed)
+    gradient = np.add.outer(np.linspace(0, 120, height), np.linspace(0, 80, width))
+    blotches = cv2.resize(rng.uniform(0, 60, (height // 32 + 1, width // 32 + 1)), (width, height))
+    noise = rng.normal(0, 6, (height, width))
+    gray = np.clip(gradient + blotches + noise, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def timed(fn, image, parameters, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(image, parameters)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=sorted(SIZES))
+    parser.add_argument('--threshold', type=float, default=20.0)
+    parser.add_argument('--min-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the new implementation')
+    args = parser.parse_args()
+
+    parameters = {'threshold': args.threshold, 'min_size': args.min_size}
+    print(f"{'size':>12} {'seeds':>9} {'legacy (s)':>12} {'new (s)':>10} {'speedup':>9}")
+    for size in args.sizes:
+        width, height = SIZES.get(size, (size, size))
+        image = textured_image(width, height)
+        gray = image[:, :, 0]
+        seeds = int(np.count_nonzero(gray == cv2.erode(gray, np.ones((5, 5), np.uint8))))
+
+        new = timed(RegionSegmentationProcessor.region_growing, image, parameters, args.repeat)
+        if args.skip_legacy:
+            print(f"{width:>5}x{height:<6} {seeds:>9} {'-':>12} {new:>10.3f} {'-':>9}")
+            continue
+        legacy = timed(legacy_region_growing, image, parameters, 1)
+        print(f"{width:>5}x{height:<6} {seeds:>9} {legacy:>12.3f} {new:>10.3f} {legacy / new:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Deterministic synthetic test images for the benchmarks.
+
+Each scene stresses the processors differently: noise defeats caching and
+produces edges everywhere, gradients are smooth, shapes and text have
+long straight edges and closed contours, and the texture is fractal noise
+with the roughly 1/f spectrum of natural images. All scenes are BGR uint8
+and the same for a given size and seed.
+"""
+from typing import Callable, Dict
+
+import cv2
+import numpy as np
+
+
+def noise(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def gradient(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    ys = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    xs = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    image = np.stack([255 * xs * np.ones_like(ys), 255 * ys * np.ones_like(xs), 255 * (1 - xs * ys)], axis=2)
+    return image.astype(np.uint8)
+
+
+def shapes(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    image = np.full((height, width, 3), 30, np.uint8)
+    scale = max(width, height)
+    for _ in range(max(8, scale // 32)):
+        color = tuple(int(c) for c in rng.integers(60, 256, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(scale // 64 + 2, scale // 8 + 3))
+        kind = rng.integers(0, 4)
+        if kind == 0:
+            cv2.rectangle(image, (x, y), (x + size, y + size // 2), color, -1)
+        elif kind == 1:
+            cv2.circle(image, (x, y), size // 2, color, -1)
+        elif kind == 2:
+            end = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            cv2.line(image, (x, y), end, color, max(1, scale // 512))
+        else:
+            points = rng.integers(-size, size, (5, 2)) + (x, y)
+            cv2.fillPoly(image, [points.astype(np.int32)], color)
+    return image
+
+
+def text(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    image = np.full((height, width, 3), 245, np.uint8)
+    font_scale = max(width, 256) / 640
+    line_height = int(32 * font_scale) + 4
+    words = ('edge', 'texture', 'contour', 'region', 'hough', 'gradient', 'pixel', 'kernel')
+    for y in range(line_height, height, line_height):
+        line = ' '.join(words[i] for i in rng.integers(0, len(words), 12))
+        cv2.putText(image, line, (4, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (20, 20, 20),
+                    max(1, int(font_scale * 2)), cv2.LINE_AA)
+    return image
+
+
+def texture(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """Fractal noise: octaves of upsampled noise, each half the amplitude of the last."""
+    field = np.zeros((height, width), np.float32)
+    amplitude, cells = 1.0, 4
+    while cells < max(width, height):
+        coarse = rng.standard_normal((cells * height // max(width, height) + 2, cells + 2)).astype(np.float32)
+        field += amplitude * cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+        amplitude, cells = amplitude / 2, cells * 2
+    field = cv2.normalize(field, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    # Earthy colours rather than a gray copy in each channel
+    return cv2.applyColorMap(field, cv2.COLORMAP_CIVIDIS)
+
+
+SCENES: Dict[str, Callable[[int, int, np.random.Generator], np.ndarray]] = {
+    'noise': noise,
+    'gradient': gradient,
+    'shapes': shapes,
+    'text': text,
+    'texture': texture,
+}
+
+
+def make_scene(name: str, width: int, height: int, seed: int = 0) -> np.ndarray:
+    return SCENES[name](width, height, np.random.default_rng(seed))
@@ -0,0 +1,151 @@
+"""Sustained frame rate of the /stream WebSocket endpoint.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.stream --algorithm canny --size 640x480
+    python -m backend.benchmarks.stream --algorithm histogram --fps 30 --frames 600 --output stream.json
+
+A synthetic clip (a window panning across one of the ``scenes.py``
+images) is encoded up front, then a sender thread pushes the frames over
+an in-process WebSocket, at ``--fps`` or as fast as the socket takes them
+with ``--fps 0``, while a receiver thread reads the processed frames back.
+Reports the offered and sustained frame rates, the frames the server
+dropped to keep up, and the server's smoothed per-frame latency.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+
+from .scenes import SCENES, make_scene
+from .suite import environment
+
+ENCODINGS = {'jpeg': '.jpg', 'png': '.png'}
+
+
+def make_clip(scene: str, width: int, height: int, frames: int, encoding: str, seed: int) -> List[bytes]:
+    """``frames`` encoded frames of a window panning across a larger scene."""
+    canvas = make_scene(scene, width * 2, height * 2, seed=seed)
+    clip = []
+    for index in range(frames):
+        # Two pixels right and one down per frame, bouncing inside the canvas
+        x = (2 * index) % (2 * width)
+        y = index % (2 * height)
+        x = x if x <= width else 2 * width - x
+        y = y if y <= height else 2 * height - y
+        ok, encoded = cv2.imencode(ENCODINGS[encoding], canvas[y:y + height, x:x + width])
+        clip.append(encoded.tobytes())
+    return clip
+
+
+def run(args) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+
+    workdir = tempfile.mkdtemp(prefix='visionx-stream-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('WARMUP_ALGORITHMS', args.algorithm)
+    os.chdir(workdir)
+    from .. import main as app_module
+
+    width, height = (int(side) for side in args.size.lower().split('x'))
+    clip = make_clip(args.scene, width, height, args.frames, args.encoding, args.seed)
+    config = {'algorithm': args.algorithm, 'parameters': json.loads(args.parameters),
+              'format': args.format, 'quality': args.quality}
+
+    replies: List[float] = []
+    stats: Dict[str, Any] = {}
+    sent = threading.Event()
+    with TestClient(app_module.app) as client, client.websocket_connect('/stream') as ws:
+        ws.send_text(json.dumps(config))
+        ready = ws.receive_json()
+        if ready.get('type') != 'ready':
+            raise SystemExit(f"stream refused: {ready.get('detail')}")
+
+        def receive():
+            while True:
+                message = ws.receive()
+                if message.get('bytes') is not None:
+                    replies.append(time.perf_counter())
+                elif message.get('text') is not None:
+                    reply = json.loads(message['text'])
+                    if reply.get('type') == 'stats':
+                        stats.update(reply)
+                        settled = reply['processed'] + reply['dropped'] + reply['errors']
+                        if sent.is_set() and settled >= len(clip):
+                            return
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+        start = time.perf_counter()
+        interval = 1 / args.fps if args.fps else 0
+        for index, frame in enumerate(clip):
+            if interval:
+                delay = start + index * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ws.send_bytes(frame)
+        offered_s = time.perf_counter() - start
+        sent.set()
+        # Ask for stats until every frame is accounted for
+        while receiver.is_alive():
+            ws.send_text('{}')
+            receiver.join(0.1)
+
+    elapsed = (replies[-1] - start) if replies else 0.0
+    return {
+        'algorithm': args.algorithm,
+        'size': f"{width}x{height}",
+        'encoding': args.encoding,
+        'format': args.format,
+        'frames': args.frames,
+        'offered_fps': args.frames / offered_s if offered_s else 0.0,
+        'sustained_fps': len(replies) / elapsed if elapsed else 0.0,
+        'processed': stats.get('processed', len(replies)),
+        'dropped': stats.get('dropped', 0),
+        'errors': stats.get('errors', 0),
+        'latency_ms': stats.get('latency_ms', 0.0),
+        'threads': app_module.streaming.pool()._max_workers,
+    }
+
+
+def report(result: Dict[str, Any]):
+    print(f"{result['algorithm']} {result['size']} {result['encoding']} -> {result['format']}, "
+          f"{result['frames']} frames on {result['threads']} threads")
+    print(f"  offered   {result['offered_fps']:8.1f} fps")
+    print(f"  sustained {result['sustained_fps']:8.1f} fps")
+    print(f"  processed {result['processed']:8d}, dropped {result['dropped']}, errors {result['errors']}")
+    print(f"  latency   {result['latency_ms']:8.1f} ms (smoothed, arrival to reply)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--algorithm', default='canny')
+    parser.add_argument('--parameters', default='{}', help='algorithm parameters as JSON')
+    parser.add_argument('--size', default='640x480', help='frame size as WIDTHxHEIGHT')
+    parser.add_argument('--scene', default='shapes', choices=sorted(SCENES))
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=float, default=0, help='frames offered per second; 0 sends as fast as possible')
+    parser.add_argument('--encoding', default='jpeg', choices=sorted(ENCODINGS), help='encoding of the sent frames')
+    parser.add_argument('--format', default='jpeg', choices=['jpeg', 'png', 'webp'], help='encoding of the replies')
+    parser.add_argument('--quality', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the result as JSON')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    result = run(args)
+    report(result)
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'environment': environment(), **result}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""Benchmark every registered algorithm and the /process request path.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.suite --sizes 256 1024 --output bench.json
+    python -m backend.benchmarks.suite --sizes 256 1024 --baseline bench.json
+
+Every algorithm runs on each synthetic scene (see ``scenes.py``) at each
+size with a few parameter sets, called straight through the registry.
+The request cases then POST the same images to ``/process`` through an
+in-process ASGI client (httpx), against a throwaway SQLite database, so
+base64, decoding, encoding and the history write are all included. The
+result cache is disabled for them, and the per-image memo of
+intermediates is cleared before every run, so repeats do real work.
+
+Sweep cases run a whole slider-style sweep (``SWEEPS``) over one image,
+starting from an empty memo, to show what nearby parameter values share.
+
+Each case reports throughput, p50/p99 latency and the peak RSS reached
+while it ran, and the whole run is written as JSON. Given a baseline
+written by an earlier run, cases whose p50 or peak RSS grew by more than
+``--tolerance`` are listed as regressions and the exit status is 1.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from ..cache import image_digest
+from ..processors.memo import MEMO, known_digest
+from ..processors.registry import get_algorithm, list_algorithms
+from .scenes import SCENES, make_scene
+
+SIZES = {256: (256, 256), 1024: (1024, 768), 2048: (2048, 1536), 4096: (4096, 3072)}
+
+# Besides the defaults, settings that move each algorithm's cost the most
+PARAMETER_SETS = {
+    'canny': {'low': {'threshold1': 20, 'threshold2': 60}, 'high': {'threshold1': 200, 'threshold2': 400}},
+    'log': {'wide': {'kernel_size': 15, 'sigma': 3.0}},
+    'dog': {'wide': {'sigma1': 2.0, 'sigma2': 8.0}},
+    'glcm': {
+        'coarse': {'window': 31, 'stride': 8, 'num_levels': 16},
+        'histogram-features': {'stride': 4, 'features': ['ASM', 'energy', 'entropy']},
+    },
+    'hough': {
+        'probabilistic': {'mode': 'probabilistic', 'min_line_length': 30, 'max_line_gap': 5},
+        'circles': {'mode': 'circles', 'threshold': 60, 'min_radius': 10, 'max_radius': 60},
+    },
+    'chain': {'no-labels': {'show_codes': False}},
+    'histogram': {'strong': {'clip_limit': 8.0}},
+    'affine': {
+        'rotate': {'rotation': 30.0, 'scale_x': 1.2, 'scale_y': 0.8, 'tx': 10.0, 'ty': -5.0},
+        'rotate-fit-cubic': {'rotation': 30.0, 'fit': True, 'interpolation': 'cubic'},
+    },
+    'perspective': {'keystone': {'corners': [0.05, 0.02, -0.05, 0.02, 0.0, 0.0, 0.0, 0.0], 'rotation': 10.0}},
+    'region-growing': {'fine': {'threshold': 5.0, 'min_size': 20}},
+    'split-merge': {'deep': {'max_depth': 8, 'min_size': 2}},
+}
+
+# Slider drags and batch sweeps: one image, many nearby parameter values
+SWEEPS = {
+    'canny': [{'threshold1': low, 'threshold2': 2 * low} for low in range(20, 220, 20)],
+    'dog': [{'sigma1': sigma1, 'sigma2': sigma2}
+            for sigma1 in (0.8, 1.0, 1.6, 2.0) for sigma2 in (1.6, 2.0, 3.2, 4.0) if sigma2 > sigma1],
+    'hough': [{'threshold': threshold} for threshold in range(40, 240, 20)],
+}
+
+
+def peak_rss_reset() -> bool:
+    """Reset the kernel's peak-RSS mark for this process (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Without /proc this is the peak over the whole run; macOS reports bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def summarize(name: str, samples: List[float], pixels: int, rss: int, **fields) -> Dict[str, Any]:
+    seconds = np.array(samples)
+    return {
+        'name': name,
+        **fields,
+        'iterations': len(samples),
+        'p50_ms': float(np.percentile(seconds, 50) * 1000),
+        'p99_ms': float(np.percentile(seconds, 99) * 1000),
+        'mean_ms': float(seconds.mean() * 1000),
+        'throughput_per_s': float(len(samples) / seconds.sum()),
+        'megapixels_per_s': float(len(samples) * pixels / 1e6 / seconds.sum()),
+        'peak_rss_mb': rss / 2 ** 20,
+    }
+
+
+def measure(call: Callable[[], Any], repeat: int, budget: float) -> List[float]:
+    """Time ``call`` after one warm-up run, up to ``repeat`` times or ``budget`` seconds."""
+    call()
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def parameter_sets(algorithm) -> Dict[str, Dict[str, Any]]:
+    return {'default': {}, **PARAMETER_SETS.get(algorithm.name, {})}
+
+
+def run_processors(args, images) -> List[Dict[str, Any]]:
+    results = []
+    for algorithm in list_algorithms():
+        if args.algorithms and algorithm.name not in args.algorithms:
+            continue
+        for label, overrides in parameter_sets(algorithm).items():
+            parameters = algorithm.coerce(overrides)
+            for (scene, size), image in images.items():
+                digest = image_digest(image)
+
+                def call():
+                    # Every run starts without intermediates memoized by the last one; the
+                    # image is hashed once, as requests hash it once for the result cache
+                    MEMO.clear()
+                    with known_digest(image, digest):
+                        algorithm.process(image, parameters)
+
+                peak_rss_reset()
+                samples = measure(call, args.repeat, args.budget)
+                result = summarize(
+                    f"processor/{algorithm.name}/{label}/{scene}/{size}", samples,
+                    image.shape[0] * image.shape[1], peak_rss_bytes(),
+                    kind='processor', algorithm=algorithm.name, parameters=label, scene=scene, size=size,
+                )
+                results.append(result)
+                report(result)
+    return results
+
+
+def run_sweeps(args, images) -> List[Dict[str, Any]]:
+    """Time each sweep as a whole, from an empty memo."""
+    results = []
+    for name, sweep in SWEEPS.items():
+        if args.algorithms and name not in args.algorithms:
+            continue
+        algorithm = get_algorithm(name)
+        parameter_list = [algorithm.coerce(overrides) for overrides in sweep]
+        for (scene, size), image in images.items():
+            digest = image_digest(image)
+
+            def call():
+                MEMO.clear()
+                for parameters in parameter_list:
+                    with known_digest(image, digest):
+                        algorithm.process(image, parameters)
+
+            peak_rss_reset()
+            samples = measure(call, args.repeat, args.budget)
+            result = summarize(
+                f"sweep/{name}/{len(sweep)}-calls/{scene}/{size}", samples,
+                image.shape[0] * image.shape[1], peak_rss_bytes(),
+                kind='sweep', algorithm=name, parameters=f"{len(sweep)}-calls", scene=scene, size=size,
+            )
+            results.append(result)
+            report(result)
+    return results
+
+
+def run_requests(args, images) -> List[Dict[str, Any]]:
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix='visionx-bench-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('PROCESSOR_EXECUTION', args.execution)
+    # Repeats of one request must not be answered from the cache
+    os.environ.setdefault('RESULT_CACHE_BYTES', '0')
+    # The app keeps uploads relative to its working directory
+    os.chdir(workdir)
+    from .. import main as app_module
+    from ..database import init_db
+
+    # The in-process client sends no startup event
+    init_db()
+
+    payloads = {}
+    for key, image in images.items():
+        _, encoded = cv2.imencode('.png', image)
+        payloads[key] = 'data:image/png;base64,' + base64.b64encode(encoded).decode('ascii')
+
+    async def run() -> List[Dict[str, Any]]:
+        results = []
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+            for algorithm in list_algorithms():
+                if args.algorithms and algorithm.name not in args.algorithms:
+                    continue
+                for (scene, size), image in images.items():
+                    body = {'algorithm': algorithm.name, 'image': payloads[scene, size]}
+
+                    async def post():
+                        MEMO.clear()
+                        response = await client.post('/process', json=body)
+                        response.raise_for_status()
+
+                    await post()
+                    samples = []
+                    peak_rss_reset()
+                    deadline = time.perf_counter() + args.budget
+                    while len(samples) < args.repeat and (not samples or time.perf_counter() < deadline):
+                        start = time.perf_counter()
+                        await post()
+                        samples.append(time.perf_counter() - start)
+                    result = summarize(
+                        f"request/{algorithm.name}/default/{scene}/{size}", samples,
+                        image.shape[0] * image.shape[1], peak_rss_bytes(),
+                        kind='request', algorithm=algorithm.name, parameters='default', scene=scene, size=size,
+                    )
+                    results.append(result)
+                    report(result)
+        return results
+
+    try:
+        return asyncio.run(run())
+    finally:
+        app_module.executor.shutdown()
+
+
+def report(result: Dict[str, Any]):
+    print(f"{result['name']:<58} {result['iterations']:>4} {result['p50_ms']:>10.2f} "
+          f"{result['p99_ms']:>10.2f} {result['throughput_per_s']:>9.1f} {result['peak_rss_mb']:>8.0f}",
+          flush=True)
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float,
+            min_delta_ms: float) -> List[Dict[str, Any]]:
+    """Cases whose p50 latency or peak RSS grew past ``tolerance`` since the baseline."""
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        slower = (result['p50_ms'] > old['p50_ms'] * (1 + tolerance)
+                  and result['p50_ms'] - old['p50_ms'] > min_delta_ms)
+        bigger = result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance)
+        if slower or bigger:
+            regressions.append({
+                'name': result['name'],
+                'p50_ms': (old['p50_ms'], result['p50_ms']),
+                'peak_rss_mb': (old['peak_rss_mb'], result['peak_rss_mb']),
+            })
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 1024])
+    parser.add_argument('--scenes', nargs='+', default=sorted(SCENES), choices=sorted(SCENES))
+    parser.add_argument('--algorithms', nargs='+', help='only these algorithms (default: all)')
+    parser.add_argument('--repeat', type=int, default=10, help='timed runs per case')
+    parser.add_argument('--budget', type=float, default=5.0, help='stop repeating a case after this many seconds')
+    parser.add_argument('--skip-processors', action='store_true')
+    parser.add_argument('--skip-sweeps', action='store_true')
+    parser.add_argument('--skip-requests', action='store_true')
+    parser.add_argument('--execution', default='inline', choices=['inline', 'pool'],
+                        help='PROCESSOR_EXECUTION for the request cases; inline keeps RSS in this process')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative growth (0.10 = 10%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='ignore slowdowns smaller than this')
+    args = parser.parse_args(argv)
+
+    images = {
+        (scene, size): make_scene(scene, *SIZES.get(size, (size, size)), seed=args.seed)
+        for size in args.sizes for scene in args.scenes
+    }
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{'case':<58} {'runs':>4} {'p50 (ms)':>10} {'p99 (ms)':>10} {'per s':>9} {'RSS MB':>8}")
+    results = []
+    if not args.skip_processors:
+        results += run_processors(args, images)
+    if not args.skip_sweeps:
+        results += run_sweeps(args, images)
+    if not args.skip_requests:
+        results += run_requests(args, images)
+
+    run = {
+        'environment': environment(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if not regressions:
+        print(f"\nNo regressions against {args.baseline}")
+        return 0
+    print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+    for regression in regressions:
+        (old_p50, new_p50), (old_rss, new_rss) = regression['p50_ms'], regression['peak_rss_mb']
+        print(f"  {regression['name']:<58} p50 {old_p50:.2f} -> {new_p50:.2f} ms, "
+              f"RSS {old_rss:.0f} -> {new_rss:.0f} MB")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
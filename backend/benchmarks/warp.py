@@ -0,0 +1,99 @@
+"""Compare cached fixed-point remap maps against calling cv2.warpAffine/warpPerspective per image.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.warp --sizes 640 1024 2048
+    python -m backend.benchmarks.warp --interpolations linear cubic --images 50
+
+A batch of same-sized images goes through one transform, as in batch
+jobs and video streams. The baseline warps every image with OpenCV's
+warp function; the cached path builds the remap maps once (``build``)
+and then only resamples. Throughput is images per second over the
+batch, build time included; ``max diff`` is the largest pixel difference
+between the two, which comes from the maps' 1/32-pixel positions.
+Nearest-neighbour warps are the exception that gains nothing: OpenCV's
+own nearest warp is cheaper than reading the maps back.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from ..processors import warp
+from ..processors.geometric_transformation import GeometricTransformationProcessor
+from .scenes import make_scene
+
+SIZES = {640: (640, 480), 1024: (1024, 768), 2048: (2048, 1536), 4096: (4096, 3072)}
+
+# The suite's rotate case, and the same with a keystone correction in front
+TRANSFORMS = {
+    'affine': {'rotation': 30.0, 'scale_x': 1.2, 'scale_y': 0.8, 'tx': 10.0, 'ty': -5.0},
+    'perspective': {'rotation': 30.0, 'scale_x': 1.2, 'scale_y': 0.8, 'tx': 10.0, 'ty': -5.0,
+                    'corners': [0.05, 0.02, -0.05, 0.02, 0.0, 0.0, 0.0, 0.0]},
+}
+
+
+def batch(width: int, height: int, count: int, seed: int = 0):
+    """``count`` different frames of one size, so no call sees a warm source image."""
+    canvas = make_scene('shapes', width + count, height, seed=seed)
+    return [np.ascontiguousarray(canvas[:, index:index + width]) for index in range(count)]
+
+
+def opencv_warp(kind: str, matrix: np.ndarray, size, interpolation: int):
+    if kind == 'affine':
+        affine = np.ascontiguousarray(matrix[:2])
+        return lambda image: cv2.warpAffine(image, affine, size, flags=interpolation,
+                                            borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+    return lambda image: cv2.warpPerspective(image, matrix, size, flags=interpolation,
+                                             borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+
+
+def timed_batch(fn, images, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for image in images:
+            fn(image)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[640, 1024, 2048])
+    parser.add_argument('--kinds', nargs='+', default=sorted(TRANSFORMS), choices=sorted(TRANSFORMS))
+    parser.add_argument('--interpolations', nargs='+', default=['linear'], choices=sorted(warp.INTERPOLATIONS))
+    parser.add_argument('--images', type=int, default=30, help='images per batch')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fit', action='store_true', help='warp onto a canvas that holds the whole image')
+    args = parser.parse_args()
+
+    print(f"{'case':>28} {'opencv (img/s)':>15} {'build (ms)':>11} {'remap (img/s)':>14} "
+          f"{'speedup':>8} {'max diff':>9}")
+    for size in args.sizes:
+        width, height = SIZES.get(size, (size, size))
+        images = batch(width, height, args.images)
+        for kind in args.kinds:
+            parameters = dict(TRANSFORMS[kind], fit=args.fit)
+            for name in args.interpolations:
+                parameters['interpolation'] = name
+                matrix, out_size, interpolation = GeometricTransformationProcessor.warp_plan(
+                    kind, width, height, parameters)
+                baseline = opencv_warp(kind, matrix, out_size, interpolation)
+
+                start = time.perf_counter()
+                maps = warp.build_maps(matrix, out_size, interpolation)
+                build = time.perf_counter() - start
+                cached = lambda image: warp.remap(image, maps, interpolation)
+
+                reference = timed_batch(baseline, images, args.repeat)
+                remapped = timed_batch(cached, images, args.repeat) + build
+                diff = int(np.abs(baseline(images[0]).astype(np.int16) - cached(images[0])).max())
+                case = f"{width}x{height} {kind} {name}"
+                print(f"{case:>28} {len(images) / reference:>15.1f} {build * 1000:>11.1f} "
+                      f"{len(images) / remapped:>14.1f} {reference / remapped:>7.2f}x {diff:>9}")
+
+
+if __name__ == '__main__':
+    main()
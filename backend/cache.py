@@ -0,0 +1,189 @@
+"""Content-addressed cache of processor results.
+
+Entries are keyed on a hash of the decoded pixels, the algorithm name and
+the canonicalized parameters, so the same image re-run with the same
+slider values is served without touching a processor. The memory tier is
+an LRU bounded by ``RESULT_CACHE_BYTES``. Setting ``RESULT_CACHE_DISK=1``
+adds a second tier of ``.npy`` files under ``uploads/cache`` bounded by
+``RESULT_CACHE_DISK_BYTES``.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+
+def canonical_value(value):
+    """Normalize a parameter value so equivalent inputs compare equal.
+
+    Numeric strings become numbers and integral floats become ints, so
+    ``"5"``, ``5`` and ``5.0`` all canonicalize to ``5``.
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        if math.isfinite(value) and value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return value
+        return canonical_value(number) if math.isfinite(number) else value
+    if isinstance(value, dict):
+        return {str(k): canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(v) for v in value]
+    return value
+
+
+def canonical_parameters(parameters: Dict[str, Any]) -> str:
+    """Serialize parameters to a stable string for hashing."""
+    return json.dumps(canonical_value(parameters or {}), sort_keys=True, separators=(',', ':'))
+
+
+def image_digest(image: np.ndarray) -> str:
+    """Hash decoded pixels together with their shape and dtype."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.shape}{image.dtype.str}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = None, disk_dir: Optional[str] = None, max_disk_bytes: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv('RESULT_CACHE_BYTES', 256 * 1024 * 1024))
+        if max_disk_bytes is None:
+            max_disk_bytes = int(os.getenv('RESULT_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ('hits', 'disk_hits', 'misses', 'evictions', 'disk_evictions'), 0
+        )
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            # Pick up results from earlier runs, oldest first
+            files = [os.path.join(disk_dir, name) for name in os.listdir(disk_dir) if name.endswith('.npy')]
+            for path in sorted(files, key=os.path.getmtime):
+                size = os.path.getsize(path)
+                self._disk_entries[os.path.basename(path)[:-4]] = size
+                self._disk_bytes += size
+
+    @staticmethod
+    def key(image: np.ndarray, algorithm: str, parameters: Dict[str, Any], pixels: Optional[str] = None) -> str:
+        """Cache key for one processor call; ``pixels`` is ``image_digest(image)`` if already known."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update((pixels or image_digest(image)).encode())
+        digest.update(algorithm.encode())
+        digest.update(canonical_parameters(parameters).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return self._entries[key]
+            on_disk = key in self._disk_entries
+
+        if on_disk:
+            try:
+                result = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                result = None
+            if result is not None:
+                with self._lock:
+                    self.counters['disk_hits'] += 1
+                    if key in self._disk_entries:
+                        self._disk_entries.move_to_end(key)
+                self._remember(key, result)
+                return result
+
+        with self._lock:
+            self.counters['misses'] += 1
+        return None
+
+    def put(self, key: str, result):
+        """Store a result array, or a structured ``ProcessorResult`` (memory tier only)."""
+        if isinstance(result, np.ndarray):
+            result.setflags(write=False)
+        self._remember(key, result)
+        if self.disk_dir and isinstance(result, np.ndarray):
+            self._write_disk(key, result)
+
+    def _remember(self, key: str, result: np.ndarray):
+        if result.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = result
+            self._bytes += result.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.counters['evictions'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def _write_disk(self, key: str, result: np.ndarray):
+        if key in self._disk_entries or result.nbytes > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, result)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes:
+                old_key, old_size = self._disk_entries.popitem(last=False)
+                self._disk_bytes -= old_size
+                self.counters['disk_evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._disk_path(old_key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop the memory tier; disk entries are left in place."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['disk_hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': (lookups - self.counters['misses']) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_entries': len(self._disk_entries),
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes if self.disk_dir else 0,
+            }
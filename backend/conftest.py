@@ -0,0 +1,2 @@
+# test_db.py is a manual connection check against the configured Postgres, not a test
+collect_ignore = ['test_db.py']
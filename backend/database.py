@@ -1,8 +1,11 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from dotenv import load_dotenv
 from pathlib import Path
+import logging
 import os
 # Explicitly load .env from root dir
 env_path = Path(__file__).resolve().parent.parent / ".env"
@@ -10,40 +13,130 @@ load_dotenv(dotenv_path=env_path)
 
 import urllib.parse
 
+logger = logging.getLogger(__name__)
+
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = urllib.parse.quote_plus(os.getenv("POSTGRES_PASSWORD", ""))
 POSTGRES_DB = os.getenv("POSTGRES_DB", "VisionX")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-SQLALCHEMY_DATABASE_URL = (
+# DATABASE_URL takes any SQLAlchemy URL, e.g. sqlite:///visionx.db for local runs
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
+# Drivers for the async engine, by backend
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
 
-print("✅ POSTGRES_USER =", os.getenv("POSTGRES_USER"))
-print("✅ POSTGRES_PASSWORD =", os.getenv("POSTGRES_PASSWORD"))
-print("✅ POSTGRES_DB =", os.getenv("POSTGRES_DB"))
-print("✅ POSTGRES_HOST =", os.getenv("POSTGRES_HOST"))
+# Set DB_ASYNC=1 to read history and write it through the async engine (needs the
+# driver above). Experimental: this path has not been run against either driver.
+# Jobs always use sync sessions in worker threads, whatever this is set to.
+ASYNC_ENABLED = os.getenv("DB_ASYNC") == "1"
 
-# ✅ Now this uses env vars properly
-SQLALCHEMY_DATABASE_URL = (
-    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments for ``create_engine``/``create_async_engine`` for ``url``.
+
+    Server databases get a connection pool sized by ``DB_POOL_SIZE`` and
+    ``DB_MAX_OVERFLOW`` that checks connections before use (``DB_POOL_PRE_PING``)
+    and replaces them after ``DB_POOL_RECYCLE`` seconds. SQLite files are
+    shared across threads; an in-memory SQLite database is one connection.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if parsed.database in (None, "", ":memory:"):
+            options["poolclass"] = StaticPool
+        return options
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+
+def async_url(url: str) -> str:
+    """The same database as ``url`` addressed through its async driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
-print("✅ SQLALCHEMY_DATABASE_URL =", SQLALCHEMY_DATABASE_URL)
-print("Connection successful")
-print()
+
+# Created on first use so the async driver is only needed when DB_ASYNC=1
+_async_sessionmaker = None
+
+
+def async_session_factory():
+    """Session factory bound to the async engine, created on first call."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        url = os.getenv("ASYNC_DATABASE_URL") or async_url(SQLALCHEMY_DATABASE_URL)
+        logger.warning("DB_ASYNC=1 is experimental; unset it to use the sync engine")
+        async_engine = create_async_engine(url, **engine_options(url))
+        _async_sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+def init_db():
+    """Create any missing tables.
+
+    Run once per deploy with ``python -m backend.migrate``, or on startup
+    unless ``DB_CREATE_TABLES=0``; importing the app never touches the database.
+    """
+    from . import models  # noqa: F401 - registers the tables on Base
+
+    Base.metadata.create_all(bind=engine)
+    check_schema()
+
+
+def check_schema():
+    """Fail unless every existing table has all the columns its model declares.
+
+    ``create_all`` never alters a table that already exists, so a database
+    from an older release would otherwise fail on every query that touches
+    the new columns. ``python -m backend.migrate`` upgrades it.
+    """
+    from sqlalchemy import inspect
+    from . import models  # noqa: F401 - registers the tables on Base
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column.name for column in table.columns if column.name not in existing]
+        if missing:
+            raise RuntimeError(
+                f"Table {table.name} is missing columns {', '.join(missing)}; "
+                "run `python -m backend.migrate` to upgrade the database"
+            )
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
-        print("Database connection established")
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with async_session_factory()() as db:
+        yield db
+
+
+# Session dependency for handlers that read through whichever engine is configured
+get_session = get_async_db if ASYNC_ENABLED else get_db
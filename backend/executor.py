@@ -0,0 +1,135 @@
+"""Execution backends that run processor calls off the event loop.
+
+OpenCV releases the GIL inside its kernels, so those algorithms go to a
+thread pool. Algorithms registered as ``heavy`` spend their time in Python
+loops, scipy or scikit-image and go to a process pool. Setting
+``PROCESSOR_EXECUTION=inline`` runs everything on the calling thread, which
+is handy for debugging.
+
+Each pool accepts at most its worker count plus ``PROCESSOR_QUEUE_LIMIT``
+calls at a time; beyond that ``run`` raises ``ExecutorSaturated`` so the API
+can answer 503 instead of queueing without bound.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from .processors import memo
+from .processors.registry import get_algorithm, HEAVY
+from .processors.results import ProcessorResult
+from .tiling import should_tile, process_tiled
+
+INLINE = 'inline'
+THREAD = 'thread'
+PROCESS = 'process'
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already holds as many calls as it will accept."""
+
+
+def apply_processor(algorithm: str, image: np.ndarray, parameters: Dict[str, Any],
+                    digest: Optional[str] = None) -> np.ndarray:
+    """Run one algorithm. Module-level so process pools can pickle it.
+
+    Images past ``TILED_MIN_PIXELS`` are processed tile by tile when the
+    algorithm allows it, to keep working memory within the tile budget.
+    ``digest`` is the image's ``image_digest`` when the caller has it.
+    """
+    spec = get_algorithm(algorithm)
+    if should_tile(algorithm, image):
+        return process_tiled(algorithm, image, parameters, spec.process)
+    with memo.known_digest(image, digest):
+        return spec.process(image, parameters)
+
+
+def apply_analysis(algorithm: str, image: np.ndarray, parameters: Dict[str, Any], render: bool,
+                   digest: Optional[str] = None) -> ProcessorResult:
+    """Run one algorithm for its structured result. Module-level for pickling."""
+    with memo.known_digest(image, digest):
+        return get_algorithm(algorithm).analyze(image, parameters, render)
+
+
+class ProcessorExecutor:
+    def __init__(self, mode: str = None, threads: int = None, processes: int = None, queue_limit: int = None):
+        cpus = os.cpu_count() or 1
+        self.mode = mode or os.getenv('PROCESSOR_EXECUTION', 'pool')
+        self.workers = {
+            THREAD: int(threads or os.getenv('PROCESSOR_THREADS', cpus)),
+            PROCESS: int(processes or os.getenv('PROCESSOR_PROCESSES', cpus)),
+        }
+        if queue_limit is None:
+            queue_limit = int(os.getenv('PROCESSOR_QUEUE_LIMIT', 16))
+        self.queue_limit = queue_limit
+        self._pools = {}
+        self._in_flight = {THREAD: 0, PROCESS: 0}
+
+    def backend_for(self, algorithm: str) -> str:
+        """Return the backend an algorithm is routed to."""
+        if self.mode == INLINE:
+            return INLINE
+        return PROCESS if get_algorithm(algorithm).cost == HEAVY else THREAD
+
+    def _pool(self, backend: str):
+        if backend not in self._pools:
+            if backend == PROCESS:
+                self._pools[backend] = ProcessPoolExecutor(max_workers=self.workers[PROCESS])
+            else:
+                self._pools[backend] = ThreadPoolExecutor(
+                    max_workers=self.workers[THREAD], thread_name_prefix='processor'
+                )
+        return self._pools[backend]
+
+    def concurrency(self, algorithm: str) -> int:
+        """How many calls of an algorithm can usefully run at once."""
+        backend = self.backend_for(algorithm)
+        return 1 if backend == INLINE else self.workers[backend]
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls in flight (running or queued) and capacity per pool."""
+        return {
+            backend: {
+                'in_flight': self._in_flight[backend],
+                'capacity': self.workers[backend] + self.queue_limit,
+            }
+            for backend in (THREAD, PROCESS)
+        }
+
+    async def run(self, algorithm: str, image: np.ndarray, parameters: Dict[str, Any],
+                  digest: Optional[str] = None) -> np.ndarray:
+        """Run an algorithm on its backend without blocking the event loop.
+
+        Passing the image's ``image_digest`` saves the processor hashing it again.
+        """
+        return await self._submit(algorithm, apply_processor, algorithm, image, parameters, digest)
+
+    async def analyze(self, algorithm: str, image: np.ndarray, parameters: Dict[str, Any],
+                      render: bool = True, digest: Optional[str] = None) -> ProcessorResult:
+        """Like ``run``, but return the processor's structured result."""
+        return await self._submit(algorithm, apply_analysis, algorithm, image, parameters, render, digest)
+
+    async def _submit(self, algorithm: str, fn, *args):
+        backend = self.backend_for(algorithm)
+        if backend == INLINE:
+            return fn(*args)
+
+        # Only the event loop thread touches the counters, so no lock is needed
+        if self._in_flight[backend] >= self.workers[backend] + self.queue_limit:
+            raise ExecutorSaturated(f"{backend} pool is saturated")
+
+        self._in_flight[backend] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(backend), fn, *args)
+        finally:
+            self._in_flight[backend] -= 1
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools = {}
+
+
+executor = ProcessorExecutor()
@@ -0,0 +1,181 @@
+"""Write-behind buffer for processing history rows.
+
+Request handlers hand finished rows to ``HistoryWriter.submit`` and return
+without waiting on the database. A background task commits the buffered
+rows in batches of up to ``HISTORY_BATCH_SIZE``, at most
+``HISTORY_FLUSH_INTERVAL`` seconds after the first of them arrived, so a
+burst of requests shares one transaction. Commits run in a worker thread
+on a sync session, or are awaited on an async session when the writer is
+built with ``asynchronous=True`` (``DB_ASYNC=1``).
+
+``write`` waits for the batch holding its row, for callers that need the
+row id, and ``flush`` waits for everything submitted so far, for readers
+that must see their own writes. When a commit fails the rows are kept and
+retried, up to ``HISTORY_BUFFER_LIMIT`` rows; past that the oldest are
+dropped and counted.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# A buffered row and the future of whoever waits for it; flush markers have no row
+Entry = Tuple[Optional[models.ProcessingHistory], Optional[asyncio.Future]]
+
+
+class HistoryWriter:
+    def __init__(self, session_factory: Callable[..., Any], asynchronous: bool = False,
+                 batch_size: int = None, interval: float = None, limit: int = None,
+                 retry_delay: float = 1.0):
+        self.session_factory = session_factory
+        self.asynchronous = asynchronous
+        self.batch_size = int(batch_size or os.getenv("HISTORY_BATCH_SIZE", 100))
+        self.interval = float(interval if interval is not None else os.getenv("HISTORY_FLUSH_INTERVAL", 0.2))
+        self.limit = int(limit or os.getenv("HISTORY_BUFFER_LIMIT", 10000))
+        self.retry_delay = retry_delay
+        self.counters = dict.fromkeys(("written", "batches", "failures", "dropped"), 0)
+        self._pending: List[Entry] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._urgent: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+
+    async def start(self):
+        self._ensure_running()
+
+    async def stop(self):
+        """Commit whatever is still buffered, then stop the background task."""
+        if self._task is None:
+            return
+        try:
+            await self.flush()
+        except Exception:
+            # Already logged; rows that could not be written go with the process
+            pass
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def submit(self, *rows: models.ProcessingHistory):
+        """Queue rows for the next batch without waiting for the commit."""
+        self._ensure_running()
+        self._pending.extend((row, None) for row in rows)
+        self._drop_overflow()
+        self._signal(urgent=len(self._pending) >= self.batch_size)
+
+    async def write(self, row: models.ProcessingHistory) -> models.ProcessingHistory:
+        """Queue a row and wait until it is committed, so its id is set."""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        self._drop_overflow()
+        self._signal(urgent=len(self._pending) >= self.batch_size)
+        await future
+        return row
+
+    async def flush(self):
+        """Wait until every row submitted before this call is committed."""
+        if not self._pending and not self._busy:
+            return
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((None, future))
+        self._signal(urgent=True)
+        await future
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": sum(row is not None for row, _ in self._pending), **self.counters}
+
+    def _ensure_running(self):
+        # Started lazily too, for apps driven without startup events
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._urgent = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            if self._pending:
+                self._wakeup.set()
+
+    def _signal(self, urgent: bool = False):
+        self._wakeup.set()
+        if urgent:
+            self._urgent.set()
+
+    def _drop_overflow(self):
+        excess = sum(row is not None for row, _ in self._pending) - self.limit
+        if excess <= 0:
+            return
+        kept = []
+        for row, future in self._pending:
+            if excess > 0 and row is not None:
+                excess -= 1
+                self.counters["dropped"] += 1
+                if future is not None and not future.done():
+                    future.set_exception(RuntimeError("History buffer is full"))
+                continue
+            kept.append((row, future))
+        self._pending = kept
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._urgent.is_set():
+                # Let the rest of a burst join this batch
+                try:
+                    await asyncio.wait_for(self._urgent.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._urgent.clear()
+            while self._pending:
+                if not await self._commit_next():
+                    await asyncio.sleep(self.retry_delay)
+
+    async def _commit_next(self) -> bool:
+        """Commit the oldest batch; on failure put it back and return False."""
+        batch = self._pending[:self.batch_size]
+        del self._pending[:len(batch)]
+        rows = [row for row, _ in batch if row is not None]
+        self._busy = True
+        try:
+            if rows:
+                await self._commit(rows)
+        except Exception as e:
+            self.counters["failures"] += 1
+            logger.warning("Committing %d history rows failed: %s", len(rows), e)
+            # Waiters get the error now; rows nobody waits for are retried
+            for row, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            self._pending[:0] = [(row, None) for row, future in batch if row is not None and future is None]
+            self._drop_overflow()
+            return False
+        finally:
+            self._busy = False
+
+        self.counters["written"] += len(rows)
+        self.counters["batches"] += bool(rows)
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+        return True
+
+    async def _commit(self, rows: List[models.ProcessingHistory]):
+        if self.asynchronous:
+            async with self.session_factory() as db:
+                db.add_all(rows)
+                await db.commit()
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self._commit_sync, rows)
+
+    def _commit_sync(self, rows: List[models.ProcessingHistory]):
+        # Not expired on commit, so ids and columns stay readable after close
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            db.add_all(rows)
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,192 @@
+"""Asynchronous jobs for algorithms that outlive a request timeout.
+
+Jobs are rows in ``processing_jobs``, so the queue is whatever database the
+app already uses (SQLite included) and survives restarts: on startup any
+job left queued or running is queued again. An in-process pool of
+``JOB_WORKERS`` asyncio workers picks jobs up and hands them to a handler
+coroutine, which does the actual processing and returns the id of the
+``ProcessingHistory`` row it wrote. Database work runs in worker threads.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueue:
+    """Queue of ``processing_jobs`` rows worked off by in-process asyncio workers.
+
+    Every database step runs on its own sync session in a worker thread,
+    as ``HistoryWriter`` commits do, so job state changes never block the
+    event loop. Jobs are handed out detached, with their columns (and
+    ``history``, from ``get``) already loaded.
+    """
+
+    def __init__(self, session_factory: Callable[..., Session],
+                 handler: Callable[[models.ProcessingJob], Awaitable[int]],
+                 workers: int = None):
+        self.session_factory = session_factory
+        self.handler = handler
+        self.workers = int(workers or os.getenv("JOB_WORKERS", 2))
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    async def start(self):
+        """Start the workers and requeue jobs a previous process left behind."""
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        for job_id in await self._in_thread(self._requeue):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Running jobs stay marked as running and are picked up on restart
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, algorithm: str, parameters: Dict[str, Any], original_hash: str) -> models.ProcessingJob:
+        job = models.ProcessingJob(
+            id=uuid.uuid4().hex,
+            status=QUEUED,
+            algorithm=algorithm,
+            parameters=parameters,
+            original_hash=original_hash,
+            history=None,
+        )
+        await self._in_thread(self._insert, job)
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[models.ProcessingJob]:
+        return await self._in_thread(self._load, job_id)
+
+    async def cancel(self, job: models.ProcessingJob) -> models.ProcessingJob:
+        """Cancel a queued or running job; finished jobs are left untouched."""
+        if job.status == QUEUED:
+            cancelled = await self._in_thread(self._cancel_queued, job.id)
+            if cancelled is not None:
+                return cancelled
+            # A worker picked it up in the meantime
+            job = await self.get(job.id)
+        if job.status == RUNNING and job.id in self._running:
+            # The worker records the cancellation once the task unwinds
+            self._running[job.id].cancel()
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running),
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await self._in_thread(self._claim, job_id)
+                # Cancelled (or already handled) while waiting in the queue
+                if job is None:
+                    continue
+
+                history_id, error = None, None
+                task = asyncio.ensure_future(self.handler(job))
+                self._running[job_id] = task
+                try:
+                    history_id = await task
+                    status = SUCCEEDED
+                except asyncio.CancelledError:
+                    if self._stopping:
+                        raise
+                    status = CANCELLED
+                except Exception as e:
+                    status = FAILED
+                    error = str(getattr(e, "detail", e))
+                finally:
+                    self._running.pop(job_id, None)
+
+                await self._in_thread(self._finish, job_id, status, history_id, error)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    async def _in_thread(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _session(self) -> Session:
+        # Not expired on commit, so jobs stay readable after the session closes
+        return self.session_factory(expire_on_commit=False)
+
+    def _requeue(self) -> List[str]:
+        db = self._session()
+        try:
+            pending = (
+                db.query(models.ProcessingJob)
+                .filter(models.ProcessingJob.status.in_([QUEUED, RUNNING]))
+                .order_by(models.ProcessingJob.created_at)
+                .all()
+            )
+            for job in pending:
+                job.status = QUEUED
+            db.commit()
+            return [job.id for job in pending]
+        finally:
+            db.close()
+
+    def _insert(self, job: models.ProcessingJob):
+        db = self._session()
+        try:
+            db.add(job)
+            db.commit()
+        finally:
+            db.close()
+
+    def _load(self, job_id: str) -> Optional[models.ProcessingJob]:
+        db = self._session()
+        try:
+            return db.get(models.ProcessingJob, job_id, options=[joinedload(models.ProcessingJob.history)])
+        finally:
+            db.close()
+
+    def _transition(self, job_id: str, current: str, **values) -> Optional[models.ProcessingJob]:
+        """Apply ``values`` if the job is still ``current``; returns the updated job, else ``None``."""
+        db = self._session()
+        try:
+            changed = (
+                db.query(models.ProcessingJob)
+                .filter(models.ProcessingJob.id == job_id, models.ProcessingJob.status == current)
+                .update(values, synchronize_session=False)
+            )
+            db.commit()
+            if not changed:
+                return None
+            return db.get(models.ProcessingJob, job_id, options=[joinedload(models.ProcessingJob.history)])
+        finally:
+            db.close()
+
+    def _claim(self, job_id: str) -> Optional[models.ProcessingJob]:
+        return self._transition(job_id, QUEUED, status=RUNNING, started_at=datetime.utcnow())
+
+    def _cancel_queued(self, job_id: str) -> Optional[models.ProcessingJob]:
+        return self._transition(job_id, QUEUED, status=CANCELLED, finished_at=datetime.utcnow())
+
+    def _finish(self, job_id: str, status: str, history_id: Optional[int], error: Optional[str]):
+        self._transition(job_id, RUNNING, status=status, history_id=history_id, error=error,
+                         finished_at=datetime.utcnow())
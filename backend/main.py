@@ -1,28 +1,37 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
+from fastapi.concurrency import run_in_threadpool
 import cv2
 import numpy as np
-from PIL import Image
-import io
 import base64
+import binascii
 from typing import Optional, Dict, Any
 import os
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-import re
-
-from .database import get_db, engine
-from .processors.edge_detection import EdgeDetectionProcessor
-from .processors.texture_analysis import TextureAnalysisProcessor
-from .processors.shape_detection import ShapeDetectionProcessor
-from .processors.image_enhancement import ImageEnhancementProcessor
-from .processors.geometric_transformation import GeometricTransformationProcessor
-from .processors.region_segmentation import RegionSegmentationProcessor
-from . import models, schemas
+from sqlalchemy import select
+import json
+import hashlib
+import asyncio
+import itertools
+from datetime import datetime
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+from .database import get_session, engine, SessionLocal, ASYNC_ENABLED, async_session_factory, init_db, check_schema
+from .executor import executor, ExecutorSaturated
+from .processors.registry import get_algorithm, list_algorithms, ParameterError
+from .processors.base import BaseProcessor
+from .processors.memo import MEMO
+from .processors.warp import REMAP_CACHE
+from .processors.results import ProcessorResult
+from .cache import ResultCache, image_digest
+from .storage import BlobStore, file_media_type, downscale
+from .preview import PYRAMID_LEVELS, preview_level, rescale_parameters
+from .pipeline import run_pipeline
+from .jobs import JobQueue, FINISHED, SUCCEEDED
+from .history import HistoryWriter
+from .warmup import selected_algorithms, warm_up
+from . import metrics, streaming
+from . import models, schemas
 
 # Load environment variables
 load_dotenv()
@@ -41,15 +50,342 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.TimingMiddleware)
 
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Image payloads for history rows, addressed by their SHA-256
+blob_store = BlobStore(os.path.join(UPLOAD_DIR, "blobs"))
+THUMBNAIL_SIZE = 256
+
+# Decoded pyramid levels of recently used images, keyed "<hash>:<size>"
+pyramid_cache = ResultCache(max_bytes=int(os.getenv("PYRAMID_CACHE_BYTES", 256 * 1024 * 1024)))
+
+# Processor results keyed on pixels + algorithm + parameters
+result_cache = ResultCache(
+    disk_dir=os.path.join(UPLOAD_DIR, "cache") if os.getenv("RESULT_CACHE_DISK") == "1" else None
+)
+
+# Output encodings for the binary endpoint: extension, media type, quality flag
+OUTPUT_FORMATS = {
+    "png": (".png", "image/png", cv2.IMWRITE_PNG_COMPRESSION),
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+MEDIA_TYPES = {media_type: name for name, (_, media_type, _) in OUTPUT_FORMATS.items()}
+# Structured result encodings for the binary endpoint
+RESULT_FORMATS = {
+    "json": "application/json",
+    "npz": "application/x-npz",
+}
+STREAM_CHUNK_SIZE = 64 * 1024
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+
+@app.on_event("startup")
+async def start_jobs():
+    # Deploys that run `python -m backend.migrate` set DB_CREATE_TABLES=0
+    if os.getenv("DB_CREATE_TABLES", "1") == "1":
+        await run_in_threadpool(init_db)
+    else:
+        await run_in_threadpool(check_schema)
+    await warm_up(executor, selected_algorithms())
+    await history_writer.start()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    await job_queue.stop()
+    await history_writer.stop()
+    executor.shutdown()
+    streaming.shutdown()
+
+async def run_processor(algorithm: str, img: np.ndarray, parameters: Dict[str, Any]) -> np.ndarray:
+    """Run an algorithm on the executor, mapping failures to HTTP errors.
+
+    ``parameters`` must come from ``coerce_parameters``. Results are served
+    from ``result_cache`` when the same pixels were already processed with
+    the same algorithm and parameters.
+    """
+    with metrics.stage("cache"):
+        # Hashed once: the processor's memo of intermediates is keyed on it too
+        digest = image_digest(img)
+        cache_key = result_cache.key(img, algorithm, parameters, digest)
+        processed = result_cache.get(cache_key)
+    if processed is not None:
+        return processed
+
+    # Run the processor on its pool so the event loop stays responsive
+    try:
+        with metrics.stage("process"):
+            processed = await executor.run(algorithm, img, parameters, digest)
+    except ExecutorSaturated:
+        raise busy_error()
+    except ParameterError as e:
+        # Parameters that pass the schema but not the image, e.g. a canvas too big to fit
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result_cache.put(cache_key, processed)
+    return processed
+
+async def run_analysis(algorithm: str, img: np.ndarray, parameters: Dict[str, Any],
+                       render: bool = True) -> ProcessorResult:
+    """Like ``run_processor``, for the processor's structured result."""
+    with metrics.stage("cache"):
+        digest = image_digest(img)
+        cache_key = f"{result_cache.key(img, algorithm, parameters, digest)}:analysis:{int(render)}"
+        result = result_cache.get(cache_key)
+    if result is not None:
+        return result
+
+    try:
+        with metrics.stage("process"):
+            result = await executor.analyze(algorithm, img, parameters, render, digest)
+    except ExecutorSaturated:
+        raise busy_error()
+    except ParameterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result_cache.put(cache_key, result)
+    return result
+
+def coerce_parameters(algorithm: str, parameters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validate parameters against the algorithm's schema and fill in defaults."""
+    try:
+        return get_algorithm(algorithm).coerce(parameters)
+    except ParameterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+def parse_flag(value, default: bool = True) -> bool:
+    """Read a boolean query or form field ("false", "0" and "no" are false)."""
+    if value is None:
+        return default
+    return str(value).lower() not in ("false", "0", "no")
+
+def parse_quality(value) -> Optional[int]:
+    """Read an optional ``quality`` query or form field: an integer from 0 to 100."""
+    if value is None:
+        return None
+    try:
+        quality = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="quality must be an integer")
+    if not 0 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="quality must be between 0 and 100")
+    return quality
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Pick the output format from an explicit ?format= or the Accept header."""
+    if requested:
+        requested = requested.lower().replace("jpg", "jpeg")
+        if requested not in OUTPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported output format: {requested}")
+        return requested
+
+    # Highest q-value wins; ties keep the client's order
+    candidates = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in MEDIA_TYPES and quality > 0:
+            candidates.append((-quality, position, MEDIA_TYPES[media_type]))
+    return min(candidates)[2] if candidates else "png"
+
+def encode_output(processed: np.ndarray, output_format: str, quality: Optional[int]) -> np.ndarray:
+    """Encode a processed image; ``quality`` is 0-100 (PNG maps it to compression).
+
+    PNG keeps 16-bit results; JPEG and WebP only take 8-bit, so they get the
+    result scaled down to it.
+    """
+    extension, _, quality_flag = OUTPUT_FORMATS[output_format]
+    if processed.dtype != np.uint8 and output_format != "png":
+        processed = BaseProcessor.to_uint8(processed)
+    params = []
+    if quality is not None:
+        if output_format == "png":
+            # Higher quality means less work spent compressing
+            quality = 9 - quality * 9 // 100
+        params = [quality_flag, quality]
+
+    ok, buffer = cv2.imencode(extension, processed, params)
+    if not ok:
+        raise HTTPException(status_code=500, detail=f"cv2.imencode failed for {output_format}")
+    return buffer
+
+def decode_flags(algorithm: str) -> int:
+    """Luminance-only algorithms get their input decoded straight to grayscale.
+
+    16-bit images (PNG, TIFF) keep their depth. Filters work on them in
+    float32 and return 8-bit results; warps and histogram equalization
+    return 16-bit ones.
+    """
+    flags = cv2.IMREAD_GRAYSCALE if get_algorithm(algorithm).grayscale_input else cv2.IMREAD_COLOR
+    return flags | cv2.IMREAD_ANYDEPTH
+
+def decode_base64(data: str) -> bytes:
+    """Decode base64 in a single pass, tolerating line breaks and missing padding.
+
+    ``binascii.a2b_base64`` skips characters outside the alphabet as it
+    goes, so the payload is never rewritten; only a payload that is short
+    of padding is decoded a second time.
+    """
+    try:
+        return binascii.a2b_base64(data)
+    except binascii.Error as e:
+        if "padding" not in str(e):
+            raise
+    # Surplus padding after the last group is ignored
+    return binascii.a2b_base64(data + "==")
+
+def decode_image_payload(image: str, flags: int = cv2.IMREAD_COLOR):
+    """Decode a base64 string or data URL into its bytes and an image.
+
+    ``flags`` is passed to ``cv2.imdecode``; see ``decode_flags``.
+    """
+    with metrics.stage("b64decode"):
+        # Data URL prefix: everything up to the comma (never part of base64)
+        comma = image.find(",")
+        if comma >= 0:
+            image = image[comma + 1:]
+        try:
+            image_bytes = decode_base64(image)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=400, detail="Base64 decode error.")
+
+    return image_bytes, decode_image_bytes(image_bytes, flags)
+
+def decode_image_bytes(image_bytes, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """Decode encoded image bytes, answering 400 for anything that is not an image."""
+    if not len(image_bytes):
+        raise HTTPException(status_code=400, detail="Empty image")
+    with metrics.stage("imdecode"):
+        try:
+            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flags)
+        except cv2.error:
+            img = None
+    if img is None:
+        raise HTTPException(status_code=400, detail="cv2.imdecode failed: Invalid image bytes")
+    return img
+
+def require_known_hash(digest: str) -> str:
+    """Check that an image hash refers to a stored upload."""
+    try:
+        known = blob_store.exists(digest)
+    except ValueError:
+        known = False
+    if not known:
+        raise HTTPException(status_code=404, detail=f"Unknown image hash {digest}, send the image instead")
+    return digest
+
+async def store_upload(image_bytes, img: np.ndarray) -> str:
+    """Keep an uploaded image in the blob store, building its pyramid when new.
+
+    Pyramid levels are stored in colour, so they are only built from colour
+    decodes; after a grayscale decode they are rendered on first use.
+    """
+    with metrics.stage("store"):
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        if not blob_store.exists(digest):
+            blob_store.put(image_bytes, digest=digest)
+            if img.ndim == 3:
+                await run_in_threadpool(blob_store.build_pyramid, digest, img, PYRAMID_LEVELS)
+    return digest
+
+async def load_image(digest: str, size: int = 0, img: Optional[np.ndarray] = None,
+                     flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """Return a stored image at full resolution (``size=0``) or a pyramid level.
+
+    Levels come from memory when possible, then from ``img`` if the caller
+    already decoded the full image (with the same ``flags``), and finally
+    from the blob store.
+    """
+    key = f"{digest}:{size}" if flags == cv2.IMREAD_COLOR else f"{digest}:{size}:{flags}"
+    level = pyramid_cache.get(key)
+    if level is not None:
+        return level
+
+    if img is not None:
+        level = downscale(img, size) if size else img
+        if size:
+            pyramid_cache.put(key, level)
+        return level
+
+    path = blob_store.thumbnail(digest, size) if size else blob_store.path(digest)
+    with metrics.stage("imread"):
+        level = await run_in_threadpool(cv2.imread, path, flags)
+    if level is None:
+        raise HTTPException(status_code=400, detail=f"Stored image {digest} could not be decoded")
+    pyramid_cache.put(key, level)
+    return level
+
+def history_row(algorithm: str, parameters: Dict[str, Any], original_hash: str, img: np.ndarray,
+                processed_hash: str, processed: np.ndarray) -> models.ProcessingHistory:
+    return models.ProcessingHistory(
+        original_hash=original_hash,
+        original_width=img.shape[1],
+        original_height=img.shape[0],
+        processed_hash=processed_hash,
+        processed_width=processed.shape[1],
+        processed_height=processed.shape[0],
+        algorithm=algorithm,
+        parameters=parameters,
+        # Set here: the row is committed later, in a batch
+        created_at=datetime.utcnow(),
+    )
+
+def record_history(algorithm: str, parameters: Dict[str, Any], original_hash: str,
+                   img: np.ndarray, processed_bytes, processed: np.ndarray) -> models.ProcessingHistory:
+    """Write the processed image to the blob store and queue a history row.
+
+    The row is committed in the background by ``history_writer``.
+    """
+    with metrics.stage("blob"):
+        processed_hash = blob_store.put(processed_bytes)
+    history = history_row(algorithm, parameters, original_hash, img, processed_hash, processed)
+    history_writer.submit(history)
+    return history
+
+def image_links(digest: Optional[str], width: Optional[int], height: Optional[int]) -> Optional[Dict[str, Any]]:
+    if digest is None:
+        return None
+    return {
+        "hash": digest,
+        "width": width,
+        "height": height,
+        "url": f"/images/{digest}",
+        "thumbnail_url": f"/images/{digest}?size={THUMBNAIL_SIZE}",
+    }
+
+def stream_buffer(buffer: np.ndarray):
+    """Yield an encoded buffer in chunks without copying it."""
+    view = memoryview(buffer).cast("B")
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        yield view[start:start + STREAM_CHUNK_SIZE]
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to VisionX API"}
 
+@app.get("/algorithms")
+async def get_algorithms():
+    """List every algorithm with its parameter schema, in display order."""
+    return {"algorithms": [spec.schema() for spec in list_algorithms()]}
+
 @app.post("/upload")
 async def upload_image(file: UploadFile = File(...)):
     try:
@@ -70,90 +406,418 @@ async def upload_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/process")
-async def process_image(payload: schemas.ProcessImageRequest, db: Session = Depends(get_db)):
-    print(f"[RAW BASE64] First 100 chars: {payload.image[:100]}")
-    print(f"[RAW BASE64] Length: {len(payload.image)}")
-
+async def process_image(payload: schemas.ProcessImageRequest):
     try:
         algorithm = payload.algorithm
-        parameters = payload.parameters
-        image = payload.image
-        # print("tired af")
-        
-                
-        if ',' in image:
-            image = image.split(',')[1]
-
-        # Fix padding issues: base64 strings must be length % 4 == 0
-        image = image.strip().replace('\n', '').replace('\r', '')
-        image = re.sub(r'[^A-Za-z0-9+/=]', '', image)
-
-        # Pad if needed
-        missing_padding = len(image) % 4
-        if missing_padding != 0:
-            image += '=' * (4 - missing_padding)
+        parameters = coerce_parameters(algorithm, payload.parameters)
+        flags = decode_flags(algorithm)
+        img = None
+
+        if payload.image_hash:
+            # Re-processing an image the server has already seen
+            digest = require_known_hash(payload.image_hash)
+        elif payload.image:
+            image_bytes, img = decode_image_payload(payload.image, flags)
+            digest = await store_upload(image_bytes, img)
+        else:
+            raise HTTPException(status_code=400, detail="Send either image or image_hash")
+
+        full = await load_image(digest, 0, img, flags)
+        height, width = full.shape[:2]
+        metrics.set_labels(algorithm, width, height)
+
+        # Previews run on a pyramid level with pixel-sized parameters scaled to match
+        level = preview_level(width, height, payload.preview_size) if payload.preview else 0
+        if level:
+            source = await load_image(digest, level, img, flags)
+            scale = source.shape[1] / width
+            parameters = rescale_parameters(algorithm, parameters, scale)
+        else:
+            source = full
+            scale = 1.0
+
+        response = {
+            "imageHash": digest,
+            "preview": payload.preview,
+            "scale": scale,
+            "message": "Image processed successfully"
+        }
+
+        if payload.results or not payload.render:
+            # Structured outputs are in the coordinates of the processed level
+            result = await run_analysis(algorithm, source, parameters, payload.render)
+            response["results"] = result.to_json()
+            processed = result.image
+        else:
+            processed = await run_processor(algorithm, source, parameters)
+
+        if processed is None:
+            return response
+
+        with metrics.stage("imencode"):
+            _, buffer = cv2.imencode('.png', processed)
+        with metrics.stage("b64encode"):
+            processed_base64 = base64.b64encode(buffer).decode('utf-8')
+        response["processedImage"] = f"data:image/png;base64,{processed_base64}"
+
+        # Only committed full-resolution runs go into the history
+        if not payload.preview:
+            record_history(algorithm, parameters, digest, full, buffer, processed)
+
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/process/binary")
+async def process_image_binary(request: Request):
+    """Process raw image bytes and stream back the encoded result.
+
+    The image is the request body (``application/octet-stream`` or any
+    ``image/*`` type) or a ``file`` field of a multipart form. ``algorithm``,
+    ``format``, ``quality`` and an optional JSON ``parameters`` object come
+    from query or form fields; any other query field is passed to the
+    algorithm as a parameter. Without ``format`` the Accept header decides
+    between PNG, JPEG and WebP.
+
+    ``format=json`` or ``format=npz`` returns the structured results
+    (lines, contours, labels, texture maps) instead; add ``render=false``
+    to skip drawing the output image altogether.
+    """
+    fields = dict(request.query_params)
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart body needs a 'file' field")
+        image_bytes = await upload.read()
+        fields.update({key: value for key, value in form.items() if isinstance(value, str)})
+    else:
+        image_bytes = await request.body()
+
+    algorithm = fields.pop("algorithm", None)
+    if not algorithm:
+        raise HTTPException(status_code=400, detail="Missing 'algorithm' field")
+    requested_format = fields.pop("format", None)
+    render = parse_flag(fields.pop("render", None))
+    if requested_format in RESULT_FORMATS or not render:
+        output_format = requested_format or "json"
+        if output_format not in RESULT_FORMATS:
+            raise HTTPException(status_code=400, detail="render=false needs format=json or format=npz")
+    else:
+        output_format = negotiate_format(requested_format, request.headers.get("accept"))
+    quality = parse_quality(fields.pop("quality", None))
+
+    try:
+        parameters = json.loads(fields.pop("parameters", "{}"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'parameters' must be a JSON object")
+    if not isinstance(parameters, dict):
+        raise HTTPException(status_code=400, detail="'parameters' must be a JSON object")
+    parameters.update(fields)
+    parameters = coerce_parameters(algorithm, parameters)
+
+    img = decode_image_bytes(image_bytes, decode_flags(algorithm))
+    metrics.set_labels(algorithm, img.shape[1], img.shape[0])
+
+    if output_format in RESULT_FORMATS:
+        # Structured results are returned as they are and not kept in the history
         try:
-            image_bytes = base64.b64decode(image, validate=True)
+            result = await run_analysis(algorithm, img, parameters, render)
+        except HTTPException:
+            raise
         except Exception as e:
-            print("---- BASE64 DECODE FAILED ----")
-            print(f"Image Length: {len(image)}")
-            print(f"Base64 Error: {e}")
-            with open("failed_base64.txt", "w") as f:
-                f.write(image)  # Save for analysis
-            raise HTTPException(status_code=400, detail="Base64 decode error.")
-        # print("iski mkc")
-        # Step 4: Decode image
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        # print(img)
-        if img is None:
-            # Save broken image to debug (optional)
-            with open("broken_image.png", "wb") as f:
-                print("hoiii")
-                f.write(image_bytes)
-                print(image_bytes)
-            raise HTTPException(status_code=400, detail="cv2.imdecode failed: Invalid image bytes")
-
-        # Process image (same as before)
-        if algorithm in ['canny', 'log', 'dog']:
-            processed = EdgeDetectionProcessor.process(img, algorithm, parameters)
-        elif algorithm == 'glcm':
-            processed = TextureAnalysisProcessor.process(img, algorithm, parameters)
-        elif algorithm in ['hough', 'chain']:
-            processed = ShapeDetectionProcessor.process(img, algorithm, parameters)
-        elif algorithm == 'histogram':
-            processed = ImageEnhancementProcessor.process(img, algorithm, parameters)
-        elif algorithm == 'affine':
-            processed = GeometricTransformationProcessor.process(img, algorithm, parameters)
-        elif algorithm in ['region-growing', 'split-merge']:
-            processed = RegionSegmentationProcessor.process(img, algorithm, parameters)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown algorithm: {algorithm}")
+            raise HTTPException(status_code=500, detail=str(e))
 
-        _, buffer = cv2.imencode('.png', processed)
-        processed_base64 = base64.b64encode(buffer).decode('utf-8')
+        if output_format == "npz":
+            return Response(result.to_npz(), media_type=RESULT_FORMATS["npz"])
+        content = {"results": result.to_json()}
+        if result.image is not None:
+            _, buffer = cv2.imencode('.png', result.image)
+            content["processedImage"] = f"data:image/png;base64,{base64.b64encode(buffer).decode('utf-8')}"
+        return JSONResponse(content)
 
-        history = models.ProcessingHistory(
-            original_image=image,
-            processed_image=processed_base64,
-            algorithm=algorithm,
-            parameters=parameters
+    try:
+        processed = await run_processor(algorithm, img, parameters)
+        with metrics.stage("imencode"):
+            buffer = encode_output(processed, output_format, quality)
+        digest = await store_upload(image_bytes, img)
+        record_history(algorithm, parameters, digest, img, buffer, processed)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        stream_buffer(buffer),
+        media_type=OUTPUT_FORMATS[output_format][1],
+        headers={"Content-Length": str(buffer.size), "Vary": "Accept"}
+    )
+
+@app.post("/process/batch")
+async def process_batch(payload: schemas.BatchProcessRequest):
+    """Run one algorithm over many images and/or a grid of parameters.
+
+    Every image is decoded once up front. Each (image, parameter
+    combination) pair is then fanned out to the executor, and results are
+    streamed back as NDJSON lines in completion order. Successful results
+    are written to the history in a single bulk insert once the batch
+    finishes, and a final ``{"done": true, ...}`` line closes the stream.
+    """
+    algorithm = payload.algorithm
+    names = list(payload.parameter_grid)
+    combinations = [
+        coerce_parameters(algorithm, {**payload.parameters, **dict(zip(names, values))})
+        for values in itertools.product(*(payload.parameter_grid[name] for name in names))
+    ]
+    image_count = len(payload.images) + len(payload.image_hashes)
+    if image_count == 0:
+        raise HTTPException(status_code=400, detail="Send at least one image or image hash")
+    if image_count * len(combinations) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch expands to {image_count * len(combinations)} runs, the limit is {BATCH_MAX_ITEMS}"
         )
-        db.add(history)
-        db.commit()
+
+    # Decode each image exactly once
+    flags = decode_flags(algorithm)
+    sources = []
+    for image in payload.images:
+        image_bytes, img = await run_in_threadpool(decode_image_payload, image, flags)
+        sources.append((await store_upload(image_bytes, img), img))
+    for digest in payload.image_hashes:
+        require_known_hash(digest)
+        sources.append((digest, await load_image(digest, flags=flags)))
+
+    # Keep the pool busy without tripping its backpressure limit
+    limit = asyncio.Semaphore(executor.concurrency(algorithm))
+
+    async def run_one(index: int, image_index: int, parameters: Dict[str, Any]):
+        digest, img = sources[image_index]
+        async with limit:
+            try:
+                processed = await run_processor(algorithm, img, parameters)
+                _, buffer = await run_in_threadpool(cv2.imencode, '.png', processed)
+                processed_hash = await run_in_threadpool(blob_store.put, buffer)
+            except HTTPException as e:
+                return index, image_index, parameters, None, None, None, str(e.detail)
+            except Exception as e:
+                return index, image_index, parameters, None, None, None, str(e)
+        return index, image_index, parameters, buffer, processed, processed_hash, None
+
+    async def stream():
+        tasks = [
+            asyncio.ensure_future(run_one(index, image_index, parameters))
+            for index, (image_index, parameters) in enumerate(
+                itertools.product(range(len(sources)), combinations)
+            )
+        ]
+        rows = []
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                index, image_index, parameters, buffer, processed, processed_hash, error = await next_result
+                line = {
+                    "index": index,
+                    "imageIndex": image_index,
+                    "imageHash": sources[image_index][0],
+                    "parameters": parameters,
+                }
+                if error is None:
+                    line["processedImage"] = f"data:image/png;base64,{base64.b64encode(buffer).decode('utf-8')}"
+                    rows.append(history_row(
+                        algorithm, parameters, sources[image_index][0], sources[image_index][1],
+                        processed_hash, processed
+                    ))
+                else:
+                    line["error"] = error
+                yield json.dumps(line) + "\n"
+        finally:
+            # Stop outstanding work if the client went away mid-stream
+            for task in tasks:
+                task.cancel()
+
+        history_writer.submit(*rows)
+        yield json.dumps({"done": True, "count": len(tasks), "errors": len(tasks) - len(rows)}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/pipeline")
+async def process_pipeline(payload: schemas.PipelineRequest):
+    """Run an ordered list of stages, keeping intermediates in memory.
+
+    Stage outputs are cached per prefix, so changing a later stage's
+    parameters recomputes only that stage and the ones after it. The
+    response carries the final image plus per-stage timings, and every
+    stage's image when ``return_intermediates`` is set.
+    """
+    if not payload.stages:
+        raise HTTPException(status_code=400, detail="A pipeline needs at least one stage")
+    stages = [
+        {"algorithm": stage.algorithm, "parameters": coerce_parameters(stage.algorithm, stage.parameters)}
+        for stage in payload.stages
+    ]
+
+    # The source is decoded the way the first stage wants it, keeping 16-bit depth
+    flags = decode_flags(stages[0]["algorithm"])
+    try:
+        img = None
+        if payload.image_hash:
+            digest = require_known_hash(payload.image_hash)
+        elif payload.image:
+            image_bytes, img = decode_image_payload(payload.image, flags)
+            digest = await store_upload(image_bytes, img)
+        else:
+            raise HTTPException(status_code=400, detail="Send either image or image_hash")
+        source = await load_image(digest, 0, img, flags=flags)
+        metrics.set_labels("pipeline", source.shape[1], source.shape[0])
+
+        try:
+            results = await run_pipeline(digest, source, stages, result_cache)
+        except ExecutorSaturated:
+            raise busy_error()
+        except ParameterError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        final = results[-1]["output"]
+        _, buffer = cv2.imencode('.png', final)
+        record_history("pipeline", {"stages": stages}, digest, source, buffer, final)
+
+        stage_reports = []
+        for result in results:
+            report = {key: result[key] for key in ("algorithm", "parameters", "cached", "seconds")}
+            if payload.return_intermediates:
+                _, stage_buffer = cv2.imencode('.png', result["output"])
+                report["image"] = f"data:image/png;base64,{base64.b64encode(stage_buffer).decode('utf-8')}"
+            stage_reports.append(report)
 
         return {
-            "processedImage": f"data:image/png;base64,{processed_base64}",
-            "message": "Image processed successfully"
+            "processedImage": f"data:image/png;base64,{base64.b64encode(buffer).decode('utf-8')}",
+            "imageHash": digest,
+            "stages": stage_reports,
+            "message": "Pipeline processed successfully"
         }
-
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def run_job(job: models.ProcessingJob) -> int:
+    """Process a queued job and return the id of its history row."""
+    source = await load_image(job.original_hash, flags=decode_flags(job.algorithm))
+    while True:
+        try:
+            processed = await run_processor(job.algorithm, source, job.parameters)
+            break
+        except HTTPException as e:
+            # Interactive traffic has the pools full; wait for room instead of failing
+            if e.status_code != 503:
+                raise
+            await asyncio.sleep(0.5)
+
+    _, buffer = await run_in_threadpool(cv2.imencode, '.png', processed)
+    processed_hash = await run_in_threadpool(blob_store.put, buffer)
+    history = history_row(job.algorithm, job.parameters, job.original_hash, source, processed_hash, processed)
+    # Wait for the batch commit: the job links to the row by id
+    return (await history_writer.write(history)).id
+
+# Sync sessions commit in a worker thread; DB_ASYNC=1 awaits an async session instead
+history_writer = HistoryWriter(async_session_factory() if ASYNC_ENABLED else SessionLocal, asynchronous=ASYNC_ENABLED)
+
+job_queue = JobQueue(SessionLocal, run_job)
+
+def job_status(job: models.ProcessingJob) -> Dict[str, Any]:
+    history = job.history
+    return {
+        "id": job.id,
+        "status": job.status,
+        "algorithm": job.algorithm,
+        "parameters": job.parameters,
+        "imageHash": job.original_hash,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "history_id": job.history_id,
+        "result": image_links(history.processed_hash, history.processed_width, history.processed_height)
+        if history else None,
+    }
+
+async def get_job_or_404(job_id: str) -> models.ProcessingJob:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(payload: schemas.ProcessImageRequest):
+    """Queue a processing run and return its id straight away.
+
+    Poll ``/jobs/{id}`` for progress; the processed image is linked from
+    the status once the job has succeeded.
+    """
+    parameters = coerce_parameters(payload.algorithm, payload.parameters)
+    if payload.image_hash:
+        digest = require_known_hash(payload.image_hash)
+    elif payload.image:
+        image_bytes, img = await run_in_threadpool(decode_image_payload, payload.image)
+        digest = await store_upload(image_bytes, img)
+    else:
+        raise HTTPException(status_code=400, detail="Send either image or image_hash")
+
+    job = await job_queue.submit(payload.algorithm, parameters, digest)
+    return job_status(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return job_status(await get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await get_job_or_404(job_id)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    path = blob_store.path(job.history.processed_hash)
+    return FileResponse(path, media_type=file_media_type(path))
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await get_job_or_404(job_id)
+    if job.status in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    return job_status(await job_queue.cancel(job))
+
+@app.websocket("/stream")
+async def stream_frames(websocket: WebSocket):
+    """Process a stream of binary frames with one algorithm; see ``backend/streaming.py``."""
+    await streaming.FrameStream(websocket, encode_output, OUTPUT_FORMATS).run()
+
+async def fetch_all(db, query) -> list:
+    """Rows of a select, awaited on an async session or run in a thread on a sync one."""
+    if ASYNC_ENABLED:
+        return (await db.execute(query)).scalars().all()
+    return await run_in_threadpool(lambda: db.execute(query).scalars().all())
+
 @app.get("/history")
-async def get_history(db: Session = Depends(get_db)):
+async def get_history(limit: int = 50, cursor: Optional[int] = None, db=Depends(get_session)):
+    """Page through history metadata, newest first.
+
+    Pass the returned ``next_cursor`` as ``cursor`` to get the next page.
+    Images are linked, not inlined; fetch them from ``/images/{hash}``.
+    """
+    limit = min(max(limit, 1), 200)
     try:
-        history = db.query(models.ProcessingHistory).all()
+        # Rows still in the write-behind buffer belong on the first page
+        await history_writer.flush()
+        query = select(models.ProcessingHistory).order_by(models.ProcessingHistory.id.desc())
+        if cursor is not None:
+            query = query.where(models.ProcessingHistory.id < cursor)
+        history = await fetch_all(db, query.limit(limit + 1))
+
+        page = history[:limit]
         return {
             "history": [
                 {
@@ -161,15 +825,120 @@ async def get_history(db: Session = Depends(get_db)):
                     "algorithm": h.algorithm,
                     "parameters": h.parameters,
                     "created_at": h.created_at.isoformat(),
-                    "original_image": h.original_image,
-                    "processed_image": h.processed_image
+                    "original": image_links(h.original_hash, h.original_width, h.original_height),
+                    "processed": image_links(h.processed_hash, h.processed_width, h.processed_height),
                 }
-                for h in history
-            ]
+                for h in page
+            ],
+            "next_cursor": page[-1].id if len(history) > limit else None
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/images/{digest}")
+async def get_image(digest: str, request: Request, size: Optional[int] = None):
+    """Serve a stored image, or a variant at most ``size`` pixels on a side.
+
+    Blobs never change once written, so responses carry a strong ETag and
+    can be cached indefinitely.
+    """
+    try:
+        if not blob_store.exists(digest):
+            raise HTTPException(status_code=404, detail="Image not found")
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{digest}"' if size is None else f'"{digest}.{size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if size is None:
+        path = blob_store.path(digest)
+    else:
+        if size < 1:
+            raise HTTPException(status_code=400, detail="size must be positive")
+        try:
+            path = blob_store.thumbnail(digest, size)
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+
+    return FileResponse(path, media_type=file_media_type(path), headers=headers)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+CACHES = {"result": result_cache, "pyramid": pyramid_cache, "memo": MEMO, "remap": REMAP_CACHE}
+CACHE_OUTCOMES = {"hits": "hit", "disk_hits": "disk_hit", "misses": "miss"}
+DB_POOL_STATES = ("size", "checkedin", "checkedout", "overflow")
+
+def db_pool_usage() -> Dict[tuple, int]:
+    """Connection counts of the engine's pool; pools without them report nothing."""
+    usage = {}
+    for state in DB_POOL_STATES:
+        count = getattr(engine.pool, state, None)
+        if callable(count):
+            usage[(state,)] = count()
+    return usage
+
+metrics.registry.counter(
+    "visionx_cache_lookups_total", "Cache lookups by outcome.",
+    lambda: {
+        (name, outcome): cache.counters[counter]
+        for name, cache in CACHES.items() for counter, outcome in CACHE_OUTCOMES.items()
+    },
+    ("cache", "result"),
+)
+metrics.registry.gauge(
+    "visionx_cache_hit_ratio", "Share of lookups answered from memory or disk since startup.",
+    lambda: {(name,): cache.stats()["hit_rate"] for name, cache in CACHES.items()}, ("cache",),
+)
+metrics.registry.gauge(
+    "visionx_cache_bytes", "Bytes held in each cache's memory tier.",
+    lambda: {(name,): cache.stats()["bytes"] for name, cache in CACHES.items()}, ("cache",),
+)
+metrics.registry.gauge(
+    "visionx_executor_in_flight", "Processor calls running or waiting per pool.",
+    lambda: {(pool,): stats["in_flight"] for pool, stats in executor.stats().items()}, ("pool",),
+)
+metrics.registry.gauge(
+    "visionx_executor_capacity", "Calls a pool accepts before answering 503.",
+    lambda: {(pool,): stats["capacity"] for pool, stats in executor.stats().items()}, ("pool",),
+)
+metrics.registry.gauge(
+    "visionx_jobs", "Background jobs waiting or running in this process.",
+    lambda: {(state,): job_queue.stats()[state] for state in ("queued", "running")}, ("state",),
+)
+metrics.registry.gauge(
+    "visionx_history_pending", "History rows buffered for the next batch commit.",
+    lambda: history_writer.stats()["pending"],
+)
+metrics.registry.counter(
+    "visionx_history_rows_total", "History rows by what became of them.",
+    lambda: {(outcome,): history_writer.counters[outcome] for outcome in ("written", "dropped")}, ("outcome",),
+)
+metrics.registry.counter(
+    "visionx_history_commits_total", "Batch commits of history rows by result.",
+    lambda: {("ok",): history_writer.counters["batches"], ("failed",): history_writer.counters["failures"]},
+    ("result",),
+)
+metrics.registry.counter(
+    "visionx_stream_frames_total", "Frames received over /stream by what became of them.",
+    lambda: {(outcome,): count for outcome, count in streaming.counters.items()}, ("outcome",),
+)
+metrics.registry.gauge(
+    "visionx_streams_active", "Open /stream connections.", lambda: streaming.active_streams,
+)
+metrics.registry.gauge(
+    "visionx_db_pool_connections", "Database pool connections by state.", db_pool_usage, ("state",),
+)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Latency histograms, cache, pool and queue gauges in Prometheus text format."""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
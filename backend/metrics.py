@@ -0,0 +1,261 @@
+"""Latency histograms and gauges exposed in the Prometheus text format.
+
+Request handlers wrap their hot-path stages (base64, ``cv2.imdecode``, the
+processor, ``cv2.imencode``, the blob write) in ``stage(name)``. The
+durations land on a per-request timer held in a context variable, so
+helpers deep in the call stack can be timed without passing it around,
+and cost nothing when no request is being timed. When the request
+finishes, ``TimingMiddleware`` records every stage in
+``visionx_stage_duration_seconds`` and the whole request in
+``visionx_request_duration_seconds``, both labelled with the algorithm and
+image-size bucket the handler reported through ``set_labels``.
+
+Sending ``X-Server-Timing: 1`` with a request adds a ``Server-Timing``
+header with the same stage durations to its response.
+
+Everything else (cache hit rates, pool and queue depth, DB connections) is
+read from the live objects at scrape time through gauge callbacks.
+"""
+import bisect
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds of the image-size label, in megapixels
+SIZE_BUCKETS = (0.25, 1, 4, 16, 64)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+TIMING_HEADER = b"x-server-timing"
+
+
+def size_bucket(width: int, height: int) -> str:
+    """Image-size label: the smallest bucket the image fits, e.g. ``"4MP"``."""
+    megapixels = width * height / 1e6
+    for bound in SIZE_BUCKETS:
+        if megapixels <= bound:
+            return f"{bound:g}MP"
+    return "+Inf"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Callback:
+    """A gauge or counter whose samples are read from ``collect`` at scrape time.
+
+    ``collect`` returns a number, or a dict mapping label-value tuples to
+    numbers.
+    """
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Any],
+                 labelnames: Sequence[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self) -> Iterable[str]:
+        samples = self.collect()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, value in samples.items():
+            if value is not None:
+                yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric registered twice: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, collect: Callable[[], Any], labelnames: Sequence[str] = ()) -> Callback:
+        return self._add(Callback(name, help, collect, labelnames))
+
+    def counter(self, name: str, help: str, collect: Callable[[], Any], labelnames: Sequence[str] = ()) -> Callback:
+        """A counter read from an existing running total (such as cache stats)."""
+        return self._add(Callback(name, help, collect, labelnames, kind="counter"))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "visionx_stage_duration_seconds",
+    "Time spent in one stage of a request.",
+    ("endpoint", "stage", "algorithm", "size"),
+)
+REQUEST_SECONDS = registry.histogram(
+    "visionx_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    ("endpoint", "method", "status", "algorithm", "size"),
+)
+
+
+class RequestTimer:
+    """Stage durations and labels collected over one request."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.labels: Dict[str, str] = {}
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage ``name`` of the current request, if any.
+
+    A stage entered several times in one request accumulates.
+    """
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.stages[name] += time.perf_counter() - start
+
+
+def set_labels(algorithm: str = None, width: int = None, height: int = None):
+    """Label the current request with its algorithm and image size."""
+    timer = _current.get()
+    if timer is None:
+        return
+    if algorithm is not None:
+        timer.labels["algorithm"] = algorithm
+    if width is not None and height is not None:
+        timer.labels["size"] = size_bucket(width, height)
+
+
+class TimingMiddleware:
+    """ASGI middleware that times every HTTP request and records its stages."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer()
+        token = _current.set(timer)
+        start = time.perf_counter()
+        wants_timing = any(name == TIMING_HEADER and value not in (b"0", b"false")
+                           for name, value in scope.get("headers", ()))
+        status = [0]
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                # Stages that run while a body streams are not counted
+                total = time.perf_counter() - start
+                self._record(scope, timer, total, status[0])
+                if wants_timing:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timer.server_timing(total).encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _current.reset(token)
+            if status[0] == 0:
+                # Failed before a response was started
+                self._record(scope, timer, time.perf_counter() - start, 500)
+
+    @staticmethod
+    def _record(scope, timer: RequestTimer, total: float, status: int):
+        # The route template keeps label cardinality bounded
+        route = scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        algorithm = timer.labels.get("algorithm", "")
+        size = timer.labels.get("size", "")
+        for name, seconds in timer.stages.items():
+            STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=name, algorithm=algorithm, size=size)
+        REQUEST_SECONDS.observe(
+            total, endpoint=endpoint, method=scope["method"], status=str(status), algorithm=algorithm, size=size
+        )
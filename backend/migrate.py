@@ -0,0 +1,116 @@
+"""Create the database schema and upgrade tables written by older releases.
+
+    python -m backend.migrate
+
+Run once per deploy before starting the API workers with
+``DB_CREATE_TABLES=0``, so worker start-up never waits on DDL.
+
+``processing_history`` used to keep both images inline as base64 text
+(``original_image``, ``processed_image``). Upgrading it adds the blob
+columns, moves every image into the blob store, records its hash and
+dimensions, and only then drops the old columns. Rows whose images cannot
+be decoded keep their old columns, and are listed, for a manual look.
+"""
+from typing import List
+
+import cv2
+import numpy as np
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine, make_url
+
+from .database import engine, init_db, SQLALCHEMY_DATABASE_URL
+from .storage import BlobStore
+
+LEGACY_HISTORY_COLUMNS = ("original_image", "processed_image")
+
+# Rows read, converted and committed at a time
+BACKFILL_BATCH = 100
+
+
+def store_payload(blob_store: BlobStore, payload: str, decode):
+    """Move one base64 image (or data URL) into the blob store.
+
+    Returns its (hash, width, height); raises ValueError when it is not an image.
+    """
+    if "," in payload:
+        payload = payload.split(",", 1)[1]
+    data = decode(payload)
+    try:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    except cv2.error:
+        # Raised instead of returning None for some input, empty buffers among it
+        image = None
+    if image is None:
+        raise ValueError("not a decodable image")
+    return blob_store.put(data), image.shape[1], image.shape[0]
+
+
+def upgrade_history(bind: Engine, blob_store: BlobStore, decode) -> List[int]:
+    """Move inline history images to the blob store; returns the ids that could not be moved."""
+    from .models import ProcessingHistory
+
+    table = ProcessingHistory.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    legacy = [name for name in LEGACY_HISTORY_COLUMNS if name in existing]
+    if not legacy:
+        return []
+
+    with bind.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                kind = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {kind}"))
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+    # Walk the table by id, so rows that fail are passed over rather than retried
+    failed, last_id = [], 0
+    select_rows = text(
+        f"SELECT id, {', '.join(legacy)} FROM {table.name} "
+        "WHERE id > :last_id AND original_hash IS NULL AND processed_hash IS NULL "
+        "ORDER BY id LIMIT :limit"
+    )
+    update_row = text(
+        f"UPDATE {table.name} SET original_hash = :original_hash, original_width = :original_width, "
+        "original_height = :original_height, processed_hash = :processed_hash, "
+        "processed_width = :processed_width, processed_height = :processed_height WHERE id = :id"
+    )
+    while True:
+        with bind.begin() as connection:
+            rows = connection.execute(select_rows, {"last_id": last_id, "limit": BACKFILL_BATCH}).mappings().all()
+            for row in rows:
+                last_id = row["id"]
+                values = {"id": row["id"]}
+                try:
+                    for name in ("original", "processed"):
+                        payload = row.get(f"{name}_image")
+                        digest = width = height = None
+                        if payload:
+                            digest, width, height = store_payload(blob_store, payload, decode)
+                        values.update({f"{name}_hash": digest, f"{name}_width": width, f"{name}_height": height})
+                except (ValueError, TypeError) as e:
+                    print(f"processing_history {row['id']}: {e}")
+                    failed.append(row["id"])
+                    continue
+                connection.execute(update_row, values)
+        if len(rows) < BACKFILL_BATCH:
+            break
+
+    if failed:
+        print(f"Kept {', '.join(legacy)} for {len(failed)} row(s) that could not be moved")
+        return failed
+    with bind.begin() as connection:
+        for name in legacy:
+            connection.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {name}"))
+    return failed
+
+
+if __name__ == "__main__":
+    from .main import blob_store, decode_base64
+
+    upgrade_history(engine, blob_store, decode_base64)
+    init_db()
+    print(f"Schema is up to date on {make_url(SQLALCHEMY_DATABASE_URL).render_as_string(hide_password=True)}")
@@ -17,10 +17,30 @@ class ProcessingHistory(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    original_image = Column(String)  # Path to original image
-    processed_image = Column(String)  # Path to processed image
+    original_hash = Column(String(64), index=True)  # Blob digest of the uploaded image
+    original_width = Column(Integer)
+    original_height = Column(Integer)
+    processed_hash = Column(String(64))  # Blob digest of the processed image
+    processed_width = Column(Integer)
+    processed_height = Column(Integer)
     algorithm = Column(String)  # Name of the algorithm used
     parameters = Column(JSON)  # Algorithm parameters used
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    user = relationship("User", back_populates="processing_history") 
\ No newline at end of file
+    user = relationship("User", back_populates="processing_history") 
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    status = Column(String(16), index=True, default="queued")  # queued, running, succeeded, failed, cancelled
+    algorithm = Column(String)
+    parameters = Column(JSON)
+    original_hash = Column(String(64))  # Blob digest of the image to process
+    history_id = Column(Integer, ForeignKey("processing_history.id"))  # Set once the job succeeds
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    history = relationship("ProcessingHistory")
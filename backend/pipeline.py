@@ -0,0 +1,88 @@
+"""Multi-stage pipelines that pass ndarrays between stages in memory.
+
+Every stage output is cached under a key chained from the source image and
+all stages up to it, so a request whose first stages match an earlier one
+reuses their outputs and only the changed suffix is recomputed.
+
+Stages registered as ``grayscale_input`` are handed a grayscale array
+directly. ``grayscale_output`` stages already produce one, and the
+grayscale of the source image is cached like any other intermediate.
+"""
+import hashlib
+import time
+from typing import Dict, Any, List
+
+import cv2
+import numpy as np
+
+from .cache import ResultCache, canonical_parameters
+from .executor import executor
+from .processors.registry import get_algorithm
+
+
+def stage_keys(source_key: str, stages: List[Dict[str, Any]]) -> List[str]:
+    """Cache key of every stage output, each chained from the one before."""
+    keys = []
+    previous = source_key
+    for stage in stages:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(previous.encode())
+        digest.update(stage['algorithm'].encode())
+        digest.update(canonical_parameters(stage.get('parameters', {})).encode())
+        previous = digest.hexdigest()
+        keys.append(previous)
+    return keys
+
+
+def luminance(image: np.ndarray) -> np.ndarray:
+    """Grayscale of a stage input, converting only colour images."""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+async def run_pipeline(source_key: str, source: np.ndarray, stages: List[Dict[str, Any]],
+                       cache: ResultCache) -> List[Dict[str, Any]]:
+    """Run stages in order and return each one's output, timing and cache state.
+
+    ``source_key`` identifies the source pixels (the blob hash) and stage
+    parameters must already be coerced. Raises ``ExecutorSaturated`` when a
+    stage cannot be scheduled.
+    """
+    keys = stage_keys(source_key, stages)
+    results = []
+    current = source
+
+    for stage, key in zip(stages, keys):
+        algorithm = stage['algorithm']
+        parameters = stage.get('parameters', {})
+        start = time.perf_counter()
+
+        output = cache.get(key)
+        cached = output is not None
+        if not cached:
+            stage_input = current
+            if get_algorithm(algorithm).grayscale_input:
+                if current is source:
+                    # The source grayscale is shared by every pipeline on this image
+                    gray_key = f"{source_key}:gray"
+                    stage_input = cache.get(gray_key)
+                    if stage_input is None:
+                        stage_input = luminance(source)
+                        cache.put(gray_key, stage_input)
+                else:
+                    stage_input = luminance(current)
+
+            output = await executor.run(algorithm, stage_input, parameters)
+            cache.put(key, output)
+
+        results.append({
+            'algorithm': algorithm,
+            'parameters': parameters,
+            'cached': cached,
+            'seconds': time.perf_counter() - start,
+            'output': output,
+        })
+        current = output
+
+    return results
@@ -0,0 +1,28 @@
+"""Parameter rescaling for previews run on a downscaled pyramid level.
+
+Parameters measured in pixels have to shrink with the image for a preview
+to look like the full-resolution result: a blur of sigma 4 on the full
+image is a blur of sigma 1 on a quarter-size level. Each algorithm's
+parameter schema says which values scale (``Param.scale``: 1 for lengths,
+2 for areas) and the bounds they are snapped back into.
+"""
+from typing import Dict, Any
+
+from .processors.registry import get_algorithm
+
+PYRAMID_LEVELS = (256, 1024)
+DEFAULT_PREVIEW_SIZE = 1024
+
+
+def preview_level(width: int, height: int, preview_size: int) -> int:
+    """Pick the pyramid level to preview on, or 0 for full resolution."""
+    longest = max(width, height)
+    for size in sorted(PYRAMID_LEVELS):
+        if size >= preview_size and size < longest:
+            return size
+    return 0
+
+
+def rescale_parameters(algorithm: str, parameters: Dict[str, Any], scale: float) -> Dict[str, Any]:
+    """Return a copy of coerced ``parameters`` adjusted for an image scaled by ``scale``."""
+    return get_algorithm(algorithm).rescale(parameters, scale)
@@ -2,8 +2,15 @@ import cv2
 import numpy as np
 from typing import Dict, Any, Tuple
 import base64
-from io import BytesIO
-from PIL import Image
+import os
+import threading
+from .registry import get_algorithm
+from .results import ProcessorResult
+
+# Scratch buffers larger than this are not kept between calls
+SCRATCH_MAX_BYTES = int(os.getenv('SCRATCH_MAX_BYTES', 32 * 1024 * 1024))
+
+_scratch = threading.local()
 
 class BaseProcessor:
     @staticmethod
@@ -30,15 +37,120 @@ class BaseProcessor:
         return True, ""
 
     @staticmethod
-    def ensure_grayscale(image: np.ndarray) -> np.ndarray:
-        """Convert image to grayscale if it's not already."""
+    def scratch(name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """A work buffer owned by the calling thread, reused across same-sized images.
+
+        Only for intermediates that never leave the call: the next call on
+        this thread asking for ``name`` gets the same memory back.
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        if int(np.prod(shape)) * dtype.itemsize > SCRATCH_MAX_BYTES:
+            return np.empty(shape, dtype)
+        buffers = getattr(_scratch, 'buffers', None)
+        if buffers is None:
+            buffers = _scratch.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = buffers[name] = np.empty(shape, dtype)
+        return buffer
+
+    @staticmethod
+    def ensure_grayscale(image: np.ndarray, scratch: str = None) -> np.ndarray:
+        """Convert image to grayscale if it's not already.
+
+        With ``scratch`` the conversion is written to that scratch buffer,
+        for callers that only use the grayscale image internally.
+        """
         if len(image.shape) == 3:
-            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            if scratch is None:
+                return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=BaseProcessor.scratch(scratch, image.shape[:2], image.dtype))
         return image
 
+    @staticmethod
+    def color_canvas(image: np.ndarray) -> np.ndarray:
+        """An 8-bit BGR copy of image to draw on, whether it is colour or grayscale."""
+        image = BaseProcessor.to_uint8(image)
+        if len(image.shape) == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        return image.copy()
+
     @staticmethod
     def ensure_color(image: np.ndarray) -> np.ndarray:
         """Convert image to color if it's grayscale."""
         if len(image.shape) == 2:
             return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-        return image 
\ No newline at end of file
+        return image 
+
+    # Numeric layer. Images arrive as uint8 or, decoded with IMREAD_ANYDEPTH,
+    # uint16. Parameters are on the 0-255 scale either way, so deeper images
+    # are worked on as float32 on that scale, which keeps their precision at
+    # half the memory of float64; results go back to uint8 only on output.
+
+    @staticmethod
+    def depth_scale(image: np.ndarray) -> float:
+        """Factor taking ``image``'s values to the 0-255 scale (float images are on it already)."""
+        if np.issubdtype(image.dtype, np.integer):
+            return 255.0 / np.iinfo(image.dtype).max
+        return 1.0
+
+    @staticmethod
+    def to_float32(image: np.ndarray, scratch: str = None) -> np.ndarray:
+        """``image`` as float32 on the 0-255 scale; ``scratch`` names a buffer to write it to."""
+        dst = BaseProcessor.scratch(scratch, image.shape, np.float32) if scratch else None
+        return np.multiply(image, np.float32(BaseProcessor.depth_scale(image)), out=dst, dtype=np.float32)
+
+    @staticmethod
+    def working_gray(image: np.ndarray, scratch: str = None) -> np.ndarray:
+        """Grayscale to process: 8-bit as it is, deeper images as float32 on the 0-255 scale."""
+        gray = BaseProcessor.ensure_grayscale(image, scratch=scratch)
+        if gray.dtype == np.uint8:
+            return gray
+        return BaseProcessor.to_float32(gray)
+
+    @staticmethod
+    def saturate(values: np.ndarray, scale: float = 1.0, absolute: bool = False) -> np.ndarray:
+        """Round ``values * scale`` (its magnitude with ``absolute``) and clip to uint8."""
+        if absolute:
+            return cv2.convertScaleAbs(values, alpha=scale)
+        # float64 inputs stay float64 so rounding sees their exact values
+        scaled = np.multiply(values, scale, dtype=np.result_type(values.dtype, np.float32))
+        return np.clip(np.rint(scaled, out=scaled), 0, 255, out=scaled).astype(np.uint8)
+
+    @staticmethod
+    def normalize(values: np.ndarray) -> np.ndarray:
+        """Stretch ``values`` min-max onto 0-255 as uint8; flat inputs come out 0."""
+        return cv2.normalize(values, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+
+    @staticmethod
+    def to_uint8(image: np.ndarray) -> np.ndarray:
+        """``image`` at 8-bit depth, for outputs and OpenCV calls that only take 8-bit input."""
+        if image.dtype == np.uint8:
+            return image
+        return BaseProcessor.saturate(image, BaseProcessor.depth_scale(image))
+
+    @staticmethod
+    def quantize(gray: np.ndarray, levels: int) -> np.ndarray:
+        """Integer gray levels 0..``levels``-1 of an 8- or 16-bit image, as uint16."""
+        bits = gray.dtype.itemsize * 8
+        wide = np.uint16 if bits == 8 else np.uint32
+        return (gray.astype(wide) * levels >> bits).astype(np.uint16, copy=False)
+
+    @classmethod
+    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
+        """Run a registered algorithm and return its output image.
+
+        ``parameters`` should already be coerced with the algorithm's
+        schema (``get_algorithm(name).coerce``).
+        """
+        return get_algorithm(algorithm).process(image, parameters)
+
+    @classmethod
+    def analyze(cls, image: np.ndarray, algorithm: str, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Run a registered algorithm and return its structured result.
+
+        Algorithms without structured outputs return just the output image,
+        which is produced regardless of ``render``.
+        """
+        return get_algorithm(algorithm).analyze(image, parameters, render)
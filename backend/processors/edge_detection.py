@@ -1,23 +1,34 @@
+from typing import List, Sequence
+
 import cv2
 import numpy as np
 from .base import BaseProcessor
+from .memo import ImageMemo
+from .registry import algorithm, Param
+from .results import ProcessorResult, ScaleSpace
 
 class EdgeDetectionProcessor(BaseProcessor):
     @staticmethod
+    @algorithm('canny', 'Canny Edge Detection', parameters=[
+        Param('threshold1', 'int', 100, minimum=0, maximum=500, step=1),
+        Param('threshold2', 'int', 200, minimum=0, maximum=500, step=1),
+    ], grayscale_input=True, grayscale_output=True)
     def canny(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply Canny edge detection."""
-        gray = EdgeDetectionProcessor.ensure_grayscale(image)
-        edges = cv2.Canny(
-            gray,
-            threshold1=int(parameters['threshold1']),
-            threshold2=int(parameters['threshold2'])
-        )
-        return EdgeDetectionProcessor.ensure_color(edges)
+        """Apply Canny edge detection.
+
+        The Sobel derivatives are memoized, so calls that only change the
+        thresholds go straight to non-maximum suppression and hysteresis.
+        """
+        # Single channel: PNG encodes it directly, no BGR expansion
+        return ImageMemo(image).canny(int(parameters['threshold1']), int(parameters['threshold2']))
 
     @staticmethod
+    @algorithm('log', 'Laplacian of Gaussian (LoG)', parameters=[
+        Param('kernel_size', 'int', 5, minimum=1, maximum=31, step=2, odd=True, scale=1),
+        Param('sigma', 'float', 1.0, minimum=0, maximum=10, step=0.1, scale=1),
+    ], grayscale_input=True, grayscale_output=True)
     def log(image: np.ndarray, parameters: dict) -> np.ndarray:
         """Apply Laplacian of Gaussian edge detection."""
-        gray = EdgeDetectionProcessor.ensure_grayscale(image)
         kernel_size = int(parameters['kernel_size'])
         sigma = float(parameters['sigma'])
         
@@ -25,42 +36,62 @@ class EdgeDetectionProcessor(BaseProcessor):
         if kernel_size % 2 == 0:
             kernel_size += 1
             
-        # Apply Gaussian blur
-        blurred = cv2.GaussianBlur(gray, (kernel_size, kernel_size), sigma)
+        # Apply Gaussian blur; the level is shared with other calls on this image
+        blurred = ImageMemo(image).gaussian(sigma, kernel_size, scratch='blurred')
         
         # Apply Laplacian
-        laplacian = cv2.Laplacian(blurred, cv2.CV_64F)
+        laplacian = cv2.Laplacian(blurred, cv2.CV_32F,
+                                  dst=EdgeDetectionProcessor.scratch('laplacian', blurred.shape, np.float32))
         
-        # Normalize and convert to uint8
-        edges = np.uint8(np.absolute(laplacian))
-        return EdgeDetectionProcessor.ensure_color(edges)
+        # Magnitude on the 0-255 scale, saturated to uint8
+        return EdgeDetectionProcessor.saturate(laplacian, EdgeDetectionProcessor.depth_scale(blurred), absolute=True)
+
+    @staticmethod
+    def scale_space(image: np.ndarray, sigmas: Sequence[float], scratch: bool = False) -> List[np.ndarray]:
+        """Gaussian levels of the grayscale image at each of ``sigmas``.
+
+        Every level is blurred from the image itself, as
+        ``cv2.GaussianBlur(gray, (0, 0), sigma)`` would, so differences of
+        any two levels equal a direct DoG. Levels are memoized per image, so
+        sweeps over sigma pairs compute each sigma once. With ``scratch``
+        the first two levels use per-thread buffers when the memo is off.
+        """
+        memo = ImageMemo(image)
+        return [
+            memo.gaussian(sigma, scratch=f"blurred{index + 1}" if scratch and index < 2 else None)
+            for index, sigma in enumerate(sigmas)
+        ]
 
     @staticmethod
-    def dog(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply Difference of Gaussians edge detection."""
-        gray = EdgeDetectionProcessor.ensure_grayscale(image)
+    @algorithm('dog', 'Difference of Gaussians (DoG)', parameters=[
+        Param('sigma1', 'float', 1.0, minimum=0.1, maximum=20, step=0.1, scale=1),
+        Param('sigma2', 'float', 2.0, minimum=0.1, maximum=20, step=0.1, scale=1),
+        # Further layers continue the ratio sigma2 / sigma1
+        Param('levels', 'int', 1, minimum=1, maximum=8, step=1),
+    ], structured=True, grayscale_input=True, grayscale_output=True)
+    def dog(image: np.ndarray, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Apply Difference of Gaussians edge detection.
+
+        The image is the magnitude of the sigma1/sigma2 difference,
+        saturated to uint8. The ``scale_space`` output holds ``levels``
+        signed DoG layers from one pass over a Gaussian stack at
+        sigma1 * k**i with k = sigma2 / sigma1.
+        """
         sigma1 = float(parameters.get('sigma1', 1.0))
         sigma2 = float(parameters.get('sigma2', 2.0))
-        
-        # Apply two Gaussian blurs with different sigmas
-        g1 = cv2.GaussianBlur(gray, (0, 0), sigma1)
-        g2 = cv2.GaussianBlur(gray, (0, 0), sigma2)
-        
-        # Compute difference
-        dog = g1 - g2
-        
-        # Normalize and convert to uint8
-        dog = np.uint8(np.absolute(dog))
-        return EdgeDetectionProcessor.ensure_color(dog)
+        levels = int(parameters.get('levels', 1))
+        sigmas = [sigma1 * (sigma2 / sigma1) ** i for i in range(levels + 1)]
+        blurred = EdgeDetectionProcessor.scale_space(image, sigmas, scratch=True)
 
-    @classmethod
-    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
-        """Process image with the specified edge detection algorithm."""
-        if algorithm == 'canny':
-            return cls.canny(image, parameters)
-        elif algorithm == 'log':
-            return cls.log(image, parameters)
-        elif algorithm == 'dog':
-            return cls.dog(image, parameters)
-        else:
-            raise ValueError(f"Unknown edge detection algorithm: {algorithm}") 
\ No newline at end of file
+        # Differences of 8-bit levels are exact in int16; deeper ones go to float32 on the 0-255 scale
+        deep = blurred[0].dtype != np.uint8
+        layers = np.empty((levels,) + blurred[0].shape, np.float32 if deep else np.int16)
+        for index in range(levels):
+            np.subtract(blurred[index], blurred[index + 1], out=layers[index], dtype=layers.dtype)
+        if deep:
+            layers *= EdgeDetectionProcessor.depth_scale(blurred[0])
+        result = ProcessorResult(outputs={'scale_space': ScaleSpace(sigma=np.array(sigmas), layers=layers)})
+        if render:
+            # Compute difference; both signs are edges, so the magnitude is shown
+            result.image = EdgeDetectionProcessor.saturate(layers[0], absolute=True)
+        return result
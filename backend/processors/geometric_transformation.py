@@ -1,13 +1,29 @@
+from typing import Tuple
+
 import cv2
 import numpy as np
 from .base import BaseProcessor
+from .registry import algorithm, Param, ParameterError
+from . import warp
+
+AFFINE_PARAMETERS = [
+    Param('scale_x', 'float', 1.0, minimum=0.01, maximum=10, step=0.01),
+    Param('scale_y', 'float', 1.0, minimum=0.01, maximum=10, step=0.01),
+    Param('rotation', 'float', 0.0, minimum=-360, maximum=360, step=1),
+    Param('tx', 'float', 0.0, minimum=-10000, maximum=10000, step=1, scale=1),
+    Param('ty', 'float', 0.0, minimum=-10000, maximum=10000, step=1, scale=1),
+]
+
+RESAMPLING_PARAMETERS = [
+    Param('interpolation', 'choice', 'linear', choices=tuple(warp.INTERPOLATIONS)),
+    # Grow the canvas to hold the whole warped image instead of cropping to the input size
+    Param('fit', 'bool', False),
+]
 
 class GeometricTransformationProcessor(BaseProcessor):
     @staticmethod
-    def affine_transform(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply affine transformation to the image."""
-        height, width = image.shape[:2]
-        
+    def affine_matrix(width: int, height: int, parameters: dict) -> np.ndarray:
+        """Build the 2x3 matrix ``affine_transform`` warps an image with."""
         # Get transformation parameters
         scale_x = float(parameters.get('scale_x', 1.0))
         scale_y = float(parameters.get('scale_y', 1.0))
@@ -28,23 +44,64 @@ class GeometricTransformationProcessor(BaseProcessor):
         # Apply scaling
         rotation_matrix[0, 0] *= scale_x
         rotation_matrix[1, 1] *= scale_y
-        
-        # Apply the transformation
-        transformed = cv2.warpAffine(
-            image,
-            rotation_matrix,
-            (width, height),
-            flags=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_CONSTANT,
-            borderValue=(0, 0, 0)
-        )
-        
-        return transformed
-
-    @classmethod
-    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
-        """Process image with the specified geometric transformation algorithm."""
-        if algorithm == 'affine':
-            return cls.affine_transform(image, parameters)
-        else:
-            raise ValueError(f"Unknown geometric transformation algorithm: {algorithm}") 
\ No newline at end of file
+
+        return rotation_matrix
+
+    @staticmethod
+    def corner_matrix(width: int, height: int, parameters: dict) -> np.ndarray:
+        """Build the 3x3 matrix moving the image corners by ``parameters['corners']``."""
+        corners = parameters.get('corners') or [0.0] * 8
+        source = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+        # Shifts are fractions of the image size, so previews need no rescaling
+        shifts = np.float32(corners).reshape(4, 2) * np.float32([width - 1, height - 1])
+        return cv2.getPerspectiveTransform(source, source + shifts)
+
+    @staticmethod
+    def canvas(matrix: np.ndarray, width: int, height: int, parameters: dict) -> Tuple[np.ndarray, warp.Size]:
+        """The matrix and output (width, height) for ``parameters['fit']``."""
+        if parameters.get('fit', False):
+            try:
+                return warp.fit_canvas(matrix, width, height)
+            except ValueError as e:
+                # A transform that cannot be fitted is a bad request, not a failure
+                raise ParameterError(f"fit: {e}") from e
+        return warp.homography(matrix), (width, height)
+
+    @staticmethod
+    def warp_plan(algorithm: str, width: int, height: int, parameters: dict) -> Tuple[np.ndarray, warp.Size, int]:
+        """Homography, output size and interpolation flag of an ``affine`` or ``perspective`` call.
+
+        The steps are folded into one matrix, so the image is resampled once.
+        """
+        matrix = GeometricTransformationProcessor.affine_matrix(width, height, parameters)
+        if algorithm == 'perspective':
+            # Corners first, in the input's own frame, then the affine steps
+            matrix = warp.compose(GeometricTransformationProcessor.corner_matrix(width, height, parameters), matrix)
+        matrix, size = GeometricTransformationProcessor.canvas(matrix, width, height, parameters)
+        return matrix, size, warp.INTERPOLATIONS[parameters.get('interpolation', 'linear')]
+
+    @staticmethod
+    @algorithm('affine', 'Affine Transformation', parameters=AFFINE_PARAMETERS + RESAMPLING_PARAMETERS)
+    def affine_transform(image: np.ndarray, parameters: dict) -> np.ndarray:
+        """Apply affine transformation to the image.
+
+        The remap maps of a transform are cached per matrix, output size and
+        interpolation, so later images of the same size skip computing them.
+        """
+        height, width = image.shape[:2]
+        matrix, size, interpolation = GeometricTransformationProcessor.warp_plan('affine', width, height, parameters)
+        return warp.warp(image, matrix, size, interpolation)
+
+    @staticmethod
+    @algorithm('perspective', 'Perspective Transformation', parameters=[
+        # dx, dy of the top-left, top-right, bottom-right and bottom-left corners
+        Param('corners', 'list', [0.0] * 8, item='float', minimum=-1, maximum=1, length=8),
+    ] + AFFINE_PARAMETERS + RESAMPLING_PARAMETERS)
+    def perspective_transform(image: np.ndarray, parameters: dict) -> np.ndarray:
+        """Move the image corners, then rotate, scale and translate as ``affine`` does.
+
+        Both steps are folded into one homography and resampled once.
+        """
+        height, width = image.shape[:2]
+        matrix, size, interpolation = GeometricTransformationProcessor.warp_plan('perspective', width, height, parameters)
+        return warp.warp(image, matrix, size, interpolation)
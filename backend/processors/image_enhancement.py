@@ -1,11 +1,40 @@
 import cv2
 import numpy as np
 from .base import BaseProcessor
+from .registry import algorithm, Param
+
+# CLAHE contextual regions per axis (columns, rows)
+CLAHE_GRID = (8, 8)
 
 class ImageEnhancementProcessor(BaseProcessor):
     @staticmethod
+    def equalize_deep_color(image: np.ndarray, clip_limit: float) -> np.ndarray:
+        """CLAHE on the L channel of a 16-bit BGR image.
+
+        OpenCV converts to LAB only from 8-bit or float input, so the image
+        goes through float32 LAB and L is equalized as 16-bit levels.
+        """
+        peak = np.iinfo(image.dtype).max
+        lab = cv2.cvtColor(np.multiply(image, np.float32(1 / peak), dtype=np.float32), cv2.COLOR_BGR2LAB)
+        # L runs 0-100 in float LAB
+        levels = np.float32(peak / 100)
+        lightness = np.rint(lab[:, :, 0] * levels).astype(image.dtype)
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=CLAHE_GRID)
+        lab[:, :, 0] = clahe.apply(lightness) / levels
+        bgr = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        return np.clip(np.rint(bgr * np.float32(peak), out=bgr), 0, peak, out=bgr).astype(image.dtype)
+
+    @staticmethod
+    @algorithm('histogram', 'Histogram Equalization', parameters=[
+        Param('clip_limit', 'float', 2.0, minimum=0, maximum=40, step=0.1),
+    ])
     def histogram_equalization(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply histogram equalization to enhance image contrast."""
+        """Apply histogram equalization to enhance image contrast.
+
+        16-bit images are equalized at 16 bits and stay 16-bit.
+        """
+        if len(image.shape) == 3 and image.dtype != np.uint8:
+            return ImageEnhancementProcessor.equalize_deep_color(image, float(parameters.get('clip_limit', 2.0)))
         if len(image.shape) == 3:
             # Convert to LAB color space
             lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
@@ -16,7 +45,7 @@ class ImageEnhancementProcessor(BaseProcessor):
             # Apply histogram equalization to the L channel
             clahe = cv2.createCLAHE(
                 clipLimit=float(parameters.get('clip_limit', 2.0)),
-                tileGridSize=(8, 8)
+                tileGridSize=CLAHE_GRID
             )
             l = clahe.apply(l)
             
@@ -29,14 +58,6 @@ class ImageEnhancementProcessor(BaseProcessor):
             # For grayscale images
             clahe = cv2.createCLAHE(
                 clipLimit=float(parameters.get('clip_limit', 2.0)),
-                tileGridSize=(8, 8)
+                tileGridSize=CLAHE_GRID
             )
             return clahe.apply(image)
-
-    @classmethod
-    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
-        """Process image with the specified enhancement algorithm."""
-        if algorithm == 'histogram':
-            return cls.histogram_equalization(image, parameters)
-        else:
-            raise ValueError(f"Unknown enhancement algorithm: {algorithm}") 
\ No newline at end of file
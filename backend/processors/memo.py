@@ -0,0 +1,144 @@
+"""Per-image memo of intermediates shared between processor calls.
+
+Interactive sliders and batch sweeps run the same image through one
+algorithm with many nearby parameter values. The result cache only helps
+when the parameters repeat exactly, but most of the work usually does not
+depend on the parameter that moved: Canny's Sobel derivatives do not
+depend on the hysteresis thresholds, and a DoG sweep over sigma pairs
+needs each Gaussian level once, however many pairs share it.
+
+``ImageMemo(image)`` looks such intermediates up by a hash of the input
+pixels, the intermediate's name and its own parameters, and computes and
+stores the ones it misses. Entries live in one LRU bounded by
+``MEMO_CACHE_BYTES`` (0 disables the memo). Stored arrays are read-only.
+
+Hashing the pixels costs about as much as a Sobel pass, so callers that
+already hashed the image hand the digest over with ``known_digest``.
+Callers whose images never repeat (video frames, the tiles of one large
+image) run inside ``bypass()``, so they neither pay for hashing nor push
+useful entries out.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+import cv2
+import numpy as np
+
+from ..cache import ResultCache, canonical_parameters, image_digest
+from .base import BaseProcessor
+
+MEMO = ResultCache(max_bytes=int(os.getenv('MEMO_CACHE_BYTES', 128 * 1024 * 1024)))
+
+_local = threading.local()
+
+
+@contextmanager
+def bypass():
+    """Run the enclosed processor calls on this thread without the memo."""
+    previous = getattr(_local, 'bypass', False)
+    _local.bypass = True
+    try:
+        yield
+    finally:
+        _local.bypass = previous
+
+
+@contextmanager
+def known_digest(image: np.ndarray, digest: Optional[str]):
+    """Let memos of ``image`` opened on this thread use ``digest`` instead of hashing it."""
+    previous = getattr(_local, 'known', None)
+    _local.known = (image, digest) if digest else None
+    try:
+        yield
+    finally:
+        _local.known = previous
+
+
+def gaussian_ksize(sigma: float) -> int:
+    """The kernel size ``cv2.GaussianBlur`` picks for 8-bit input when given only sigma."""
+    return int(round(sigma * 3 * 2 + 1)) | 1
+
+
+class ImageMemo:
+    """The memoized intermediates of one input image."""
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self.enabled = MEMO.max_bytes > 0 and not getattr(_local, 'bypass', False)
+        self._digest = None
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            known = getattr(_local, 'known', None)
+            if known is not None and known[0] is self.image:
+                self._digest = known[1]
+            else:
+                self._digest = image_digest(self.image)
+        return self._digest
+
+    def get(self, name: str, compute: Callable[[], Any], **parameters) -> Any:
+        """The intermediate ``name`` with ``parameters``, computed on a miss.
+
+        ``compute`` must return an array, or anything with ``nbytes``.
+        """
+        if not self.enabled:
+            return compute()
+        key = f"{name}:{self.digest}:{canonical_parameters(parameters)}"
+        value = MEMO.get(key)
+        if value is None:
+            value = compute()
+            MEMO.put(key, value)
+        return value
+
+    def gray(self, scratch: str = None) -> np.ndarray:
+        """The grayscale image; ``scratch`` names the buffer used when not memoized."""
+        if self.image.ndim == 2:
+            return self.image
+        return self.get('gray', lambda: BaseProcessor.ensure_grayscale(
+            self.image, scratch=None if self.enabled else scratch))
+
+    def gaussian(self, sigma: float, ksize: int = 0, scratch: str = None) -> np.ndarray:
+        """The grayscale image blurred with ``cv2.GaussianBlur``.
+
+        A ``ksize`` of 0 takes the size OpenCV derives from sigma, so a
+        level requested either way is stored once.
+        """
+        ksize = ksize if ksize > 0 else gaussian_ksize(sigma)
+
+        def blur():
+            gray = self.gray(scratch='gray')
+            dst = BaseProcessor.scratch(scratch, gray.shape, gray.dtype) if scratch and not self.enabled else None
+            return cv2.GaussianBlur(gray, (ksize, ksize), sigma, dst=dst)
+
+        return self.get('gaussian', blur, ksize=ksize, sigma=sigma)
+
+    def sobel(self) -> np.ndarray:
+        """3x3 Sobel derivatives of the grayscale image as a (2, h, w) int16 array (dx, dy).
+
+        These are the gradients ``cv2.Canny`` computes internally, so
+        ``cv2.Canny(dx, dy, ...)`` gives the same edges. Deeper images get
+        derivatives on the 0-255 scale, so Canny thresholds mean the same.
+        """
+        def derivatives():
+            gray = self.gray(scratch='gray')
+            out = np.empty((2,) + gray.shape, np.int16)
+            if gray.dtype == np.uint8:
+                cv2.Sobel(gray, cv2.CV_16S, 1, 0, dst=out[0], borderType=cv2.BORDER_REPLICATE)
+                cv2.Sobel(gray, cv2.CV_16S, 0, 1, dst=out[1], borderType=cv2.BORDER_REPLICATE)
+                return out
+            scale = BaseProcessor.depth_scale(gray)
+            for axis, (dx, dy) in enumerate(((1, 0), (0, 1))):
+                out[axis] = np.rint(cv2.Sobel(gray, cv2.CV_32F, dx, dy, scale=scale, borderType=cv2.BORDER_REPLICATE))
+            return out
+
+        return self.get('sobel', derivatives)
+
+    def canny(self, threshold1: int, threshold2: int) -> np.ndarray:
+        """``cv2.Canny`` edges from the memoized derivatives; the edges themselves are not stored."""
+        if not self.enabled and self.image.dtype == np.uint8:
+            return cv2.Canny(self.gray(scratch='gray'), threshold1, threshold2)
+        dx, dy = self.sobel()
+        return cv2.Canny(dx, dy, threshold1, threshold2)
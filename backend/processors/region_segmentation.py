@@ -1,107 +1,234 @@
 import cv2
 import numpy as np
 from .base import BaseProcessor
-from skimage.segmentation import flood_fill
-from skimage.morphology import flood
+from .registry import algorithm, Param, HEAVY
+from .results import ProcessorResult, RegionLabels
 
 class RegionSegmentationProcessor(BaseProcessor):
     @staticmethod
-    def region_growing(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply region growing segmentation."""
-        gray = RegionSegmentationProcessor.ensure_grayscale(image)
-        
+    @algorithm('region-growing', 'Region Growing', parameters=[
+        Param('threshold', 'float', 20.0, minimum=0, maximum=255, step=1),
+        Param('min_size', 'int', 100, minimum=1, maximum=10 ** 6, step=10, scale=2),
+    ], cost=HEAVY, structured=True, grayscale_input=True, grayscale_output=True)
+    def region_growing(image: np.ndarray, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Apply region growing segmentation.
+
+        Seeds are the local minima of the image, taken in raster order. Each
+        seed grows the 4-connected region of pixels within ``threshold`` of
+        its intensity, and pixels claimed by an earlier region are never
+        grown into again, so every pixel is filled at most once. The fill
+        itself is ``cv2.floodFill`` against a shared claim mask; only the
+        bounding box of each new region is touched afterwards. Regions are
+        labelled from 1 in seed order and rendered with their seed intensity.
+        """
+        gray = RegionSegmentationProcessor.working_gray(image)
+
         # Get parameters
         threshold = float(parameters.get('threshold', 20.0))
         min_size = int(parameters.get('min_size', 100))
-        
-        # Initialize output image
-        output = np.zeros_like(gray)
-        visited = np.zeros_like(gray, dtype=bool)
-        
+
+        # Region of every pixel (0 = none) and the intensity of each seed
+        labels = np.zeros(gray.shape, dtype=np.int32)
+        seed_values = [0]
+
+        # floodFill masks are padded by one pixel on every side. Claimed
+        # pixels hold 1, the region being grown is marked with 2.
+        height, width = gray.shape
+        mask = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        claimed = mask[1:-1, 1:-1]
+        flags = 4 | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | (2 << 8)
+
         # Get seed points (local minima)
         kernel_size = 5
-        local_min = cv2.erode(gray, np.ones((kernel_size, kernel_size)))
-        seed_points = np.where(gray == local_min)
-        
+        local_min = cv2.erode(gray, np.ones((kernel_size, kernel_size), np.uint8))
+        seed_points = np.nonzero(gray == local_min)
+
         # Process each seed point
         for y, x in zip(*seed_points):
-            if visited[y, x]:
+            if claimed[y, x]:
                 continue
-                
-            # Start region growing from this seed
-            region = flood_fill(
-                gray,
-                (y, x),
-                gray[y, x],
-                tolerance=threshold,
-                connectivity=1
+
+            area, _, _, (rx, ry, rw, rh) = cv2.floodFill(
+                gray, mask, (int(x), int(y)), 0,
+                loDiff=threshold, upDiff=threshold, flags=flags
             )
-            
-            # Update visited pixels
-            visited[region != 0] = True
-            
-            # Add region to output if it's large enough
-            if np.sum(region != 0) >= min_size:
-                output[region != 0] = gray[y, x]
-        
-        return RegionSegmentationProcessor.ensure_color(output)
+            window = claimed[ry:ry + rh, rx:rx + rw]
+            region = window == 2
+            window[region] = 1
+
+            # Keep the region if it's large enough
+            if area >= min_size:
+                labels[ry:ry + rh, rx:rx + rw][region] = len(seed_values)
+                seed_values.append(gray[y, x])
+
+        count = len(seed_values) - 1
+        area = np.bincount(labels.ravel(), minlength=count + 1)
+        total = np.bincount(labels.ravel(), weights=gray.ravel(), minlength=count + 1)
+        result = ProcessorResult(outputs={'regions': RegionLabels(
+            labels=labels, count=count, area=area[1:], mean=total[1:] / np.maximum(area[1:], 1)
+        )})
+        if render:
+            output = RegionSegmentationProcessor.saturate(np.array(seed_values))[labels]
+            result.image = output
+        return result
+
+    @staticmethod
+    def _block_sums(table: np.ndarray, y, x, h, w) -> np.ndarray:
+        """Sum of every block (y, x, h, w) read from a summed-area table."""
+        return table[y + h, x + w] - table[y, x + w] - table[y + h, x] + table[y, x]
 
     @staticmethod
-    def split_merge(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply splitting and merging segmentation."""
-        gray = RegionSegmentationProcessor.ensure_grayscale(image)
-        
+    def _split_quadtree(gray: np.ndarray, threshold: float, min_size: int, max_depth: int):
+        """Split the image breadth-first into a quadtree stored in flat arrays.
+
+        Nodes are numbered level by level and the four children of a node
+        are stored next to each other, top-left, top-right, bottom-left,
+        bottom-right; children may be empty when a block is one pixel thick.
+        Returns per-node ``first_child`` (-1 for leaves), pixel ``count`` and
+        intensity ``total``. Block statistics come from the summed-area
+        tables of I and I^2, so each node costs O(1).
+        """
+        height, width = gray.shape
+        sums, squares = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+        y = x = np.zeros(1, dtype=np.int64)
+        h = np.array([height], dtype=np.int64)
+        w = np.array([width], dtype=np.int64)
+
+        first_child, count, total = [], [], []
+        offset = 0
+        for depth in range(max_depth + 1):
+            size = h * w
+            block_sum = RegionSegmentationProcessor._block_sums(sums, y, x, h, w)
+            block_sq = RegionSegmentationProcessor._block_sums(squares, y, x, h, w)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                variance = block_sq / size - (block_sum / size) ** 2
+
+            # Blocks one pixel thick split into two empty children and two
+            # halves, which keeps four children per node down to pixel level
+            split = (variance > threshold ** 2) & (np.maximum(h, w) > min_size)
+            if depth == max_depth:
+                split[:] = False
+
+            # Children of this level start right after it, four per split node
+            children = offset + len(y) + 4 * (np.cumsum(split) - 1)
+            first_child.append(np.where(split, children, -1))
+            count.append(size)
+            total.append(block_sum)
+            offset += len(y)
+
+            if not split.any():
+                break
+
+            y, x, h, w = y[split], x[split], h[split], w[split]
+            h2, w2 = h // 2, w // 2
+            y = np.stack([y, y, y + h2, y + h2], axis=1).ravel()
+            x = np.stack([x, x + w2, x, x + w2], axis=1).ravel()
+            h = np.stack([h2, h2, h - h2, h - h2], axis=1).ravel()
+            w = np.stack([w2, w - w2, w2, w - w2], axis=1).ravel()
+
+        return np.concatenate(first_child), np.concatenate(count), np.concatenate(total)
+
+    @staticmethod
+    def _leaf_labels(shape, first_child: np.ndarray) -> np.ndarray:
+        """Map every pixel to the quadtree leaf that covers it.
+
+        Splits always halve a block at ``h // 2`` and ``w // 2``, so the row
+        and column intervals at each level are the same for every block in a
+        band and can be tracked in 1-D; each level then costs a single
+        gather over the label image.
+        """
+        height, width = shape
+        labels = np.zeros(shape, dtype=np.int64)
+
+        rows, cols = np.arange(height), np.arange(width)
+        row_start, row_len = np.zeros(height, np.int64), np.full(height, height, np.int64)
+        col_start, col_len = np.zeros(width, np.int64), np.full(width, width, np.int64)
+
+        while True:
+            child = first_child[labels]
+            if (child < 0).all():
+                return labels
+
+            # Which half of its current interval each row/column falls into
+            row_half, col_half = row_len // 2, col_len // 2
+            lower = rows >= row_start + row_half
+            right = cols >= col_start + col_half
+            row_start = np.where(lower, row_start + row_half, row_start)
+            row_len = np.where(lower, row_len - row_half, row_half)
+            col_start = np.where(right, col_start + col_half, col_start)
+            col_len = np.where(right, col_len - col_half, col_half)
+
+            quadrant = 2 * lower[:, None] + right[None, :]
+            labels = np.where(child >= 0, child + quadrant, labels)
+
+    @staticmethod
+    @algorithm('split-merge', 'Splitting & Merging', parameters=[
+        Param('threshold', 'float', 20.0, minimum=0, maximum=255, step=1),
+        Param('min_size', 'int', 4, minimum=1, maximum=65536, step=1, scale=1),
+        Param('max_depth', 'int', 4, minimum=0, maximum=16, step=1),
+        # Defaults to threshold
+        Param('merge_threshold', 'float', None, minimum=0, maximum=255, step=1),
+    ], cost=HEAVY, structured=True, grayscale_input=True, grayscale_output=True)
+    def split_merge(image: np.ndarray, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Apply splitting and merging segmentation.
+
+        Blocks whose standard deviation exceeds ``threshold`` are split into
+        quadrants until they are homogeneous, no longer than ``min_size``
+        pixels on either side or ``max_depth`` levels deep (``min_size=1``
+        with a large enough ``max_depth`` goes down to single pixels).
+        Adjacent leaves whose
+        means differ by at most ``merge_threshold`` are then merged, and
+        every merged region is painted with its mean intensity.
+        """
+        gray = RegionSegmentationProcessor.working_gray(image)
+
         # Get parameters
         threshold = float(parameters.get('threshold', 20.0))
-        min_size = int(parameters.get('min_size', 4))
-        
-        def split_region(region, level=0):
-            if level >= 4:  # Maximum recursion depth
-                return region
-                
-            h, w = region.shape
-            if h <= min_size or w <= min_size:
-                return region
-                
-            # Calculate region statistics
-            mean = np.mean(region)
-            std = np.std(region)
-            
-            if std <= threshold:
-                return np.full_like(region, mean)
-                
-            # Split into four sub-regions
-            h2, w2 = h // 2, w // 2
-            regions = [
-                split_region(region[:h2, :w2], level + 1),
-                split_region(region[:h2, w2:], level + 1),
-                split_region(region[h2:, :w2], level + 1),
-                split_region(region[h2:, w2:], level + 1)
-            ]
-            
-            # Merge regions if they are similar
-            merged = np.zeros_like(region)
-            merged[:h2, :w2] = regions[0]
-            merged[:h2, w2:] = regions[1]
-            merged[h2:, :w2] = regions[2]
-            merged[h2:, w2:] = regions[3]
-            
-            return merged
-        
-        # Apply splitting and merging
-        segmented = split_region(gray)
-        
-        # Convert to uint8
-        segmented = np.uint8(segmented)
-        
-        return RegionSegmentationProcessor.ensure_color(segmented)
-
-    @classmethod
-    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
-        """Process image with the specified region segmentation algorithm."""
-        if algorithm == 'region-growing':
-            return cls.region_growing(image, parameters)
-        elif algorithm == 'split-merge':
-            return cls.split_merge(image, parameters)
-        else:
-            raise ValueError(f"Unknown region segmentation algorithm: {algorithm}") 
\ No newline at end of file
+        min_size = max(int(parameters.get('min_size', 4)), 1)
+        max_depth = int(parameters.get('max_depth', 4))
+        merge_threshold = parameters.get('merge_threshold')
+        merge_threshold = threshold if merge_threshold is None else float(merge_threshold)
+
+        # Split phase
+        first_child, count, total = RegionSegmentationProcessor._split_quadtree(
+            gray, threshold, min_size, max_depth
+        )
+        labels = RegionSegmentationProcessor._leaf_labels(gray.shape, first_child)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+
+        # Merge phase: link 4-adjacent leaves with similar means and take
+        # the connected components of that graph as the final regions
+        a = np.concatenate([labels[:, :-1].ravel(), labels[:-1, :].ravel()])
+        b = np.concatenate([labels[:, 1:].ravel(), labels[1:, :].ravel()])
+        similar = (a != b) & (np.abs(mean[a] - mean[b]) <= merge_threshold)
+        a, b = a[similar], b[similar]
+
+        # scipy is only needed here; importing it lazily keeps worker start-up fast
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        nodes = len(first_child)
+        graph = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(nodes, nodes))
+        regions, region = connected_components(graph, directed=False)
+
+        leaves = first_child < 0
+        region_total = np.bincount(region[leaves], weights=total[leaves], minlength=regions)
+        region_count = np.bincount(region[leaves], weights=count[leaves], minlength=regions)
+        region_mean = np.divide(
+            region_total, region_count, out=np.zeros_like(region_total), where=region_count > 0
+        )
+
+        # Number the non-empty regions from 1 for the label image
+        used = np.zeros(regions, dtype=bool)
+        used[region[leaves & (count > 0)]] = True
+        number = np.cumsum(used, dtype=np.int32)
+        result = ProcessorResult(outputs={'regions': RegionLabels(
+            labels=number[region][labels], count=int(used.sum()),
+            area=region_count[used].astype(np.int64), mean=region_mean[used]
+        )})
+
+        if render:
+            result.image = RegionSegmentationProcessor.saturate(region_mean[region])[labels]
+        return result
@@ -0,0 +1,272 @@
+"""Registry of processing algorithms and their parameter schemas.
+
+Each algorithm is registered by decorating its implementation::
+
+    @staticmethod
+    @algorithm('canny', 'Canny Edge Detection', parameters=[
+        Param('threshold1', 'int', 100, minimum=0, maximum=1000),
+        ...
+    ])
+    def canny(image, parameters): ...
+
+The entry records the parameter schema (type, range, default and how the
+value scales with the image for previews), a cost class used to pick the
+execution pool, and what the algorithm reads and produces. Requests are
+validated and coerced against the schema once, so implementations can
+trust ``parameters`` to be complete and well typed.
+"""
+import copy
+import importlib
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .results import ProcessorResult
+
+# Cost classes: LIGHT algorithms spend their time in OpenCV kernels that
+# release the GIL, HEAVY ones in Python, scipy or scikit-image
+LIGHT = 'light'
+HEAVY = 'heavy'
+
+KINDS = ('int', 'float', 'bool', 'choice', 'list')
+
+
+class ParameterError(ValueError):
+    """Raised when parameters do not match an algorithm's schema."""
+
+
+class Param:
+    """One parameter of an algorithm.
+
+    ``scale`` is the power of the image scale factor the value follows
+    when an algorithm runs on a downscaled preview (1 for lengths, 2 for
+    areas, 0 when it does not depend on the image size). Lists take the
+    ``item`` kind and ``choices``/bounds apply to every item; ``length``
+    fixes how many items a list has.
+    """
+
+    def __init__(self, name: str, kind: str, default: Any = None, minimum: float = None,
+                 maximum: float = None, step: float = None, choices: Sequence[str] = None,
+                 item: str = None, odd: bool = False, scale: int = 0, label: str = None,
+                 length: int = None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown parameter kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.choices = tuple(choices) if choices else None
+        self.item = item
+        self.length = length
+        self.odd = odd
+        self.scale = scale
+        self.label = label or name.replace('_', ' ').capitalize()
+
+    def coerce(self, value: Any) -> Any:
+        """Convert a request value to the declared type, raising ``ParameterError``."""
+        if value is None:
+            return None
+        if self.kind == 'list':
+            if isinstance(value, str):
+                value = [v for v in value.split(',') if v.strip()]
+            elif not isinstance(value, (list, tuple)):
+                value = [value]
+            if self.length is not None and len(value) != self.length:
+                raise ParameterError(f"{self.name} must have {self.length} values")
+            return [self._scalar(v, self.item) for v in value]
+        return self._scalar(value, self.kind)
+
+    def _scalar(self, value: Any, kind: str) -> Any:
+        if kind == 'bool':
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered in ('true', '1', 'yes', 'on'):
+                    return True
+                if lowered in ('false', '0', 'no', 'off'):
+                    return False
+                raise ParameterError(f"{self.name} must be true or false")
+            return bool(value)
+
+        if kind == 'choice':
+            value = str(value)
+            if value not in self.choices:
+                raise ParameterError(f"{self.name} must be one of: {', '.join(self.choices)}")
+            return value
+
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ParameterError(f"{self.name} must be a number")
+        if not math.isfinite(number):
+            raise ParameterError(f"{self.name} must be finite")
+        if kind == 'int':
+            if not number.is_integer():
+                raise ParameterError(f"{self.name} must be an integer")
+            number = int(number)
+            if self.odd and number % 2 == 0:
+                number += 1
+        if self.minimum is not None and number < self.minimum:
+            raise ParameterError(f"{self.name} must be at least {self.minimum}")
+        if self.maximum is not None and number > self.maximum:
+            raise ParameterError(f"{self.name} must be at most {self.maximum}")
+        return number
+
+    def rescale(self, value: Any, scale: float) -> Any:
+        """Scale a coerced value for an image resized by ``scale``."""
+        if not self.scale or value is None or self.kind not in ('int', 'float'):
+            return value
+        scaled = value * math.pow(scale, self.scale)
+        if self.minimum is not None:
+            scaled = max(scaled, self.minimum)
+        if self.maximum is not None:
+            scaled = min(scaled, self.maximum)
+        if self.kind == 'int':
+            scaled = int(round(scaled))
+            if self.odd:
+                scaled |= 1
+        return scaled
+
+    def schema(self) -> Dict[str, Any]:
+        described = {'name': self.name, 'label': self.label, 'type': self.kind, 'default': self.default}
+        for key in ('minimum', 'maximum', 'step', 'choices', 'item', 'length'):
+            value = getattr(self, key)
+            if value is not None:
+                described[key] = list(value) if key == 'choices' else value
+        if self.odd:
+            described['odd'] = True
+        if self.scale:
+            described['scale'] = self.scale
+        return described
+
+
+class Algorithm:
+    """A registered algorithm.
+
+    ``structured`` implementations take ``(image, parameters, render)`` and
+    return a ``ProcessorResult``; the others take ``(image, parameters)``
+    and return the output image. ``grayscale_input`` marks algorithms that
+    only look at luminance (the API decodes their input straight to
+    grayscale), ``grayscale_output`` those that return a single-channel
+    image.
+    """
+
+    def __init__(self, name: str, label: str, implementation: Callable, parameters: List[Param],
+                 cost: str = LIGHT, structured: bool = False,
+                 grayscale_input: bool = False, grayscale_output: bool = False):
+        self.name = name
+        self.label = label
+        self.implementation = implementation
+        self.parameters = {param.name: param for param in parameters}
+        self.cost = cost
+        self.structured = structured
+        self.grayscale_input = grayscale_input
+        self.grayscale_output = grayscale_output
+
+    def coerce(self, parameters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Validate request parameters and fill in defaults."""
+        parameters = parameters or {}
+        unknown = set(parameters) - set(self.parameters)
+        if unknown:
+            raise ParameterError(f"Unknown parameters for {self.name}: {', '.join(sorted(unknown))}")
+        return {
+            name: param.coerce(parameters[name]) if name in parameters else copy.copy(param.default)
+            for name, param in self.parameters.items()
+        }
+
+    def rescale(self, parameters: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        """Adjust pixel-sized parameters for an image scaled by ``scale``."""
+        if scale == 1:
+            return dict(parameters)
+        return {
+            name: self.parameters[name].rescale(value, scale) if name in self.parameters else value
+            for name, value in parameters.items()
+        }
+
+    def process(self, image: np.ndarray, parameters: Dict[str, Any]) -> np.ndarray:
+        if self.structured:
+            return self.implementation(image, parameters, True).image
+        return self.implementation(image, parameters)
+
+    def analyze(self, image: np.ndarray, parameters: Dict[str, Any], render: bool = True) -> ProcessorResult:
+        if self.structured:
+            return self.implementation(image, parameters, render)
+        # The output image is the whole result, so it is produced regardless of render
+        return ProcessorResult(image=self.implementation(image, parameters))
+
+    def schema(self) -> Dict[str, Any]:
+        return {
+            'id': self.name,
+            'name': self.label,
+            'cost': self.cost,
+            'structured': self.structured,
+            'parameters': [param.schema() for param in self.parameters.values()],
+        }
+
+
+REGISTRY: Dict[str, Algorithm] = {}
+
+# Modules whose algorithms register themselves on import, in listing order,
+# with the algorithms each defines so a module is imported on first use
+MODULES = {
+    'edge_detection': ('canny', 'log', 'dog'),
+    'texture_analysis': ('glcm',),
+    'shape_detection': ('hough', 'chain'),
+    'image_enhancement': ('histogram',),
+    'geometric_transformation': ('affine', 'perspective'),
+    'region_segmentation': ('region-growing', 'split-merge'),
+}
+MODULE_OF = {name: module for module, names in MODULES.items() for name in names}
+
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def algorithm(name: str, label: str, parameters: List[Param] = (), **options):
+    """Decorator registering the decorated function as algorithm ``name``."""
+    def register(implementation: Callable) -> Callable:
+        if name in REGISTRY:
+            raise ValueError(f"Algorithm registered twice: {name}")
+        REGISTRY[name] = Algorithm(name, label, implementation, list(parameters), **options)
+        return implementation
+    return register
+
+
+def load(names: Sequence[str] = None):
+    """Import the processor modules defining ``names`` (default: all of them)."""
+    global _loaded
+    if names is None:
+        modules = MODULES
+    else:
+        modules = {MODULE_OF[name] for name in names if name in MODULE_OF}
+    with _load_lock:
+        for module in modules:
+            importlib.import_module(f'.{module}', __package__)
+        if names is None:
+            _loaded = True
+
+
+def get_algorithm(name: str) -> Algorithm:
+    """Look up an algorithm, raising ``ParameterError`` for unknown names.
+
+    Only the module defining ``name`` is imported, so a worker that runs
+    one algorithm never loads the dependencies of the others.
+    """
+    spec = REGISTRY.get(name)
+    if spec is None and name in MODULE_OF:
+        load([name])
+        spec = REGISTRY.get(name)
+    if spec is None:
+        raise ParameterError(f"Unknown algorithm: {name}")
+    return spec
+
+
+def list_algorithms() -> List[Algorithm]:
+    """Every algorithm, grouped in ``MODULES`` order whatever the import order was."""
+    if not _loaded:
+        load()
+    rank = {f'{__package__}.{module}': i for i, module in enumerate(MODULES)}
+    return sorted(REGISTRY.values(), key=lambda spec: rank.get(spec.implementation.__module__, len(MODULES)))
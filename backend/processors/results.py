@@ -0,0 +1,202 @@
+"""Structured outputs processors can return next to, or instead of, an image.
+
+Each output type is a dataclass of numpy arrays and scalars. ``to_json``
+keeps small arrays as plain lists and packs large ones (label images,
+feature maps) as zlib-compressed base64 with their dtype and shape.
+``to_npz`` writes every array into one compressed ``.npz`` archive under
+``<output>.<field>`` keys, with the scalars in a ``meta`` JSON entry.
+"""
+import base64
+import io
+import json
+import zlib
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Arrays with more elements than this are packed instead of listed
+INLINE_ELEMENTS = 4096
+
+
+def encode_array(array: np.ndarray) -> Any:
+    """JSON form of an array: a nested list, or packed bytes when large."""
+    if array.size <= INLINE_ELEMENTS:
+        return array.tolist()
+    return {
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        "encoding": "zlib+base64",
+        "data": base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes(), 1)).decode("ascii"),
+    }
+
+
+def decode_array(value: Any) -> np.ndarray:
+    """Inverse of ``encode_array``."""
+    if isinstance(value, dict):
+        data = zlib.decompress(base64.b64decode(value["data"]))
+        return np.frombuffer(data, dtype=np.dtype(value["dtype"])).reshape(value["shape"])
+    return np.asarray(value)
+
+
+class Output:
+    """Base for structured outputs; subclasses are dataclasses."""
+    kind = "output"
+
+    def to_json(self) -> Dict[str, Any]:
+        encoded = {"type": self.kind}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, np.ndarray):
+                value = encode_array(value)
+            elif isinstance(value, dict):
+                value = {k: encode_array(v) if isinstance(v, np.ndarray) else v for k, v in value.items()}
+            encoded[f.name] = value
+        return encoded
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        found = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, np.ndarray):
+                found[f.name] = value
+            elif isinstance(value, dict):
+                found.update({f"{f.name}.{k}": v for k, v in value.items() if isinstance(v, np.ndarray)})
+        return found
+
+    def scalars(self) -> Dict[str, Any]:
+        found = {"type": self.kind}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, dict):
+                value = {k: v for k, v in value.items() if not isinstance(v, np.ndarray)}
+                if value:
+                    found[f.name] = value
+            elif not isinstance(value, np.ndarray):
+                found[f.name] = value
+        return found
+
+
+@dataclass
+class HoughLines(Output):
+    """Lines in normal form, strongest first: x cos(theta) + y sin(theta) = rho."""
+    kind = "hough_lines"
+    rho: np.ndarray
+    theta: np.ndarray
+    votes: np.ndarray
+
+
+@dataclass
+class LineSegments(Output):
+    """Segments from the probabilistic transform as rows of (x1, y1, x2, y2)."""
+    kind = "line_segments"
+    endpoints: np.ndarray
+
+
+@dataclass
+class Circles(Output):
+    """Circles from the gradient Hough transform, strongest first."""
+    kind = "circles"
+    center: np.ndarray
+    radius: np.ndarray
+
+
+@dataclass
+class ScaleSpace(Output):
+    """Difference-of-Gaussians stack: int16 for 8-bit input, float32 on the 0-255 scale otherwise.
+
+    ``layers[i]`` is the blur at ``sigma[i]`` minus the blur at ``sigma[i + 1]``.
+    """
+    kind = "scale_space"
+    sigma: np.ndarray
+    layers: np.ndarray
+
+
+@dataclass
+class Contours(Output):
+    """Contours packed end to end.
+
+    Contour ``i`` is ``points[offsets[i]:offsets[i + 1]]`` as (x, y) rows;
+    its Freeman chain code is ``codes[code_offsets[i]:code_offsets[i + 1]]``.
+    """
+    kind = "contours"
+    points: np.ndarray
+    offsets: np.ndarray
+    codes: np.ndarray
+    code_offsets: np.ndarray
+    perimeter: np.ndarray
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def contour(self, i: int) -> np.ndarray:
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+
+@dataclass
+class RegionLabels(Output):
+    """Label image (0 = unassigned) with per-region pixel count and mean intensity."""
+    kind = "region_labels"
+    labels: np.ndarray
+    count: int
+    area: np.ndarray
+    mean: np.ndarray
+
+
+@dataclass
+class TextureFeatures(Output):
+    """Sliding-window GLCM feature maps sampled every ``stride`` pixels."""
+    kind = "texture_features"
+    maps: Dict[str, np.ndarray]
+    window: int
+    stride: int
+    summary: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+@dataclass
+class ProcessorResult:
+    """What ``BaseProcessor.analyze`` returns.
+
+    ``image`` is the rendered output, ``None`` when rendering was skipped.
+    ``outputs`` maps names such as ``"lines"`` to structured outputs.
+    """
+    image: Optional[np.ndarray] = None
+    outputs: Dict[str, Output] = field(default_factory=dict)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {name: output.to_json() for name, output in self.outputs.items()}
+
+    def to_npz(self, include_image: bool = True) -> bytes:
+        arrays = {
+            f"{name}.{key}": value
+            for name, output in self.outputs.items()
+            for key, value in output.arrays().items()
+        }
+        if include_image and self.image is not None:
+            arrays["image"] = self.image
+        meta = {name: output.scalars() for name, output in self.outputs.items()}
+        arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return buffer.getvalue()
+
+    @property
+    def nbytes(self) -> int:
+        total = self.image.nbytes if self.image is not None else 0
+        for output in self.outputs.values():
+            total += sum(array.nbytes for array in output.arrays().values())
+        return total
+
+
+def contours_output(contours: List[np.ndarray], chains: List[Dict[str, Any]]) -> Contours:
+    """Pack OpenCV contours and their ``chain_codes`` into a ``Contours`` output."""
+    lengths = [len(contour) for contour in contours]
+    code_lengths = [len(chain['codes']) for chain in chains]
+    return Contours(
+        points=np.concatenate(contours).reshape(-1, 2).astype(np.int32) if contours else np.zeros((0, 2), np.int32),
+        offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        codes=np.concatenate([chain['codes'] for chain in chains]).astype(np.int8) if chains else np.zeros(0, np.int8),
+        code_offsets=np.concatenate([[0], np.cumsum(code_lengths)]).astype(np.int64),
+        perimeter=np.array([chain['perimeter'] for chain in chains], dtype=np.float64),
+    )
@@ -1,108 +1,253 @@
 import cv2
 import numpy as np
 from .base import BaseProcessor
+from .memo import ImageMemo
+from .registry import algorithm, Param
+from .results import ProcessorResult, HoughLines, LineSegments, Circles, contours_output
 
 class ShapeDetectionProcessor(BaseProcessor):
     @staticmethod
-    def hough_transform(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply Hough Transform for line detection."""
-        gray = ShapeDetectionProcessor.ensure_grayscale(image)
-        
-        # Edge detection
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # Hough Transform
+    def edge_map(memo: ImageMemo, threshold1: int, threshold2: int) -> np.ndarray:
+        """Canny edges of the image, memoized per thresholds."""
+        return memo.get('edges', lambda: memo.canny(threshold1, threshold2),
+                        threshold1=threshold1, threshold2=threshold2)
+
+    @staticmethod
+    def line_peaks(memo: ImageMemo, edges: np.ndarray, rho: float, theta: float, **edge_parameters) -> np.ndarray:
+        """Every local maximum of the vote accumulator as (rho, theta, votes) rows.
+
+        Rows are ordered as ``cv2.HoughLinesWithAccumulator`` orders them,
+        most votes first, so the lines for any threshold are a prefix.
+        """
+        def transform():
+            # Threshold 0 keeps every peak; this costs about as much as one thresholded call
+            peaks = cv2.HoughLinesWithAccumulator(edges, rho, theta, 0)
+            return peaks.reshape(-1, 3) if peaks is not None else np.zeros((0, 3), np.float32)
+
+        return memo.get('hough-lines', transform, rho=rho, theta=theta, **edge_parameters)
+
+    @staticmethod
+    def line_endpoints(rho: np.ndarray, theta: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Where each line x cos(theta) + y sin(theta) = rho enters and leaves the image.
+
+        Returns (x1, y1, x2, y2) rows clipped to the pixel grid; lines that
+        miss the image get no row.
+        """
+        cos, sin = np.cos(theta, dtype=np.float64), np.sin(theta, dtype=np.float64)
+        origin = np.stack([cos * rho, sin * rho])
+        direction = np.stack([-sin, cos])
+        # cos(pi / 2) is not quite 0; snap it so border lines stay on the border
+        direction[np.abs(direction) < 1e-12] = 0
+        upper = np.array([[width - 1], [height - 1]], dtype=np.float64)
+
+        # Range of the line parameter inside each pair of image edges
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first = -origin / direction
+            second = (upper - origin) / direction
+        low, high = np.minimum(first, second), np.maximum(first, second)
+        parallel = direction == 0
+        inside = (origin >= 0) & (origin <= upper)
+        low = np.where(parallel, np.where(inside, -np.inf, np.inf), low)
+        high = np.where(parallel, np.where(inside, np.inf, -np.inf), high)
+
+        enter, leave = low.max(axis=0), high.min(axis=0)
+        visible = enter <= leave
+        origin, direction = origin[:, visible], direction[:, visible]
+        ends = np.concatenate([origin + enter[visible] * direction, origin + leave[visible] * direction])
+        return np.rint(ends.T).astype(np.int32)
+
+    @staticmethod
+    @algorithm('hough', 'Hough Transform', parameters=[
+        Param('rho', 'float', 1.0, minimum=0.01, maximum=100, step=0.1, scale=1),
+        Param('theta', 'float', np.pi / 180, minimum=0.001, maximum=np.pi, step=0.001),
+        # Votes are pixels along a line, so they shrink with its length
+        Param('threshold', 'int', 100, minimum=1, maximum=10000, step=1, scale=1),
+        Param('mode', 'choice', 'standard', choices=('standard', 'probabilistic', 'circles')),
+        Param('min_line_length', 'float', 0.0, minimum=0, maximum=10000, step=1, scale=1),
+        Param('max_line_gap', 'float', 0.0, minimum=0, maximum=10000, step=1, scale=1),
+        Param('canny_threshold1', 'int', 50, minimum=0, maximum=500, step=1),
+        Param('canny_threshold2', 'int', 150, minimum=1, maximum=500, step=1),
+        Param('min_distance', 'float', 20.0, minimum=1, maximum=10000, step=1, scale=1),
+        Param('min_radius', 'int', 0, minimum=0, maximum=10000, step=1, scale=1),
+        Param('max_radius', 'int', 0, minimum=0, maximum=10000, step=1, scale=1),
+    ], structured=True)
+    def hough_transform(image: np.ndarray, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Apply Hough Transform for line detection.
+
+        Lines are found on a Canny edge map (``canny_threshold1``/``2``).
+        ``mode='probabilistic'`` runs ``cv2.HoughLinesP`` and returns segment
+        endpoints instead of infinite lines. ``mode='circles'`` runs the
+        gradient Hough transform for circles at least ``min_distance`` apart,
+        with ``canny_threshold2`` as its edge threshold and ``threshold`` as
+        the votes a centre needs; a ``max_radius`` of 0 means no limit.
+
+        The edge map and the accumulator peaks are memoized per image, so a
+        call that only changes ``threshold`` selects from the stored peaks.
+        """
+        memo = ImageMemo(image)
+        gray = memo.gray(scratch='gray')
+        threshold = int(parameters.get('threshold', 100))
+        canny_threshold1 = int(parameters.get('canny_threshold1', 50))
+        canny_threshold2 = int(parameters.get('canny_threshold2', 150))
+        mode = parameters.get('mode', 'standard')
+
+        if mode == 'circles':
+            # The transform runs its own Canny on the smoothed image, which must be 8-bit
+            found = cv2.HoughCircles(
+                cv2.medianBlur(ShapeDetectionProcessor.to_uint8(gray), 5), cv2.HOUGH_GRADIENT, 1, float(parameters.get('min_distance', 20)),
+                param1=canny_threshold2, param2=threshold,
+                minRadius=int(parameters.get('min_radius', 0)), maxRadius=int(parameters.get('max_radius', 0))
+            )
+            found = found.reshape(-1, 3) if found is not None else np.zeros((0, 3), np.float32)
+            result = ProcessorResult(outputs={'circles': Circles(center=found[:, :2], radius=found[:, 2])})
+            if render:
+                output = ShapeDetectionProcessor.color_canvas(image)
+                for (x, y), radius in zip(np.rint(found[:, :2]).astype(int), np.rint(found[:, 2]).astype(int)):
+                    cv2.circle(output, (int(x), int(y)), int(radius), (0, 0, 255), 2)
+                result.image = output
+            return result
+
+        edges = ShapeDetectionProcessor.edge_map(memo, canny_threshold1, canny_threshold2)
         rho = float(parameters.get('rho', 1))
         theta = float(parameters.get('theta', np.pi/180))
-        threshold = int(parameters.get('threshold', 100))
-        
-        lines = cv2.HoughLines(edges, rho, theta, threshold)
-        
-        # Create output image
-        output = image.copy()
-        
-        if lines is not None:
-            for line in lines:
-                rho, theta = line[0]
-                a = np.cos(theta)
-                b = np.sin(theta)
-                x0 = a * rho
-                y0 = b * rho
-                x1 = int(x0 + 1000*(-b))
-                y1 = int(y0 + 1000*(a))
-                x2 = int(x0 - 1000*(-b))
-                y2 = int(y0 - 1000*(a))
-                cv2.line(output, (x1, y1), (x2, y2), (0, 0, 255), 2)
-        
-        return output
+
+        if mode == 'probabilistic':
+            segments = cv2.HoughLinesP(
+                edges, rho, theta, threshold,
+                minLineLength=float(parameters.get('min_line_length', 0)),
+                maxLineGap=float(parameters.get('max_line_gap', 0))
+            )
+            endpoints = segments.reshape(-1, 4) if segments is not None else np.zeros((0, 4), np.int32)
+            result = ProcessorResult(outputs={'segments': LineSegments(endpoints=endpoints)})
+            if render:
+                output = ShapeDetectionProcessor.color_canvas(image)
+                cv2.polylines(output, endpoints.reshape(-1, 2, 2), False, (0, 0, 255), 2)
+                result.image = output
+            return result
+
+        # Same lines as cv2.HoughLinesWithAccumulator: the peaks with more than threshold votes
+        peaks = ShapeDetectionProcessor.line_peaks(memo, edges, rho, theta,
+                                                   threshold1=canny_threshold1, threshold2=canny_threshold2)
+        lines = peaks[:np.searchsorted(-peaks[:, 2], -threshold, side='left')]
+        result = ProcessorResult(outputs={'lines': HoughLines(
+            rho=lines[:, 0], theta=lines[:, 1], votes=lines[:, 2].astype(np.int32)
+        )})
+        if not render:
+            return result
+
+        # Draw every line across the whole image in one call
+        output = ShapeDetectionProcessor.color_canvas(image)
+        endpoints = ShapeDetectionProcessor.line_endpoints(lines[:, 0], lines[:, 1], gray.shape[1], gray.shape[0])
+        cv2.polylines(output, endpoints.reshape(-1, 2, 2), False, (0, 0, 255), 2)
+        result.image = output
+        return result
+
+    # Freeman direction for each (dy + 1, dx + 1) step between contour points,
+    # with y pointing down: 0 = east, 2 = south, 4 = west, 6 = north
+    CHAIN_CODE_LUT = np.array([
+        [5, 6, 7],
+        [4, -1, 0],
+        [3, 2, 1],
+    ], dtype=np.int8)
+
+    @staticmethod
+    def chain_codes(contours) -> list:
+        """Compute Freeman chain codes for a list of OpenCV contours at once.
+
+        Contours must come from ``cv2.CHAIN_APPROX_NONE`` so consecutive
+        points are 8-neighbours. Every contour is treated as closed. Returns
+        one dict per contour with its ``start`` point, ``codes`` array and
+        ``perimeter`` (diagonal steps count as sqrt(2)).
+        """
+        if not contours:
+            return []
+
+        lengths = np.array([len(contour) for contour in contours])
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+
+        # Step from every point to the next one, wrapping around each contour
+        points = np.concatenate(contours).reshape(-1, 2)
+        following = np.arange(1, len(points) + 1)
+        following[ends - 1] = starts
+        steps = np.clip(points[following] - points, -1, 1)
+        codes = ShapeDetectionProcessor.CHAIN_CODE_LUT[steps[:, 1] + 1, steps[:, 0] + 1]
+
+        diagonal = np.add.reduceat((codes % 2 == 1).astype(np.int64), starts)
+        perimeter = (lengths - diagonal) + diagonal * np.sqrt(2)
+
+        results = []
+        for start, length, contour_codes, contour_perimeter in zip(
+            starts, lengths, np.split(codes, ends[:-1]), perimeter
+        ):
+            if length == 1:
+                # A lone pixel has no steps
+                contour_codes, contour_perimeter = contour_codes[:0], 0.0
+            results.append({
+                'start': tuple(int(v) for v in points[start]),
+                'codes': contour_codes,
+                'perimeter': float(contour_perimeter),
+            })
+        return results
 
     @staticmethod
-    def chain_code(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply Chain Code for contour detection and representation."""
-        gray = ShapeDetectionProcessor.ensure_grayscale(image)
-        
-        # Threshold the image
-        _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-        
-        # Find contours
-        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
+    @algorithm('chain', 'Chain Code', parameters=[
+        Param('show_codes', 'bool', True),
+        Param('max_labels', 'int', 500, minimum=0, maximum=100000, step=10),
+        Param('label_step', 'int', 0, minimum=0, maximum=100000, step=1),
+    ], structured=True)
+    def chain_code(image: np.ndarray, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Apply Chain Code for contour detection and representation.
+
+        Contours are drawn in a single call. Code labels are optional
+        (``show_codes``) and decimated: every ``label_step``-th code across
+        all contours, spaced to fit ``max_labels`` when no step is given.
+        No more than ``max_labels`` are drawn either way; 0 draws none.
+        """
+        gray = ShapeDetectionProcessor.ensure_grayscale(image, scratch='gray')
+
+        show_codes = str(parameters.get('show_codes', True)).lower() not in ('false', '0', 'no')
+        max_labels = int(parameters.get('max_labels', 500))
+        label_step = int(parameters.get('label_step', 0))
+
+        # Threshold the image at 127 on the 0-255 scale, whatever its depth
+        binary = cv2.compare(gray, 127 / ShapeDetectionProcessor.depth_scale(gray), cv2.CMP_GT)
+
+        # Find contours, keeping every boundary pixel so steps are unit moves
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        chains = ShapeDetectionProcessor.chain_codes(contours)
+        result = ProcessorResult(outputs={'contours': contours_output(contours, chains)})
+        if not render:
+            return result
+
         # Create output image
-        output = image.copy()
-        
-        # Draw contours and their chain codes
-        for contour in contours:
-            # Draw contour
-            cv2.drawContours(output, [contour], -1, (0, 255, 0), 2)
-            
-            # Calculate chain code
-            chain_code = []
-            for i in range(len(contour)):
-                current = contour[i][0]
-                next_point = contour[(i + 1) % len(contour)][0]
-                dx = next_point[0] - current[0]
-                dy = next_point[1] - current[1]
-                
-                # Convert to chain code (0-7)
-                if dx == 1 and dy == 0:
-                    code = 0
-                elif dx == 1 and dy == 1:
-                    code = 1
-                elif dx == 0 and dy == 1:
-                    code = 2
-                elif dx == -1 and dy == 1:
-                    code = 3
-                elif dx == -1 and dy == 0:
-                    code = 4
-                elif dx == -1 and dy == -1:
-                    code = 5
-                elif dx == 0 and dy == -1:
-                    code = 6
-                else:
-                    code = 7
-                
-                chain_code.append(code)
-            
-            # Draw chain code values
-            for i, point in enumerate(contour):
-                cv2.putText(
-                    output,
-                    str(chain_code[i]),
-                    tuple(point[0]),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (255, 0, 0),
-                    1
-                )
-        
-        return output
-
-    @classmethod
-    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
-        """Process image with the specified shape detection algorithm."""
-        if algorithm == 'hough':
-            return cls.hough_transform(image, parameters)
-        elif algorithm == 'chain':
-            return cls.chain_code(image, parameters)
-        else:
-            raise ValueError(f"Unknown shape detection algorithm: {algorithm}") 
\ No newline at end of file
+        output = ShapeDetectionProcessor.color_canvas(image)
+        cv2.drawContours(output, contours, -1, (0, 255, 0), 2)
+        result.image = output
+
+        if not show_codes or not contours or max_labels <= 0:
+            return result
+
+        lengths = np.array([len(chain['codes']) for chain in chains])
+        ends = np.cumsum(lengths)
+        if label_step <= 0:
+            label_step = max(1, -(-int(ends[-1]) // max_labels))
+
+        # Step one running index over the codes of every contour, so small
+        # contours share the budget instead of each getting a label
+        picks = np.arange(0, ends[-1], label_step)[:max_labels]
+        owners = np.searchsorted(ends, picks, side='right')
+
+        # Draw a decimated subset of the chain code values
+        for owner, i in zip(owners, picks - (ends - lengths)[owners]):
+            cv2.putText(
+                output,
+                str(chains[owner]['codes'][i]),
+                tuple(int(v) for v in contours[owner][i][0]),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 0, 0),
+                1
+            )
+
+        return result
@@ -1,58 +1,210 @@
 import cv2
 import numpy as np
+from typing import Dict, List, Sequence, Tuple
 from .base import BaseProcessor
-from skimage.feature import graycomatrix, graycoprops
+from .registry import algorithm, Param, HEAVY
+from .results import ProcessorResult, TextureFeatures
+
+# Properties graycoprops defines, all computed per window
+GLCM_FEATURES = (
+    'contrast', 'dissimilarity', 'homogeneity', 'ASM', 'energy',
+    'correlation', 'entropy', 'mean', 'variance', 'std',
+)
+
+# Features that need each window's full co-occurrence histogram; the rest
+# only need window sums of per-pair values
+HISTOGRAM_FEATURES = {'ASM', 'energy', 'entropy'}
+
+
+def _number_list(value, cast) -> List:
+    """Accept a list, a single number or a comma-separated string."""
+    if isinstance(value, str):
+        value = [v for v in value.split(',') if v.strip()]
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    return [cast(float(v)) for v in value]
+
+
+def _window_bounds(centres: np.ndarray, window: int, size: int, offset: int, start: int, length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Range of reference pixels whose pairs lie inside each window.
+
+    Windows are ``window`` pixels centred on ``centres`` and clipped to the
+    image. A pair at ``offset`` only counts when both pixels are inside,
+    which shifts one end of the range. Returned relative to ``start``, the
+    first reference pixel that has a neighbour at all.
+    """
+    lo = np.clip(centres - window // 2, 0, size)
+    hi = np.clip(centres - window // 2 + window, 0, size)
+    lo = np.maximum(lo, lo - offset) - start
+    hi = np.minimum(hi, hi - offset) - start
+    lo = np.clip(lo, 0, length)
+    return lo, np.clip(np.maximum(hi, lo), 0, length)
+
+
+def _window_sums(values: np.ndarray, rows, cols) -> np.ndarray:
+    """Sum ``values`` over every window through an integral image."""
+    (r0, r1), (c0, c1) = rows, cols
+    # Counts of 0/1 indicators are exact in int32 and cheaper to gather
+    integral = cv2.integral(values, sdepth=cv2.CV_32S if values.dtype == np.uint8 else cv2.CV_64F)
+    # Gather whole rows first, then columns; np.take is much faster than
+    # fancy indexing along the second axis
+    strips = np.take(integral, r1, axis=0)
+    strips -= np.take(integral, r0, axis=0)
+    sums = np.take(strips, c1, axis=1)
+    sums -= np.take(strips, c0, axis=1)
+    return sums
+
 
 class TextureAnalysisProcessor(BaseProcessor):
     @staticmethod
-    def glcm(image: np.ndarray, parameters: dict) -> np.ndarray:
-        """Apply Gray-Level Co-occurrence Matrix (GLCM) analysis."""
+    def glcm_feature_maps(gray: np.ndarray, num_levels: int = 8, window: int = 15, stride: int = 1,
+                          distances: Sequence[int] = (1,), angles: Sequence[float] = (0, 45, 90, 135),
+                          features: Sequence[str] = GLCM_FEATURES) -> Dict[str, np.ndarray]:
+        """Sliding-window GLCM properties as float maps.
+
+        Every ``stride``-th pixel gets the properties of the symmetric,
+        normalized co-occurrence matrix of the ``window`` around it, the
+        same values ``graycomatrix``/``graycoprops`` give for that patch,
+        averaged over all distances and angles (in degrees). Instead of
+        building a matrix per window, per-pair values are summed over all
+        windows at once with integral images; features that need the whole
+        histogram get one integral image per gray-level pair.
+        """
+        unknown = set(features) - set(GLCM_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown GLCM features: {', '.join(sorted(unknown))}")
+
+        height, width = gray.shape
+        levels = TextureAnalysisProcessor.quantize(gray, num_levels)
+        ys = np.arange(0, height, stride)
+        xs = np.arange(0, width, stride)
+        # Window sums stay float64, as integral images of squares lose
+        # precision in float32; the maps only add one term per offset
+        maps = {name: np.zeros((len(ys), len(xs)), np.float32) for name in features}
+        offsets = [
+            (int(round(np.sin(np.deg2rad(angle)) * distance)), int(round(np.cos(np.deg2rad(angle)) * distance)))
+            for distance in distances for angle in angles
+        ]
+
+        for dy, dx in offsets:
+            # Reference pixels and their neighbours, aligned
+            r0, r1 = max(0, -dy), min(height, height - dy)
+            c0, c1 = max(0, -dx), min(width, width - dx)
+            a = levels[r0:r1, c0:c1].astype(np.float32)
+            b = levels[r0 + dy:r1 + dy, c0 + dx:c1 + dx].astype(np.float32)
+            rows = _window_bounds(ys, window, height, dy, r0, max(r1 - r0, 0))
+            cols = _window_bounds(xs, window, width, dx, c0, max(c1 - c0, 0))
+
+            # The symmetric matrix counts every pair in both orders
+            count = np.outer(rows[1] - rows[0], cols[1] - cols[0]).astype(np.float64)
+            total = np.maximum(count, 1) * 2
+
+            def mean_of(values):
+                return _window_sums(values, rows, cols) / total
+
+            difference = a - b
+            if 'contrast' in features:
+                maps['contrast'] += 2 * mean_of(difference * difference)
+            if 'dissimilarity' in features:
+                maps['dissimilarity'] += 2 * mean_of(np.abs(difference))
+            if 'homogeneity' in features:
+                maps['homogeneity'] += 2 * mean_of(1 / (1 + difference * difference))
+
+            if {'correlation', 'mean', 'variance', 'std'} & set(features):
+                mean = mean_of(a + b)
+                variance = np.maximum(mean_of(a * a + b * b) - mean * mean, 0)
+                if 'mean' in features:
+                    maps['mean'] += mean
+                if 'variance' in features:
+                    maps['variance'] += variance
+                if 'std' in features:
+                    maps['std'] += np.sqrt(variance)
+                if 'correlation' in features:
+                    covariance = 2 * mean_of(a * b) - mean * mean
+                    # Both marginals are equal, so std_i * std_j is the variance
+                    flat = variance < 1e-10
+                    maps['correlation'] += np.where(flat, 1, covariance / np.where(flat, 1, variance))
+
+            if HISTOGRAM_FEATURES & set(features):
+                codes = np.minimum(a, b) * num_levels + np.maximum(a, b)
+                asm = np.zeros_like(count)
+                entropy = np.zeros_like(count)
+                for code in np.unique(codes):
+                    i, j = divmod(int(code), num_levels)
+                    # (i, j) and (j, i) share the count; the diagonal gets it twice
+                    counts = _window_sums(np.equal(codes, code).view(np.uint8), rows, cols)
+                    p = np.divide(counts, total if i != j else total / 2)
+                    cells = 2 if i != j else 1
+                    if 'entropy' in features:
+                        entropy -= cells * p * np.log(p, where=p > 0, out=np.zeros_like(p))
+                    p *= p
+                    asm += p if cells == 1 else 2 * p
+                if 'ASM' in features:
+                    maps['ASM'] += asm
+                if 'energy' in features:
+                    maps['energy'] += np.sqrt(asm)
+                if 'entropy' in features:
+                    maps['entropy'] += entropy
+
+        for name in maps:
+            maps[name] /= len(offsets)
+        return maps
+
+    @staticmethod
+    @algorithm('glcm', 'Gray-Level Co-occurrence Matrix (GLCM)', parameters=[
+        Param('num_levels', 'int', 8, minimum=2, maximum=64, step=1),
+        Param('window', 'int', 15, minimum=2, maximum=255, step=1, scale=1),
+        Param('stride', 'int', 1, minimum=1, maximum=64, step=1, scale=1),
+        Param('distances', 'list', [1], item='int', minimum=1, maximum=64),
+        Param('angles', 'list', [0.0, 45.0, 90.0, 135.0], item='float', minimum=-360, maximum=360),
+        Param('feature', 'choice', 'contrast', choices=GLCM_FEATURES),
+        Param('features', 'list', None, item='choice', choices=GLCM_FEATURES),
+    ], cost=HEAVY, structured=True, grayscale_input=True)
+    def glcm(image: np.ndarray, parameters: dict, render: bool = True) -> ProcessorResult:
+        """Compute sliding-window GLCM feature maps and render one with a colormap.
+
+        ``features`` lists the maps to return (all of ``GLCM_FEATURES`` by
+        name, or a comma-separated string); ``feature`` is the one rendered
+        and is always included.
+        """
         gray = TextureAnalysisProcessor.ensure_grayscale(image)
-        
-        # Quantize the image to reduce the number of gray levels
-        num_levels = int(parameters.get('num_levels', 8))
-        gray = (gray / (256 // num_levels)).astype(np.uint8)
-        
-        # Calculate GLCM
-        distances = [1]
-        angles = [0, np.pi/4, np.pi/2, 3*np.pi/4]
-        glcm = graycomatrix(gray, distances, angles, num_levels, symmetric=True, normed=True)
-        
-        # Calculate GLCM properties
-        contrast = graycoprops(glcm, 'contrast')
-        dissimilarity = graycoprops(glcm, 'dissimilarity')
-        homogeneity = graycoprops(glcm, 'homogeneity')
-        energy = graycoprops(glcm, 'energy')
-        correlation = graycoprops(glcm, 'correlation')
-        
-        # Create visualization
-        properties = np.stack([
-            contrast.reshape(-1),
-            dissimilarity.reshape(-1),
-            homogeneity.reshape(-1),
-            energy.reshape(-1),
-            correlation.reshape(-1)
-        ])
-        
-        # Normalize properties to 0-255 range
-        properties = ((properties - properties.min()) / (properties.max() - properties.min()) * 255).astype(np.uint8)
-        
-        # Create a visualization image
-        vis_size = int(np.sqrt(len(properties)))
-        vis_image = np.zeros((vis_size * 5, vis_size * 4), dtype=np.uint8)
-        
-        for i, prop in enumerate(properties):
-            prop_reshaped = prop.reshape(vis_size, vis_size)
-            row = i // 4
-            col = i % 4
-            vis_image[row*vis_size:(row+1)*vis_size, col*vis_size:(col+1)*vis_size] = prop_reshaped
-        
-        return TextureAnalysisProcessor.ensure_color(vis_image)
-
-    @classmethod
-    def process(cls, image: np.ndarray, algorithm: str, parameters: dict) -> np.ndarray:
-        """Process image with the specified texture analysis algorithm."""
-        if algorithm == 'glcm':
-            return cls.glcm(image, parameters)
-        else:
-            raise ValueError(f"Unknown texture analysis algorithm: {algorithm}") 
\ No newline at end of file
+        feature = parameters.get('feature', 'contrast')
+        features = parameters.get('features') or [feature]
+        if isinstance(features, str):
+            features = [name.strip() for name in features.split(',') if name.strip()]
+        if render and feature not in features:
+            features = [*features, feature]
+        window = max(int(parameters.get('window', 15)), 2)
+        stride = max(int(parameters.get('stride', 1)), 1)
+
+        maps = TextureAnalysisProcessor.glcm_feature_maps(
+            gray,
+            num_levels=int(parameters.get('num_levels', 8)),
+            window=window,
+            stride=stride,
+            distances=_number_list(parameters.get('distances', [1]), int),
+            angles=_number_list(parameters.get('angles', [0, 45, 90, 135]), float),
+            features=features,
+        )
+        result = ProcessorResult(outputs={'texture': TextureFeatures(
+            maps=maps,
+            window=window,
+            stride=stride,
+            summary={
+                name: {
+                    'mean': float(values.mean()), 'std': float(values.std()),
+                    'min': float(values.min()), 'max': float(values.max()),
+                }
+                for name, values in maps.items()
+            },
+        )})
+        if not render:
+            return result
+
+        # Stretch to 0-255 for display; flat maps render as the low end
+        rendered = cv2.applyColorMap(TextureAnalysisProcessor.normalize(maps[feature]), cv2.COLORMAP_VIRIDIS)
+
+        if stride > 1:
+            rendered = cv2.resize(rendered, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_NEAREST)
+        result.image = rendered
+        return result
@@ -0,0 +1,199 @@
+"""Geometric warps resampled once through cached fixed-point remap maps.
+
+Transforms are 3x3 homographies in OpenCV's convention: they map input
+pixel coordinates to output pixel coordinates. ``compose`` folds any
+number of affine (2x3) and perspective (3x3) steps into one matrix, so a
+chain of steps interpolates the image once instead of once per step.
+
+``cv2.warpAffine`` and ``cv2.warpPerspective`` work out the source
+position of every output pixel on each call. In batch and video use the
+same transform meets many images of one size, so ``warp`` computes those
+positions once, as the fixed-point maps ``cv2.remap`` takes (integer
+source pixel plus a 1/32-pixel interpolation table index), and keeps
+them in an LRU bounded by ``REMAP_CACHE_BYTES`` (0 disables it), keyed
+on the matrix, the output size and the interpolation.
+"""
+import os
+from typing import NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..cache import ResultCache
+
+REMAP_CACHE = ResultCache(max_bytes=int(os.getenv('REMAP_CACHE_BYTES', 64 * 1024 * 1024)))
+
+INTERPOLATIONS = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'cubic': cv2.INTER_CUBIC,
+    'lanczos': cv2.INTER_LANCZOS4,
+}
+
+# Source pixels each interpolation reads before and after the sampled position
+SUPPORT = {
+    cv2.INTER_NEAREST: (0, 0),
+    cv2.INTER_LINEAR: (0, 1),
+    cv2.INTER_CUBIC: (1, 2),
+    cv2.INTER_LANCZOS4: (3, 4),
+}
+
+# Subpixel resolution of the fixed-point maps, as in OpenCV (INTER_BITS)
+TABLE_BITS = 5
+TABLE_SIZE = 1 << TABLE_BITS
+
+# remap stores source pixels as int16, which also bounds the output canvas
+MAX_SIDE = 32767
+
+# Output rows converted per block, to keep the float64 temporaries small
+BLOCK_ROWS = 256
+
+Size = Tuple[int, int]
+
+
+class RemapMaps(NamedTuple):
+    """Fixed-point ``cv2.remap`` maps.
+
+    ``xy`` holds the integer source pixel of every output pixel as an
+    (h, w, 2) int16 array; ``table`` the (h, w) uint16 interpolation table
+    index, or ``None`` for nearest-neighbour maps.
+    """
+    xy: np.ndarray
+    table: Optional[np.ndarray]
+
+    @property
+    def nbytes(self) -> int:
+        return self.xy.nbytes + (self.table.nbytes if self.table is not None else 0)
+
+
+def homography(matrix: np.ndarray) -> np.ndarray:
+    """A 2x3 affine or 3x3 perspective matrix as a float64 3x3 homography."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.shape == (2, 3):
+        return np.vstack([matrix, [0.0, 0.0, 1.0]])
+    if matrix.shape != (3, 3):
+        raise ValueError(f"Expected a 2x3 or 3x3 matrix, got {matrix.shape}")
+    return matrix
+
+
+def compose(*steps: np.ndarray) -> np.ndarray:
+    """Fold transforms, applied in the order given, into one 3x3 homography."""
+    composed = np.eye(3)
+    for step in steps:
+        composed = homography(step) @ composed
+    return composed
+
+
+def fit_canvas(matrix: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, Size]:
+    """Shift ``matrix`` and size the output so the whole warped image fits.
+
+    Returns the shifted homography and the (width, height) of the canvas.
+    """
+    matrix = homography(matrix)
+    corners = np.array([[0, 0, 1], [width - 1, 0, 1], [width - 1, height - 1, 1], [0, height - 1, 1]], np.float64)
+    mapped = corners @ matrix.T
+    if np.any(mapped[:, 2] <= 0):
+        raise ValueError("The transform maps part of the image past the horizon; it cannot be fitted")
+    mapped = mapped[:, :2] / mapped[:, 2:]
+    x0, y0 = np.floor(mapped.min(axis=0))
+    x1, y1 = np.ceil(mapped.max(axis=0))
+    size = (int(x1 - x0) + 1, int(y1 - y0) + 1)
+    if max(size) > MAX_SIDE:
+        raise ValueError(f"The fitted canvas would be {size[0]}x{size[1]}, more than {MAX_SIDE} pixels on a side")
+    return compose(matrix, [[1, 0, -x0], [0, 1, -y0]]), size
+
+
+def fill_maps(inverse: np.ndarray, maps: RemapMaps, x0: int = 0, y0: int = 0):
+    """Write the maps of output pixels from (``x0``, ``y0``) on into ``maps``.
+
+    ``inverse`` maps output pixels to source pixels. Positions are rounded
+    to 1/32 pixel, as ``cv2.convertMaps`` rounds float maps.
+    """
+    height, width = maps.xy.shape[:2]
+    nearest = maps.table is None
+    scale = 1 if nearest else TABLE_SIZE
+    affine = inverse[2, 0] == 0 and inverse[2, 1] == 0 and inverse[2, 2] == 1
+    xs = np.arange(x0, x0 + width, dtype=np.float64)
+
+    for start in range(0, height, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, height)
+        ys = np.arange(y0 + start, y0 + stop, dtype=np.float64)[:, None]
+        sx = inverse[0, 0] * xs + (inverse[0, 1] * ys + inverse[0, 2])
+        sy = inverse[1, 0] * xs + (inverse[1, 1] * ys + inverse[1, 2])
+        if not affine:
+            w = inverse[2, 0] * xs + (inverse[2, 1] * ys + inverse[2, 2])
+            # Points at or past the horizon have no source pixel
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.divide(sx, w, out=sx, where=w > 0)
+                np.divide(sy, w, out=sy, where=w > 0)
+            sx[w <= 0] = sy[w <= 0] = -MAX_SIDE
+        # Far-off positions are clamped; anything outside int16 is outside the image anyway
+        limit = (MAX_SIDE + 1) * scale - 1
+        sx = np.rint(np.clip(sx * scale, -limit, limit, out=sx), out=sx).astype(np.int32)
+        sy = np.rint(np.clip(sy * scale, -limit, limit, out=sy), out=sy).astype(np.int32)
+        if nearest:
+            maps.xy[start:stop, :, 0] = sx
+            maps.xy[start:stop, :, 1] = sy
+        else:
+            maps.xy[start:stop, :, 0] = sx >> TABLE_BITS
+            maps.xy[start:stop, :, 1] = sy >> TABLE_BITS
+            maps.table[start:stop] = (sy & (TABLE_SIZE - 1)) * TABLE_SIZE + (sx & (TABLE_SIZE - 1))
+
+
+def build_maps(matrix: np.ndarray, size: Size, interpolation: int, x0: int = 0, y0: int = 0) -> RemapMaps:
+    """Maps for the ``size`` (width, height) block of the output at (``x0``, ``y0``)."""
+    width, height = size
+    maps = RemapMaps(
+        xy=np.empty((height, width, 2), np.int16),
+        table=None if interpolation == cv2.INTER_NEAREST else np.empty((height, width), np.uint16),
+    )
+    fill_maps(np.linalg.inv(homography(matrix)), maps, x0, y0)
+    return maps
+
+
+def remap_maps(matrix: np.ndarray, size: Size, interpolation: int) -> RemapMaps:
+    """The whole-output maps of a warp, from ``REMAP_CACHE`` when it was seen before."""
+    matrix = homography(matrix)
+    if REMAP_CACHE.max_bytes <= 0:
+        return build_maps(matrix, size, interpolation)
+    key = f"{interpolation}:{size[0]}x{size[1]}:{matrix.tobytes().hex()}"
+    maps = REMAP_CACHE.get(key)
+    if maps is None:
+        maps = build_maps(matrix, size, interpolation)
+        for array in maps:
+            if array is not None:
+                array.setflags(write=False)
+        REMAP_CACHE.put(key, maps)
+    return maps
+
+
+def remap(image: np.ndarray, maps: RemapMaps, interpolation: int, dst: np.ndarray = None) -> np.ndarray:
+    """Resample ``image`` through ``maps``; pixels from outside the image are black."""
+    return cv2.remap(image, maps.xy, maps.table, interpolation, dst=dst,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+
+
+def warp(image: np.ndarray, matrix: np.ndarray, size: Size, interpolation: int = cv2.INTER_LINEAR,
+         dst: np.ndarray = None) -> np.ndarray:
+    """Warp ``image`` onto a ``size`` (width, height) canvas, resampling it once."""
+    return remap(image, remap_maps(matrix, size, interpolation), interpolation, dst)
+
+
+def source_box(maps: RemapMaps, interpolation: int, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """The (x0, y0, x1, y1) part of a ``width`` x ``height`` source that ``maps`` read, or ``None``."""
+    before, after = SUPPORT[interpolation]
+    xs, ys = maps.xy[:, :, 0], maps.xy[:, :, 1]
+    x0, x1 = max(int(xs.min()) - before, 0), min(int(xs.max()) + after + 1, width)
+    y0, y1 = max(int(ys.min()) - before, 0), min(int(ys.max()) + after + 1, height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def shift_maps(maps: RemapMaps, dx: int, dy: int):
+    """Move the source origin of ``maps`` to (``dx``, ``dy``), for reading from a crop, in place."""
+    for axis, delta in ((0, dx), (1, dy)):
+        if delta:
+            plane = maps.xy[:, :, axis]
+            # In int32, so far-off positions saturate instead of wrapping into the crop
+            np.clip(plane.astype(np.int32) - delta, -MAX_SIDE - 1, MAX_SIDE, out=plane, casting='unsafe')
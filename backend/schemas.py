@@ -1,8 +1,37 @@
 # schemas.py
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 class ProcessImageRequest(BaseModel):
     algorithm: str
-    parameters: Dict[str, Any]
-    image: str
+    # Missing parameters take the defaults from the algorithm's schema
+    parameters: Dict[str, Any] = {}
+    # Either the image itself or the hash returned by an earlier call
+    image: Optional[str] = None
+    image_hash: Optional[str] = None
+    # Run on a downscaled pyramid level for fast interactive feedback
+    preview: bool = False
+    preview_size: int = 1024
+    # Include structured outputs (lines, contours, labels, texture maps)
+    results: bool = False
+    # Skip drawing and encoding the output image; implies results
+    render: bool = True
+
+class BatchProcessRequest(BaseModel):
+    algorithm: str
+    parameters: Dict[str, Any] = {}
+    # Values to sweep per parameter; every combination runs on every image
+    parameter_grid: Dict[str, List[Any]] = {}
+    images: List[str] = []
+    image_hashes: List[str] = []
+
+class PipelineStage(BaseModel):
+    algorithm: str
+    parameters: Dict[str, Any] = {}
+
+class PipelineRequest(BaseModel):
+    stages: List[PipelineStage]
+    image: Optional[str] = None
+    image_hash: Optional[str] = None
+    # Include every stage's output image, not just the final one
+    return_intermediates: bool = False
@@ -0,0 +1,113 @@
+"""Content-addressed blob store for image payloads on the local filesystem.
+
+Blobs are named by the SHA-256 of their bytes and fanned out into
+two-character directories (``blobs/ab/abcdef...``), so writing the same
+image twice is a no-op and a digest is a permanent, cacheable identifier.
+Downscaled variants are stored next to their source as ``<digest>.<size>``.
+"""
+import hashlib
+import os
+import re
+from typing import Optional
+
+import cv2
+import numpy as np
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the formats we encode or accept
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+
+def sniff_media_type(head: bytes) -> str:
+    """Guess an image media type from the first bytes of a file."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    return "application/octet-stream"
+
+
+def file_media_type(path: str) -> str:
+    with open(path, "rb") as f:
+        return sniff_media_type(f.read(16))
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest: str, size: Optional[int] = None) -> str:
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+        name = digest if size is None else f"{digest}.{size}"
+        return os.path.join(self.root, digest[:2], name)
+
+    def exists(self, digest: str, size: Optional[int] = None) -> bool:
+        return os.path.exists(self.path(digest, size))
+
+    def put(self, data, size: Optional[int] = None, digest: Optional[str] = None) -> str:
+        """Store bytes (or any buffer) and return their digest.
+
+        Variants pass the ``digest`` of their source blob plus a ``size``.
+        """
+        if digest is None:
+            digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest, size)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write under a temporary name so readers never see partial blobs
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def thumbnail(self, digest: str, size: int, source: Optional[np.ndarray] = None) -> str:
+        """Return the path of a variant no larger than ``size`` on either side.
+
+        The variant is rendered as PNG on first request and kept on disk.
+        Sources already within ``size`` are served as they are. Callers that
+        hold the decoded image can pass it as ``source`` to skip a decode.
+        """
+        path = self.path(digest, size)
+        if os.path.exists(path):
+            return path
+
+        if source is None:
+            source = cv2.imread(self.path(digest), cv2.IMREAD_UNCHANGED)
+        if source is None:
+            raise ValueError(f"Blob {digest} is not a decodable image")
+        if max(source.shape[:2]) <= size:
+            return self.path(digest)
+
+        _, buffer = cv2.imencode(".png", downscale(source, size))
+        self.put(buffer, size=size, digest=digest)
+        return path
+
+    def build_pyramid(self, digest: str, image: np.ndarray, sizes) -> None:
+        """Render every missing pyramid level for a newly seen image."""
+        for size in sorted(sizes, reverse=True):
+            self.thumbnail(digest, size, source=image)
+
+
+def downscale(image: np.ndarray, size: int) -> np.ndarray:
+    """Resize so the longer side is ``size`` pixels, keeping the aspect ratio."""
+    height, width = image.shape[:2]
+    if max(height, width) <= size:
+        return image
+    scale = size / max(height, width)
+    return cv2.resize(
+        image,
+        (max(1, round(width * scale)), max(1, round(height * scale))),
+        interpolation=cv2.INTER_AREA
+    )
@@ -0,0 +1,321 @@
+"""Frame-stream processing over a WebSocket.
+
+The client's first message configures the stream::
+
+    {"algorithm": "canny", "parameters": {...}, "format": "jpeg", "quality": 80}
+
+and is answered with ``{"type": "ready", ...}``. After that every binary
+message is one encoded frame (anything ``cv2.imdecode`` reads) and every
+binary reply is the processed frame in ``format``, in arrival order. A text
+message ``{"parameters": {...}}`` changes the parameters mid-stream; every
+text message is answered with a ``{"type": "stats", ...}`` message.
+
+Frames move through three stages, decode, process and encode, each run on
+a worker thread, so consecutive frames occupy all three at once. Stages
+hand frames on through single slots: at most one frame waits in front of
+each stage, and a frame that arrives while the previous one is still
+waiting to be decoded replaces it. A client sending faster than the
+server keeps up gets fewer frames back, never a growing delay.
+
+What only depends on the configuration and the frame size is prepared
+once per stream: the CLAHE object, the warp's remap maps and the output
+buffers, which rotate through a small ring so a frame can be written
+while the previous one is being encoded. Gaussian filters (LoG, DoG) go
+through the processor code, whose intermediates already live in
+per-thread scratch buffers.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .processors import memo, warp
+from .processors.registry import Algorithm, ParameterError, HEAVY, get_algorithm
+
+MAX_FRAME_BYTES = int(os.getenv("STREAM_MAX_FRAME_BYTES", 16 * 1024 * 1024))
+
+# Output buffers per stream: one being encoded, one waiting for it, one being written
+RING_SIZE = 3
+
+# Shared by every stream's stages; a busy pool shows up as dropped frames
+_pool: Optional[ThreadPoolExecutor] = None
+
+# Totals over all streams, for /metrics
+counters = dict.fromkeys(("received", "processed", "dropped", "errors"), 0)
+active_streams = 0
+
+
+def pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv("STREAM_THREADS", max(4, os.cpu_count() or 1)))
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stream")
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class StreamError(ValueError):
+    """A configuration or control message the stream cannot accept."""
+
+
+class FrameState:
+    """Runs one algorithm configuration over the frames of a stream.
+
+    Subclasses keep state that depends only on the parameters and the
+    frame shape; ``prepare`` is called whenever the frame shape changes.
+    """
+
+    def __init__(self, spec: Algorithm, parameters: Dict[str, Any]):
+        self.spec = spec
+        self.parameters = parameters
+        self.shape = None
+        self._ring = []
+        self._next = 0
+
+    def __call__(self, frame: np.ndarray) -> np.ndarray:
+        if frame.shape != self.shape:
+            self.shape = frame.shape
+            self._ring = []
+            self.prepare(frame.shape)
+        return self.run(frame)
+
+    def prepare(self, shape: Tuple[int, ...]):
+        pass
+
+    def run(self, frame: np.ndarray) -> np.ndarray:
+        # Frames never repeat, so hashing them for the per-image memo is wasted
+        with memo.bypass():
+            return self.spec.process(frame, self.parameters)
+
+    def output(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """The next uint8 output buffer of the ring."""
+        if len(self._ring) < RING_SIZE:
+            self._ring.append(np.empty(shape, np.uint8))
+            return self._ring[-1]
+        buffer = self._ring[self._next]
+        self._next = (self._next + 1) % RING_SIZE
+        return buffer
+
+
+class CannyFrames(FrameState):
+    def run(self, frame):
+        # Frames of grayscale_input algorithms are decoded straight to grayscale
+        return cv2.Canny(frame, int(self.parameters['threshold1']), int(self.parameters['threshold2']),
+                         edges=self.output(frame.shape[:2]))
+
+
+class ClaheFrames(FrameState):
+    def prepare(self, shape):
+        from .processors.image_enhancement import CLAHE_GRID
+
+        self.clahe = cv2.createCLAHE(clipLimit=float(self.parameters['clip_limit']), tileGridSize=CLAHE_GRID)
+        if len(shape) == 3:
+            self.lab = np.empty(shape, np.uint8)
+            self.lightness = np.empty(shape[:2], np.uint8)
+
+    def run(self, frame):
+        output = self.output(frame.shape)
+        if frame.ndim == 2:
+            return self.clahe.apply(frame, dst=output)
+        # Equalize the L channel of LAB, as the processor does
+        cv2.cvtColor(frame, cv2.COLOR_BGR2LAB, dst=self.lab)
+        cv2.extractChannel(self.lab, 0, dst=self.lightness)
+        self.clahe.apply(self.lightness, dst=self.lightness)
+        cv2.insertChannel(self.lightness, self.lab, 0)
+        return cv2.cvtColor(self.lab, cv2.COLOR_LAB2BGR, dst=output)
+
+
+class WarpFrames(FrameState):
+    def prepare(self, shape):
+        from .processors.geometric_transformation import GeometricTransformationProcessor
+
+        height, width = shape[:2]
+        matrix, self.size, self.interpolation = GeometricTransformationProcessor.warp_plan(
+            self.spec.name, width, height, self.parameters)
+        # Held for the whole stream, so frames skip even the cache lookup
+        self.maps = warp.remap_maps(matrix, self.size, self.interpolation)
+
+    def run(self, frame):
+        width, height = self.size
+        return warp.remap(frame, self.maps, self.interpolation, dst=self.output((height, width) + frame.shape[2:]))
+
+
+FRAME_STATES = {
+    'canny': CannyFrames,
+    'histogram': ClaheFrames,
+    'affine': WarpFrames,
+    'perspective': WarpFrames,
+}
+
+
+def frame_state(algorithm: str, parameters: Optional[Dict[str, Any]]) -> FrameState:
+    """Validate a stream configuration and build its per-stream state."""
+    try:
+        spec = get_algorithm(algorithm)
+        parameters = spec.coerce(parameters)
+    except ParameterError as e:
+        raise StreamError(str(e))
+    if spec.cost == HEAVY:
+        raise StreamError(f"{algorithm} is too slow to run on a frame stream")
+    return FRAME_STATES.get(algorithm, FrameState)(spec, parameters)
+
+
+class FrameStream:
+    """One WebSocket connection streaming frames through an algorithm."""
+
+    def __init__(self, websocket: WebSocket, encode: Callable[[np.ndarray, str, Optional[int]], np.ndarray],
+                 formats: Iterable[str]):
+        self.websocket = websocket
+        self.encode = encode
+        self.formats = set(formats)
+        self.state: Optional[FrameState] = None
+        self.format = "jpeg"
+        self.quality = None
+        self.stats = dict.fromkeys(("received", "processed", "dropped", "errors"), 0)
+        self.latency = 0.0
+        self.started = None
+        # The slot in front of the decoder, and the ones between stages
+        self._incoming: Optional[Tuple[bytes, float]] = None
+        self._arrived = asyncio.Event()
+        self._decoded: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._processed: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def run(self):
+        global active_streams
+        await self.websocket.accept()
+        try:
+            self.configure(json.loads(await self.websocket.receive_text()))
+        except (StreamError, ValueError, TypeError, KeyError) as e:
+            await self.websocket.send_json({"type": "error", "detail": str(e)})
+            await self.websocket.close(code=1008)
+            return
+        except WebSocketDisconnect:
+            return
+        await self.websocket.send_json({"type": "ready", "algorithm": self.state.spec.name,
+                                        "parameters": self.state.parameters, "format": self.format})
+
+        active_streams += 1
+        stages = [asyncio.ensure_future(stage()) for stage in (self._decode, self._process, self._encode)]
+        try:
+            await self._receive()
+        finally:
+            active_streams -= 1
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+
+    def configure(self, config: Dict[str, Any]):
+        if not isinstance(config, dict) or "algorithm" not in config:
+            raise StreamError("The first message must be a JSON object with an algorithm")
+        output_format = str(config.get("format", "jpeg")).lower().replace("jpg", "jpeg")
+        if output_format not in self.formats:
+            raise StreamError(f"Unsupported output format: {output_format}")
+        quality = config.get("quality")
+        if quality is not None and (type(quality) is not int or not 0 <= quality <= 100):
+            raise StreamError("quality must be an integer between 0 and 100")
+        self.state = frame_state(config["algorithm"], config.get("parameters"))
+        self.format = output_format
+        self.quality = quality
+
+    def stats_message(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "type": "stats",
+            **self.stats,
+            "fps": self.stats["processed"] / elapsed if elapsed else 0.0,
+            "latency_ms": self.latency * 1000,
+        }
+
+    def _count(self, outcome: str):
+        self.stats[outcome] += 1
+        counters[outcome] += 1
+
+    async def _receive(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                self._offer(message["bytes"])
+            elif message.get("text") is not None:
+                await self._control(message["text"])
+
+    def _offer(self, data: bytes):
+        self._count("received")
+        if self.started is None:
+            self.started = time.perf_counter()
+        if not data or len(data) > MAX_FRAME_BYTES:
+            self._count("errors")
+            return
+        if self._incoming is not None:
+            # The decoder has not taken the previous frame yet; keep only the newest
+            self._count("dropped")
+        self._incoming = (data, time.perf_counter())
+        self._arrived.set()
+
+    async def _control(self, text: str):
+        try:
+            message = json.loads(text)
+            if isinstance(message, dict) and "parameters" in message:
+                # Frames already decoded finish with the old state
+                self.state = frame_state(self.state.spec.name, message["parameters"])
+        except (StreamError, ValueError) as e:
+            await self.websocket.send_json({"type": "error", "detail": str(e)})
+            return
+        await self.websocket.send_json(self.stats_message())
+
+    async def _in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool(), fn, *args)
+
+    async def _decode(self):
+        while True:
+            await self._arrived.wait()
+            self._arrived.clear()
+            if self._incoming is None:
+                continue
+            (data, arrived), self._incoming = self._incoming, None
+            flags = cv2.IMREAD_GRAYSCALE if self.state.spec.grayscale_input else cv2.IMREAD_COLOR
+            try:
+                frame = await self._in_thread(cv2.imdecode, np.frombuffer(data, np.uint8), flags)
+            except Exception:
+                frame = None
+            if frame is None:
+                self._count("errors")
+                continue
+            await self._decoded.put((frame, arrived))
+
+    async def _process(self):
+        while True:
+            frame, arrived = await self._decoded.get()
+            try:
+                output = await self._in_thread(self.state, frame)
+            except Exception:
+                self._count("errors")
+                continue
+            await self._processed.put((output, arrived))
+
+    async def _encode(self):
+        while True:
+            output, arrived = await self._processed.get()
+            try:
+                buffer = await self._in_thread(self.encode, output, self.format, self.quality)
+            except Exception:
+                self._count("errors")
+                continue
+            await self.websocket.send_bytes(buffer.tobytes())
+            self._count("processed")
+            # Smoothed time from a frame's arrival to its reply
+            elapsed = time.perf_counter() - arrived
+            self.latency = elapsed if self.stats["processed"] == 1 else 0.9 * self.latency + 0.1 * elapsed
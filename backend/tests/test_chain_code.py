@@ -0,0 +1,69 @@
+"""Check how many chain code labels chain_code draws.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import cv2
+import numpy as np
+import pytest
+
+from backend.processors.shape_detection import ShapeDetectionProcessor
+
+
+def blobs(rows: int = 60, columns: int = 60) -> np.ndarray:
+    """A grid of 4x4 squares, one per 10x10 cell, each its own contour with 12 codes."""
+    gray = np.zeros((rows * 10, columns * 10), np.uint8)
+    for y in range(rows):
+        for x in range(columns):
+            gray[y * 10 + 3:y * 10 + 7, x * 10 + 3:x * 10 + 7] = 255
+    return gray
+
+
+@pytest.fixture
+def labels(monkeypatch):
+    """Run chain_code and return the positions it put labels at."""
+    drawn = []
+    put_text = cv2.putText
+
+    def record(image, text, origin, *args):
+        drawn.append(origin)
+        return put_text(image, text, origin, *args)
+
+    monkeypatch.setattr(cv2, 'putText', record)
+
+    def run(image, **parameters):
+        drawn.clear()
+        result = ShapeDetectionProcessor.chain_code(image, parameters, True)
+        return result, list(drawn)
+
+    return run
+
+
+def test_more_contours_than_max_labels(labels):
+    result, drawn = labels(blobs(), max_labels=500)
+    assert len(result.outputs['contours']) == 3600
+    # 43200 codes, every 87th labelled
+    assert 450 < len(drawn) <= 500
+    # Spread over the whole image, not bunched into the first contours
+    ys = [y for _, y in drawn]
+    assert min(ys) < 10 and max(ys) > 590
+
+
+def test_label_step_runs_across_contours(labels):
+    # 3600 contours of 12 codes; every 24th code labels every other contour once
+    _, drawn = labels(blobs(), max_labels=100000, label_step=24)
+    assert len(drawn) == 1800
+
+
+def test_max_labels_caps_an_explicit_step(labels):
+    _, drawn = labels(blobs(), max_labels=50, label_step=1)
+    assert len(drawn) == 50
+
+
+def test_zero_max_labels_draws_none(labels):
+    _, drawn = labels(blobs(), max_labels=0)
+    assert drawn == []
+
+
+def test_every_code_labelled_within_budget(labels):
+    _, drawn = labels(blobs(2, 2), max_labels=500)
+    assert len(drawn) == 4 * 12
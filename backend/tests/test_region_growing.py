@@ -0,0 +1,58 @@
+"""Pin the segmentation region_growing produces on a small fixture.
+
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import cv2
+import numpy as np
+
+from backend.processors.region_segmentation import RegionSegmentationProcessor
+
+
+def fixture() -> np.ndarray:
+    """Two halves (40 and 200), a 3x3 block of 120 on the right, and two small specks on the left."""
+    gray = np.full((16, 16), 40, np.uint8)
+    gray[:, 8:] = 200
+    gray[6:9, 11:14] = 120
+    gray[12, 3] = 100   # never a seed, too far from 40 to be grown into
+    gray[2, 2:4] = 0    # seeds its own region, below min_size
+    return gray
+
+
+def grow(image: np.ndarray, threshold: float, min_size: int):
+    return RegionSegmentationProcessor.region_growing(image, {'threshold': threshold, 'min_size': min_size}, True)
+
+
+def test_regions_grow_per_seed_in_raster_order():
+    result = grow(fixture(), threshold=20, min_size=4)
+    regions = result.outputs['regions']
+
+    expected = np.zeros((16, 16), np.int32)
+    expected[:, :8] = 1
+    expected[:, 8:] = 2
+    expected[6:9, 11:14] = 3
+    expected[12, 3] = 0
+    expected[2, 2:4] = 0
+
+    np.testing.assert_array_equal(regions.labels, expected)
+    assert regions.count == 3
+    np.testing.assert_array_equal(regions.area, [125, 119, 9])
+    np.testing.assert_allclose(regions.mean, [40, 200, 120])
+    # Regions are drawn with their seed intensity, unlabelled pixels black
+    np.testing.assert_array_equal(result.image, np.array([0, 40, 200, 120], np.uint8)[expected])
+
+
+def test_wider_threshold_merges_into_the_earlier_seed():
+    regions = grow(fixture(), threshold=90, min_size=4).outputs['regions']
+
+    expected = np.ones((16, 16), np.int32)
+    expected[:, 8:] = 2
+
+    np.testing.assert_array_equal(regions.labels, expected)
+    assert regions.count == 2
+
+
+def test_color_input_segments_its_luminance():
+    gray = fixture()
+    color = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    np.testing.assert_array_equal(grow(color, 20, 4).outputs['regions'].labels,
+                                  grow(gray, 20, 4).outputs['regions'].labels)
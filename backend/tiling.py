@@ -0,0 +1,435 @@
+"""Tiled execution for images too large to process in one piece.
+
+The image is cut into tiles, each tile is grown by the halo its filter
+needs to see past the tile edge, and only the tile core is written back,
+so the stitched result matches whole-image processing:
+
+* LoG and DoG are local: the halo is the Gaussian radius plus one pixel
+  for the Laplacian.
+* Canny computes gradients and non-maximum suppression locally (a few
+  pixels of halo), but hysteresis follows edges across the whole image.
+  Tiles produce weak/strong edge marks, and the marks are then promoted
+  tile by tile until no weak edge touching a strong one is left.
+* CLAHE equalizes each cell of a fixed grid over the whole image and
+  interpolates between neighbouring cells. The per-cell lookup tables
+  are built from a streamed pass over the image; each tile then needs
+  nothing but those tables.
+* Affine and perspective warps build the remap maps of each output tile
+  and read the tile from the bounding box of the source pixels those
+  maps touch, plus the interpolation's reach.
+
+Working memory for the tiles in flight is capped by
+``TILE_MEMORY_BUDGET``, which also decides the tile size and how many
+tiles run in parallel. The source image and the stitched result are held
+whole on top of that. Images smaller than ``TILED_MIN_PIXELS`` are not
+tiled at all.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+from .processors import memo, warp
+from .processors.base import BaseProcessor
+
+TILE_MEMORY_BUDGET = int(os.getenv('TILE_MEMORY_BUDGET', 256 * 1024 * 1024))
+TILED_MIN_PIXELS = int(os.getenv('TILED_MIN_PIXELS', 16 * 1024 * 1024))
+TILE_WORKERS = int(os.getenv('TILE_WORKERS', os.cpu_count() or 1))
+MIN_TILE = 128
+
+# Peak bytes each processor allocates per pixel of a tile, input included
+WORKING_BYTES = {
+    'canny': 16,
+    'log': 24,
+    'dog': 12,
+    'histogram': 32,
+    # Source and output tiles, the fixed-point maps and their float64 temporaries
+    'affine': 40,
+    'perspective': 48,
+}
+
+Box = Tuple[int, int, int, int]
+
+
+def supports_tiling(algorithm: str) -> bool:
+    return algorithm in WORKING_BYTES
+
+
+def should_tile(algorithm: str, image: np.ndarray, min_pixels: int = None) -> bool:
+    if min_pixels is None:
+        min_pixels = TILED_MIN_PIXELS
+    if algorithm == 'histogram' and image.dtype != np.uint8:
+        # The streamed CLAHE tables are built for 8-bit levels
+        return False
+    return supports_tiling(algorithm) and image.shape[0] * image.shape[1] >= min_pixels
+
+
+def _gaussian_radius(sigma: float) -> int:
+    # OpenCV sizes sigma-only kernels at 3 sigma for 8-bit input, 4 otherwise
+    return int(math.ceil(4 * sigma)) + 1
+
+
+def halo(algorithm: str, parameters: Dict[str, Any]) -> int:
+    """Pixels of context a tile needs past its edges."""
+    if algorithm == 'log':
+        kernel_size = int(parameters['kernel_size']) | 1
+        sigma = float(parameters['sigma'])
+        return max(kernel_size // 2, _gaussian_radius(sigma)) + 1
+    if algorithm == 'dog':
+        sigma = max(float(parameters.get('sigma1', 1.0)), float(parameters.get('sigma2', 2.0)))
+        return _gaussian_radius(sigma)
+    if algorithm == 'canny':
+        # 3x3 Sobel, then comparison with the neighbouring gradients
+        return 2
+    return 0
+
+
+def plan(algorithm: str, shape, margin: int, budget: int = None, workers: int = None) -> Tuple[int, int]:
+    """Choose the tile side and the number of tiles processed at once.
+
+    Tiles run in parallel as long as each of them can still be at least
+    ``MIN_TILE`` pixels on a side within the budget.
+    """
+    budget = budget or TILE_MEMORY_BUDGET
+    workers = max(1, workers or TILE_WORKERS)
+    channels = shape[2] if len(shape) == 3 else 1
+    per_pixel = WORKING_BYTES[algorithm] + channels
+
+    while True:
+        side = int(math.sqrt(budget / (workers * per_pixel))) - 2 * margin
+        if side >= MIN_TILE or workers == 1:
+            break
+        workers -= 1
+
+    side = max(side, MIN_TILE)
+    return min(side, max(shape[0], shape[1])), workers
+
+
+def tile_boxes(height: int, width: int, side: int) -> List[Box]:
+    return [
+        (y, min(y + side, height), x, min(x + side, width))
+        for y in range(0, height, side)
+        for x in range(0, width, side)
+    ]
+
+
+def _expand(box: Box, margin: int, height: int, width: int) -> Box:
+    y0, y1, x0, x1 = box
+    return max(y0 - margin, 0), min(y1 + margin, height), max(x0 - margin, 0), min(x1 + margin, width)
+
+
+def _run_tiles(work: Callable[[Box], Any], boxes: List, workers: int) -> List[Any]:
+    if workers == 1 or len(boxes) == 1:
+        return [work(box) for box in boxes]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tile') as pool:
+        return list(pool.map(work, boxes))
+
+
+def _filter_tiled(image, parameters, process, margin, side, workers):
+    """Tile a filter whose output at a pixel only depends on ``margin`` around it."""
+    height, width = image.shape[:2]
+    boxes = tile_boxes(height, width, side)
+    output = None
+
+    def work(box):
+        y0, y1, x0, x1 = box
+        hy0, hy1, hx0, hx1 = _expand(box, margin, height, width)
+        # Tiles never repeat; keep them out of the per-image memo
+        with memo.bypass():
+            result = process(image[hy0:hy1, hx0:hx1], parameters)
+        output[y0:y1, x0:x1] = result[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+
+    # The first tile decides the output layout; the rest can run in parallel
+    y0, y1, x0, x1 = boxes[0]
+    hy0, hy1, hx0, hx1 = _expand(boxes[0], margin, height, width)
+    with memo.bypass():
+        first = process(image[hy0:hy1, hx0:hx1], parameters)
+    output = np.empty((height, width) + first.shape[2:], dtype=first.dtype)
+    output[y0:y1, x0:x1] = first[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+    del first
+
+    _run_tiles(work, boxes[1:], workers)
+    return output
+
+
+def _promote(region: np.ndarray, core=(slice(None), slice(None))) -> bool:
+    """Mark weak edges 8-connected to a strong one as strong, in place.
+
+    Only pixels inside ``core`` are changed; the rest of ``region`` is
+    context that belongs to other tiles.
+    """
+    count, labels = cv2.connectedComponents(cv2.compare(region, 0, cv2.CMP_GT), connectivity=8)
+    if count <= 1:
+        return False
+    keep = np.zeros(count, dtype=bool)
+    keep[labels[region == 2]] = True
+    keep[0] = False
+    inner = region[core]
+    promote = keep[labels[core]]
+    promote &= inner == 1
+    if not promote.any():
+        return False
+    inner[promote] = 2
+    return True
+
+
+def _touches(rim: np.ndarray, edge: np.ndarray) -> bool:
+    """Whether a strong pixel on one line is 8-adjacent to a weak one on the next."""
+    near = rim == 2
+    near[1:] |= rim[:-1] == 2
+    near[:-1] |= rim[1:] == 2
+    return bool((near & (edge == 1)).any())
+
+
+def _seam_pending(marks: np.ndarray, box: Box) -> bool:
+    """Whether a neighbouring tile's strong edge touches a weak edge of this one."""
+    height, width = marks.shape
+    y0, y1, x0, x1 = box
+    hy0, hy1, hx0, hx1 = _expand(box, 1, height, width)
+    return (
+        (y0 > 0 and _touches(marks[y0 - 1, hx0:hx1], marks[y0, hx0:hx1]))
+        or (y1 < height and _touches(marks[y1, hx0:hx1], marks[y1 - 1, hx0:hx1]))
+        or (x0 > 0 and _touches(marks[hy0:hy1, x0 - 1], marks[hy0:hy1, x0]))
+        or (x1 < width and _touches(marks[hy0:hy1, x1], marks[hy0:hy1, x1 - 1]))
+    )
+
+
+def _canny_tiled(image, parameters, side, workers):
+    height, width = image.shape[:2]
+    threshold1 = int(parameters['threshold1'])
+    threshold2 = int(parameters['threshold2'])
+    low, high = min(threshold1, threshold2), max(threshold1, threshold2)
+    margin = halo('canny', parameters)
+    boxes = tile_boxes(height, width, side)
+
+    # 1 = weak edge (local maximum above low), 2 = strong edge (above high)
+    marks = np.zeros((height, width), dtype=np.uint8)
+
+    def mark(box):
+        y0, y1, x0, x1 = box
+        hy0, hy1, hx0, hx1 = _expand(box, margin, height, width)
+        gray = BaseProcessor.ensure_grayscale(image[hy0:hy1, hx0:hx1])
+        # Canny takes 8-bit images, or the derivatives of deeper ones
+        source = (gray,)
+        if gray.dtype != np.uint8:
+            with memo.bypass():
+                source = tuple(memo.ImageMemo(gray).sobel())
+        # With equal thresholds Canny keeps every local maximum above them
+        weak = cv2.Canny(*source, low, low)
+        strong = cv2.Canny(*source, high, high)
+        core = (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0))
+        region = marks[y0:y1, x0:x1]
+        np.add(weak[core] >> 7, strong[core] >> 7, out=region)
+        # Hysteresis within the tile
+        _promote(region)
+
+    _run_tiles(mark, boxes, workers)
+
+    # Hysteresis across seams: a tile whose border has a weak edge next to
+    # a neighbour's strong one is promoted again with a one-pixel rim, and
+    # its neighbours are rechecked, until no seam has anything to pass on.
+    columns = len(range(0, width, side))
+    pending = list(range(len(boxes)))
+    queued = set(pending)
+    while pending:
+        i = pending.pop()
+        queued.discard(i)
+        if not _seam_pending(marks, boxes[i]):
+            continue
+        y0, y1, x0, x1 = boxes[i]
+        hy0, hy1, hx0, hx1 = _expand(boxes[i], 1, height, width)
+        core = (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0))
+        if not _promote(marks[hy0:hy1, hx0:hx1], core):
+            continue
+        row, column = divmod(i, columns)
+        for r in range(row - 1, row + 2):
+            for c in range(column - 1, column + 2):
+                j = r * columns + c
+                if 0 <= c < columns and 0 <= j < len(boxes) and j != i and j not in queued:
+                    pending.append(j)
+                    queued.add(j)
+
+    output = np.empty((height, width), dtype=np.uint8)
+
+    def render(box):
+        y0, y1, x0, x1 = box
+        cv2.compare(marks[y0:y1, x0:x1], 2, cv2.CMP_EQ, dst=output[y0:y1, x0:x1])
+
+    _run_tiles(render, boxes, workers)
+    return output
+
+
+def _clahe_source(image: np.ndarray) -> Callable[[int, int, int, int], np.ndarray]:
+    """Return a reader for the plane CLAHE equalizes (L of LAB for colour)."""
+    if image.ndim == 2:
+        return lambda y0, y1, x0, x1: image[y0:y1, x0:x1]
+
+    def lightness(y0, y1, x0, x1):
+        return cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2LAB)[:, :, 0]
+    return lightness
+
+
+def _clahe_luts(read, height: int, width: int, clip_limit: float,
+                budget: int, workers: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Per-cell lookup tables, computed exactly as ``cv2.createCLAHE`` does.
+
+    Like OpenCV, an image that does not divide into the grid is extended
+    at the bottom and right by reflection before it is cut into cells.
+    """
+    # Imported here so loading the executor does not register processor modules
+    from .processors.image_enhancement import CLAHE_GRID
+
+    tiles_x, tiles_y = CLAHE_GRID
+    if width % tiles_x == 0 and height % tiles_y == 0:
+        cell_w, cell_h = width // tiles_x, height // tiles_y
+    else:
+        cell_w = (width + tiles_x - width % tiles_x) // tiles_x
+        cell_h = (height + tiles_y - height % tiles_y) // tiles_y
+    area = cell_w * cell_h
+
+    # Bottom and right rows/columns past the image, mirrored without the edge
+    def reflect(index, size):
+        return np.where(index < size, index, 2 * (size - 1) - index)
+
+    columns = reflect(np.arange(cell_w * tiles_x), width)
+
+    def histogram(rows):
+        partial = np.zeros((tiles_y, tiles_x, 256), dtype=np.int64)
+        source_rows = reflect(rows, height)
+        lo, hi = source_rows.min(), source_rows.max() + 1
+        strip = read(lo, hi, 0, width)[source_rows - lo][:, columns]
+        for cy in range(rows[0] // cell_h, rows[-1] // cell_h + 1):
+            cells = strip[(rows // cell_h) == cy].reshape(-1, tiles_x, cell_w).transpose(1, 0, 2)
+            for cx in range(tiles_x):
+                partial[cy, cx] = np.bincount(cells[cx].ravel(), minlength=256)
+        return partial
+
+    rows_per_strip = max(1, budget // (WORKING_BYTES['histogram'] * width * workers))
+    strips = [
+        np.arange(y, min(y + rows_per_strip, cell_h * tiles_y))
+        for y in range(0, cell_h * tiles_y, rows_per_strip)
+    ]
+    histograms = sum(_run_tiles(histogram, strips, workers))
+
+    if clip_limit > 0:
+        limit = max(int(clip_limit * area / 256), 1)
+        clipped = np.maximum(histograms - limit, 0).sum(axis=2)
+        histograms = np.minimum(histograms, limit) + (clipped // 256)[:, :, None]
+        residual = clipped % 256
+        for cy, cx in zip(*np.nonzero(residual)):
+            step = max(256 // residual[cy, cx], 1)
+            histograms[cy, cx, 0:step * residual[cy, cx]:step] += 1
+
+    scale = np.float32(255.0 / area)
+    luts = np.rint(np.cumsum(histograms, axis=2).astype(np.float32) * scale)
+    return np.clip(luts, 0, 255).astype(np.uint8), (cell_h, cell_w)
+
+
+def _interpolation(start: int, length: int, size: int, tiles: int):
+    """Neighbouring cells and blend weight along one axis, in OpenCV's float32 arithmetic.
+
+    Returns runs of ``(begin, end, first, second)`` over which the two cells
+    stay the same, plus the weight of the second cell at every position.
+    """
+    position = np.arange(start, start + length, dtype=np.float32) * (np.float32(1) / np.float32(size)) - np.float32(0.5)
+    first = np.floor(position)
+    weight = position - first
+    first = first.astype(np.intp)
+    second = np.minimum(first + 1, tiles - 1)
+    first = np.maximum(first, 0)
+
+    bounds = [0, *(np.flatnonzero(np.diff(first) | np.diff(second)) + 1), length]
+    runs = [(b, e, first[b], second[b]) for b, e in zip(bounds[:-1], bounds[1:])]
+    return runs, weight
+
+
+def _clahe_apply(plane: np.ndarray, y0: int, x0: int, luts: np.ndarray, cell: Tuple[int, int]) -> np.ndarray:
+    """Bilinear blend of the four nearest cell tables, as in OpenCV."""
+    tiles_y, tiles_x = luts.shape[:2]
+    row_runs, ya = _interpolation(y0, plane.shape[0], cell[0], tiles_y)
+    column_runs, xa = _interpolation(x0, plane.shape[1], cell[1], tiles_x)
+    output = np.empty_like(plane)
+
+    for r0, r1, ty1, ty2 in row_runs:
+        wy = ya[r0:r1, None]
+        for c0, c1, tx1, tx2 in column_runs:
+            block = plane[r0:r1, c0:c1]
+            wx = xa[c0:c1]
+            top = cv2.LUT(block, luts[ty1, tx1]) * (1 - wx)
+            top += cv2.LUT(block, luts[ty1, tx2]) * wx
+            bottom = cv2.LUT(block, luts[ty2, tx1]) * (1 - wx)
+            bottom += cv2.LUT(block, luts[ty2, tx2]) * wx
+            top *= 1 - wy
+            bottom *= wy
+            top += bottom
+            np.clip(np.rint(top, out=top), 0, 255, out=top)
+            output[r0:r1, c0:c1] = top
+    return output
+
+
+def _clahe_tiled(image, parameters, side, workers, budget):
+    height, width = image.shape[:2]
+    read = _clahe_source(image)
+    luts, cell = _clahe_luts(read, height, width, float(parameters.get('clip_limit', 2.0)), budget, workers)
+    output = np.empty_like(image)
+
+    def work(box):
+        y0, y1, x0, x1 = box
+        if image.ndim == 2:
+            output[y0:y1, x0:x1] = _clahe_apply(image[y0:y1, x0:x1], y0, x0, luts, cell)
+            return
+        lab = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2LAB)
+        lab[:, :, 0] = _clahe_apply(lab[:, :, 0], y0, x0, luts, cell)
+        output[y0:y1, x0:x1] = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+    _run_tiles(work, tile_boxes(height, width, side), workers)
+    return output
+
+
+def _warp_tiled(algorithm, image, parameters, side, workers):
+    from .processors.geometric_transformation import GeometricTransformationProcessor
+
+    height, width = image.shape[:2]
+    matrix, (out_width, out_height), interpolation = GeometricTransformationProcessor.warp_plan(
+        algorithm, width, height, parameters)
+    output = np.zeros((out_height, out_width) + image.shape[2:], dtype=image.dtype)
+
+    def work(box):
+        y0, y1, x0, x1 = box
+        # Maps of this tile alone, from the same fixed-point positions as the whole-image maps
+        maps = warp.build_maps(matrix, (x1 - x0, y1 - y0), interpolation, x0, y0)
+        source = warp.source_box(maps, interpolation, width, height)
+        if source is None:
+            return  # The tile maps outside the image and stays black
+        sx0, sy0, sx1, sy1 = source
+        warp.shift_maps(maps, sx0, sy0)
+        warp.remap(image[sy0:sy1, sx0:sx1], maps, interpolation, dst=output[y0:y1, x0:x1])
+
+    _run_tiles(work, tile_boxes(out_height, out_width, side), workers)
+    return output
+
+
+def process_tiled(algorithm: str, image: np.ndarray, parameters: Dict[str, Any],
+                  process: Callable[[np.ndarray, dict], np.ndarray],
+                  budget: int = None, workers: int = None) -> np.ndarray:
+    """Run ``algorithm`` tile by tile and stitch the result.
+
+    ``process`` runs the algorithm on one tile (the registry entry's
+    ``process``); it is used for the algorithms tiled as plain local filters.
+    """
+    budget = budget or TILE_MEMORY_BUDGET
+    margin = halo(algorithm, parameters)
+    side, workers = plan(algorithm, image.shape, margin, budget, workers)
+
+    if algorithm == 'canny':
+        return _canny_tiled(image, parameters, side, workers)
+    if algorithm == 'histogram':
+        return _clahe_tiled(image, parameters, side, workers, budget)
+    if algorithm in ('affine', 'perspective'):
+        return _warp_tiled(algorithm, image, parameters, side, workers)
+    if algorithm in ('log', 'dog'):
+        return _filter_tiled(image, parameters, process, margin, side, workers)
+    raise ValueError(f"Algorithm cannot be tiled: {algorithm}")
@@ -0,0 +1,68 @@
+"""Optional warm-up of selected algorithms before a worker takes traffic.
+
+A fresh worker pays for a lot on its first request to each algorithm:
+importing the processor module (and scipy for split-merge), OpenCV's
+first-call initialisation of its dispatch tables and thread pool, numpy
+ufunc setup, spawning the executor's thread and process pools and, in
+each pool process, importing the module all over again. Listing
+algorithms in ``WARMUP_ALGORITHMS`` (comma separated, or ``all``) runs
+each of them once on a small synthetic image at startup, through the
+executor and PNG codec exactly as a request would, so that cost is paid
+before the worker is marked ready.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from .executor import ProcessorExecutor, PROCESS
+from .processors.registry import get_algorithm, list_algorithms
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SIZE = 128
+
+
+def selected_algorithms(setting: str = None) -> List[str]:
+    """Algorithm names from ``WARMUP_ALGORITHMS``; unknown names are an error."""
+    if setting is None:
+        setting = os.getenv("WARMUP_ALGORITHMS", "")
+    names = [name.strip() for name in setting.split(",") if name.strip()]
+    if names == ["all"]:
+        return [spec.name for spec in list_algorithms()]
+    for name in names:
+        get_algorithm(name)
+    return names
+
+
+def warmup_image(size: int = WARMUP_SIZE) -> np.ndarray:
+    """A small image with edges, lines and flat regions so every code path runs."""
+    image = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    cv2.rectangle(image, (size // 4, size // 4), (3 * size // 4, 3 * size // 4), (255, 255, 255), -1)
+    cv2.line(image, (0, size - 1), (size - 1, 0), (0, 0, 0), 2)
+    return image
+
+
+async def warm_up(executor: ProcessorExecutor, names: List[str]) -> Dict[str, float]:
+    """Run each algorithm once per pool worker; return seconds spent per algorithm."""
+    image = warmup_image()
+    _, encoded = cv2.imencode(".png", image)
+    cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+    timings = {}
+    for name in names:
+        spec = get_algorithm(name)
+        parameters = spec.coerce({})
+        # Process pool workers each import the module themselves, so give them one call each
+        calls = executor.concurrency(name) if executor.backend_for(name) == PROCESS else 1
+        start = time.perf_counter()
+        outputs = await asyncio.gather(*(executor.run(name, image, parameters) for _ in range(calls)))
+        cv2.imencode(".png", outputs[0])
+        timings[name] = time.perf_counter() - start
+    if timings:
+        logger.info("Warmed up %s", ", ".join(f"{name} in {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
+    return timings
@@ -1,19 +1,7 @@
-import React, { Fragment } from 'react';
+import React, { Fragment, useEffect, useState } from 'react';
 import { Listbox, Transition } from '@headlessui/react';
 import { CheckIcon, ChevronUpDownIcon } from '@heroicons/react/20/solid';
-
-const algorithms = [
-  { id: 'canny', name: 'Canny Edge Detection' },
-  { id: 'log', name: 'Laplacian of Gaussian (LoG)' },
-  { id: 'dog', name: 'Difference of Gaussians (DoG)' },
-  { id: 'glcm', name: 'Gray-Level Co-occurrence Matrix (GLCM)' },
-  { id: 'hough', name: 'Hough Transform' },
-  { id: 'chain', name: 'Chain Code' },
-  { id: 'histogram', name: 'Histogram Equalization' },
-  { id: 'affine', name: 'Affine Transformation' },
-  { id: 'region-growing', name: 'Region Growing' },
-  { id: 'split-merge', name: 'Splitting & Merging' },
-];
+import { getAlgorithms, AlgorithmSchema } from '../services/api';
 
 interface AlgorithmSelectorProps {
   selectedAlgorithm: string;
@@ -21,6 +9,14 @@ interface AlgorithmSelectorProps {
 }
 
 const AlgorithmSelector = ({ selectedAlgorithm, onSelect }: AlgorithmSelectorProps) => {
+  const [algorithms, setAlgorithms] = useState<AlgorithmSchema[]>([]);
+
+  useEffect(() => {
+    getAlgorithms()
+      .then(setAlgorithms)
+      .catch((error) => console.error('Failed to load algorithms:', error));
+  }, []);
+
   const selected = algorithms.find(a => a.id === selectedAlgorithm) || algorithms[0];
 
   return (
@@ -28,7 +24,7 @@ const AlgorithmSelector = ({ selectedAlgorithm, onSelect }: AlgorithmSelectorPro
       <Listbox value={selectedAlgorithm} onChange={onSelect}>
         <div className="relative mt-1">
           <Listbox.Button className="relative w-full cursor-default rounded-lg bg-white py-2 pl-3 pr-10 text-left border focus:outline-none focus-visible:border-blue-500 focus-visible:ring-2 focus-visible:ring-white focus-visible:ring-opacity-75 focus-visible:ring-offset-2 focus-visible:ring-offset-blue-300 sm:text-sm">
-            <span className="block truncate">{selected.name}</span>
+            <span className="block truncate">{selected?.name ?? selectedAlgorithm}</span>
             <span className="pointer-events-none absolute inset-y-0 right-0 flex items-center pr-2">
               <ChevronUpDownIcon
                 className="h-5 w-5 text-gray-400"
@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useImageStore } from '../store/imageStore';
-import { processImage } from '../services/api';
+import { processImage, getAlgorithms, AlgorithmSchema, ParameterSchema } from '../services/api';
 import { Card } from "../components/ui/card";
 import { Button } from "../components/ui/button";
 import { Slider } from "../components/ui/slider";
@@ -10,47 +10,64 @@ interface ImageProcessorProps {
   algorithm: string;
 }
 
-interface AlgorithmParam {
-  name: string;
-  min: number;
-  max: number;
-  default: number;
-  step?: number;
-}
+// Numeric parameters with a bounded range get a slider; the rest keep their defaults
+const isSliderParam = (param: ParameterSchema) =>
+  (param.type === 'int' || param.type === 'float') &&
+  param.minimum != null && param.maximum != null && param.default != null;
 
 const ImageProcessor = ({ algorithm }: ImageProcessorProps) => {
   const { originalImage, processedImage, setProcessedImage } = useImageStore();
   const [parameters, setParameters] = useState<Record<string, number>>({});
   const [isProcessing, setIsProcessing] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Server-side hash of the current image, so re-runs don't re-upload it
+  const [imageHash, setImageHash] = useState<string | null>(null);
+  const previewTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const [algorithms, setAlgorithms] = useState<AlgorithmSchema[]>([]);
 
-  const algorithmParams: Record<string, AlgorithmParam[]> = {
-    canny: [
-      { name: 'threshold1', min: 0, max: 255, default: 100 },
-      { name: 'threshold2', min: 0, max: 255, default: 200 },
-    ],
-    log: [
-      { name: 'kernel_size', min: 1, max: 31, default: 5, step: 2 },
-      { name: 'sigma', min: 0.1, max: 5, default: 1, step: 0.1 },
-    ],
-    // Add more algorithm parameters as needed
-  };
+  useEffect(() => {
+    setImageHash(null);
+  }, [originalImage]);
 
   useEffect(() => {
-    // Initialize parameters when algorithm changes
-    const params = algorithmParams[algorithm as keyof typeof algorithmParams] || [];
-    const initialParams = params.reduce((acc, param) => ({
+    getAlgorithms()
+      .then(setAlgorithms)
+      .catch((error) => console.error('Failed to load algorithms:', error));
+  }, []);
+
+  const sliderParams = (algorithms.find((a) => a.id === algorithm)?.parameters ?? []).filter(isSliderParam);
+
+  useEffect(() => {
+    // Initialize parameters when the algorithm or its schema changes
+    const initialParams = sliderParams.reduce((acc, param) => ({
       ...acc,
       [param.name]: param.default,
     }), {});
     setParameters(initialParams);
-  }, [algorithm]);
+  }, [algorithm, algorithms]);
+
+  const runPreview = async (previewParameters: Record<string, number>) => {
+    if (!originalImage) return;
+    try {
+      const response = await processImage(algorithm, previewParameters, originalImage, {
+        imageHash,
+        preview: true,
+      });
+      setImageHash(response.imageHash);
+      setProcessedImage(response.processedImage);
+    } catch (error) {
+      // Previews are best effort; the full run reports errors
+      console.error('Preview failed:', error);
+    }
+  };
 
   const handleParameterChange = (name: string, value: number) => {
-    setParameters(prev => ({
-      ...prev,
-      [name]: value,
-    }));
+    const next = { ...parameters, [name]: value };
+    setParameters(next);
+
+    // Debounce slider moves into low-resolution preview runs
+    if (previewTimer.current) clearTimeout(previewTimer.current);
+    previewTimer.current = setTimeout(() => runPreview(next), 150);
   };
 
   const handleProcessImage = async () => {
@@ -60,7 +77,8 @@ const ImageProcessor = ({ algorithm }: ImageProcessorProps) => {
     setError(null);
 
     try {
-      const response = await processImage(algorithm, parameters, originalImage);
+      const response = await processImage(algorithm, parameters, originalImage, { imageHash });
+      setImageHash(response.imageHash);
       setProcessedImage(response.processedImage);
     } catch (error) {
       console.error('Processing failed:', error);
@@ -107,28 +125,28 @@ const ImageProcessor = ({ algorithm }: ImageProcessorProps) => {
       <Card className="p-6">
         <h3 className="text-lg font-semibold mb-6">Parameters</h3>
         <div className="space-y-6">
-          {algorithmParams[algorithm as keyof typeof algorithmParams]?.map((param) => (
+          {sliderParams.map((param) => (
             <div key={param.name} className="space-y-2">
               <div className="flex justify-between items-center">
                 <label className="text-sm font-medium text-gray-700">
-                  {param.name}
+                  {param.label}
                 </label>
                 <span className="text-sm text-gray-500">
-                  {parameters[param.name] || param.default}
+                  {parameters[param.name] ?? param.default}
                 </span>
               </div>
               <Slider
-                min={param.min}
-                max={param.max}
-                step={param.step || 1}
-                value={[parameters[param.name] || param.default]}
+                min={param.minimum}
+                max={param.maximum}
+                step={param.step ?? (param.type === 'int' ? 1 : 0.1)}
+                value={[parameters[param.name] ?? param.default]}
                 onValueChange={(value) => handleParameterChange(param.name, value[0])}
                 disabled={isProcessing}
                 className="w-full"
               />
               <div className="flex justify-between text-xs text-gray-500">
-                <span>{param.min}</span>
-                <span>{param.max}</span>
+                <span>{param.minimum}</span>
+                <span>{param.maximum}</span>
               </div>
             </div>
           ))}
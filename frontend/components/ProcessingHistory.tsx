@@ -1,33 +1,43 @@
 import React, { useEffect, useState } from 'react';
-import { getProcessingHistory } from '../services/api';
+import { getProcessingHistory, imageUrl } from '../services/api';
+
+interface StoredImage {
+  hash: string;
+  width: number;
+  height: number;
+  url: string;
+  thumbnail_url: string;
+}
 
 interface ProcessingHistoryItem {
   id: number;
   algorithm: string;
   parameters: Record<string, any>;
   created_at: string;
-  original_image: string;
-  processed_image: string;
+  original: StoredImage | null;
+  processed: StoredImage | null;
 }
 
 const ProcessingHistory = () => {
   const [history, setHistory] = useState<ProcessingHistoryItem[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<number | null>(null);
 
-  useEffect(() => {
-    const fetchHistory = async () => {
-      try {
-        const response = await getProcessingHistory();
-        setHistory(response.history);
-      } catch (error) {
-        console.error('Failed to fetch history:', error);
-        setError('Failed to load processing history');
-      } finally {
-        setIsLoading(false);
-      }
-    };
+  const fetchHistory = async (cursor: number | null = null) => {
+    try {
+      const response = await getProcessingHistory(cursor);
+      setHistory(prev => (cursor == null ? response.history : [...prev, ...response.history]));
+      setNextCursor(response.next_cursor);
+    } catch (error) {
+      console.error('Failed to fetch history:', error);
+      setError('Failed to load processing history');
+    } finally {
+      setIsLoading(false);
+    }
+  };
 
+  useEffect(() => {
     fetchHistory();
   }, []);
 
@@ -70,7 +80,7 @@ const ProcessingHistory = () => {
                 <div>
                   <p className="text-sm font-medium text-gray-700">Original</p>
                   <img
-                    src={item.original_image}
+                    src={item.original ? imageUrl(item.original.thumbnail_url) : undefined}
                     alt="Original"
                     className="w-full h-32 object-cover rounded"
                   />
@@ -78,7 +88,7 @@ const ProcessingHistory = () => {
                 <div>
                   <p className="text-sm font-medium text-gray-700">Processed</p>
                   <img
-                    src={item.processed_image}
+                    src={item.processed ? imageUrl(item.processed.thumbnail_url) : undefined}
                     alt="Processed"
                     className="w-full h-32 object-cover rounded"
                   />
@@ -88,6 +98,14 @@ const ProcessingHistory = () => {
           </div>
         ))}
       </div>
+      {nextCursor != null && (
+        <button
+          onClick={() => fetchHistory(nextCursor)}
+          className="w-full py-2 text-sm font-medium text-blue-600 hover:text-blue-800"
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 };
@@ -1,6 +1,6 @@
 import axios from 'axios';
 
-const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+export const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
 const api = axios.create({
   baseURL: API_URL,
@@ -19,20 +19,70 @@ export const uploadImage = async (file: File): Promise<string> => {
 };
 
 
-export const processImage = async (algorithm: string, parameters: any, image: string) => {
+interface ProcessOptions {
+  // Hash returned by an earlier call; sent instead of the image when set
+  imageHash?: string | null;
+  // Run on a downscaled copy for fast slider feedback
+  preview?: boolean;
+}
+
+export const processImage = async (
+  algorithm: string,
+  parameters: any,
+  image: string,
+  { imageHash, preview = false }: ProcessOptions = {},
+) => {
   const response = await api.post('/process', {
     algorithm,
     parameters,
-    image,
+    ...(imageHash ? { image_hash: imageHash } : { image }),
+    preview,
   });
-  console.log(response.data);
-  console.log(image);
   return response.data;
 };
 
-export const getProcessingHistory = async () => {
-  const response = await api.get('/history');
+export interface ParameterSchema {
+  name: string;
+  label: string;
+  type: 'int' | 'float' | 'bool' | 'choice' | 'list';
+  default: any;
+  minimum?: number;
+  maximum?: number;
+  step?: number;
+  choices?: string[];
+}
+
+export interface AlgorithmSchema {
+  id: string;
+  name: string;
+  cost: 'light' | 'heavy';
+  structured: boolean;
+  parameters: ParameterSchema[];
+}
+
+// The list only changes with a backend deploy, so every caller shares one request
+let algorithmsRequest: Promise<AlgorithmSchema[]> | null = null;
+
+export const getAlgorithms = (): Promise<AlgorithmSchema[]> => {
+  if (!algorithmsRequest) {
+    algorithmsRequest = api.get('/algorithms')
+      .then((response) => response.data.algorithms)
+      .catch((error) => {
+        algorithmsRequest = null;
+        throw error;
+      });
+  }
+  return algorithmsRequest;
+};
+
+export const getProcessingHistory = async (cursor?: number | null, limit = 50) => {
+  const response = await api.get('/history', {
+    params: { limit, ...(cursor != null ? { cursor } : {}) },
+  });
   return response.data;
 };
 
+// History rows link to images by hash; resolve those links against the API host
+export const imageUrl = (path: string) => `${API_URL}${path}`;
+
 export default api; 
\ No newline at end of file